@@ -88,6 +88,42 @@ USE_TZ = True
 
 
 STATIC_URL = "static/"
+
+# Время жизни закэшированного календаря (секунды), инвалидация идет сменой версии
+CRM_CALENDAR_CACHE_TIMEOUT = int(os.getenv("CRM_CALENDAR_CACHE_TIMEOUT", "3600"))
+
+# locmem - свой кэш у каждого процесса (сброс из сигнала виден только в нем),
+# file - общий для всех процессов на сервере
+CACHE_BACKENDS = {
+    "locmem": ("django.core.cache.backends.locmem.LocMemCache", "crm"),
+    "file": (
+        "django.core.cache.backends.filebased.FileBasedCache",
+        str(BASE_DIR / "cache"),
+    ),
+}
+CACHE_BACKEND_NAME = os.getenv("CACHE_BACKEND", "locmem")
+CACHE_BACKEND, CACHE_LOCATION = CACHE_BACKENDS[CACHE_BACKEND_NAME]
+CACHES = {
+    "default": {
+        "BACKEND": CACHE_BACKEND,
+        "LOCATION": os.getenv("CACHE_LOCATION", CACHE_LOCATION),
+    }
+}
+
+# Кэш ролей в командах между запросами, сбрасывается сигналами TeamUser после коммита.
+# С locmem сброс виден только процессу, который изменил членство, поэтому по умолчанию
+# кэш включен только с общим бэкендом, а при явном включении с locmem живет минуту
+CRM_ROLE_CACHE_ENABLED = (
+    os.getenv(
+        "CRM_ROLE_CACHE_ENABLED", "0" if CACHE_BACKEND_NAME == "locmem" else "1"
+    )
+    == "1"
+)
+CRM_ROLE_CACHE_TIMEOUT = int(
+    os.getenv(
+        "CRM_ROLE_CACHE_TIMEOUT", "60" if CACHE_BACKEND_NAME == "locmem" else "86400"
+    )
+)
 LOGIN_URL = 'user_login'
 
 
@@ -0,0 +1,184 @@
+from datetime import datetime
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from crm.calendar_engine import day_start
+from crm.models import Evaluation, Task, TaskEvent
+
+TRACKED_FIELDS = ["name", "description", "status", "deadline", "performer_id"]
+
+FIELD_LABELS = {
+    "name": "Название",
+    "description": "Описание",
+    "status": "Статус",
+    "deadline": "Дедлайн",
+    "performer_id": "Исполнитель",
+    "evaluation": "Оценка",
+}
+
+
+def value(obj):
+    """Значение поля в виде, пригодном для JSON"""
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    return obj
+
+
+def snapshot(task):
+    """Значения отслеживаемых полей задачи"""
+    return {field: value(getattr(task, field)) for field in TRACKED_FIELDS}
+
+
+def diff(before, after):
+    """
+    Изменившиеся поля между двумя снимками
+
+    :return: {поле: [было, стало]}
+    """
+    return {
+        field: [before[field], after[field]]
+        for field in before
+        if before[field] != after[field]
+    }
+
+
+def event(task, user, kind, changes=None):
+    """Несохраненное событие задачи"""
+    return TaskEvent(
+        task_id=task.pk,
+        team_id=task.team_id,
+        user_id=user.pk if user else None,
+        kind=kind,
+        changes=changes or {},
+    )
+
+
+def record(events):
+    """
+    Сохраняет события запроса одним INSERT
+
+    События без изменений (UPDATED с пустым changes) пропускаются
+    """
+    events = [
+        event
+        for event in events
+        if event.changes or event.kind != TaskEvent.Kind.UPDATED
+    ]
+    if events:
+        TaskEvent.objects.bulk_create(events)
+    return events
+
+
+def merge(events):
+    """
+    Сворачивает события одной задачи в изменения {поле: [первое было, последнее стало]}
+
+    Поля, вернувшиеся к исходному значению, в сводку не попадают
+    """
+    merged = {}
+    for event in events:
+        for field, (old, new) in event.changes.items():
+            if field in merged:
+                merged[field][1] = new
+            else:
+                merged[field] = [old, new]
+    return {field: change for field, change in merged.items() if change[0] != change[1]}
+
+
+def compact(before, batch_size=2000):
+    """
+    Сворачивает события старше before в дневные сводки
+
+    Команды обрабатываются по одной: события читаются по индексу (team, created_at, id)
+    итератором, для каждого дня и задачи создается одна запись SUMMARY с общим
+    количеством событий и итоговыми изменениями полей, после чего исходные события
+    удаляются. Сводки повторно не сворачиваются, поэтому команду можно запускать регулярно.
+    В памяти держатся события одного дня одной команды.
+    :param before: граница, события раньше нее сворачиваются
+    :param batch_size: размер пачки чтения из базы
+    :return: (удалено событий, создано сводок)
+    """
+    removed = created = 0
+    team_ids = (
+        TaskEvent.objects.filter(created_at__lt=before)
+        .exclude(kind=TaskEvent.Kind.SUMMARY)
+        .order_by()
+        .values_list("team_id", flat=True)
+        .distinct()
+    )
+    for team_id in list(team_ids):
+        old = TaskEvent.objects.filter(team_id=team_id, created_at__lt=before).exclude(
+            kind=TaskEvent.Kind.SUMMARY
+        )
+        with transaction.atomic():
+            summaries = []
+            day, groups = None, {}
+            for event in old.order_by("created_at", "id").iterator(
+                chunk_size=batch_size
+            ):
+                event_day = day_start(timezone.localdate(event.created_at))
+                if event_day != day:
+                    summaries += summarize(team_id, day, groups)
+                    day, groups = event_day, {}
+                groups.setdefault(event.task_id, []).append(event)
+                if len(summaries) >= batch_size:
+                    TaskEvent.objects.bulk_create(summaries)
+                    created += len(summaries)
+                    summaries = []
+            summaries += summarize(team_id, day, groups)
+            TaskEvent.objects.bulk_create(summaries)
+            created += len(summaries)
+            removed += old.delete()[0]
+    return removed, created
+
+
+def summarize(team_id, day, groups):
+    return [
+        TaskEvent(
+            task_id=task_id,
+            team_id=team_id,
+            kind=TaskEvent.Kind.SUMMARY,
+            changes=merge(events),
+            count=sum(event.count for event in events),
+            created_at=day,
+        )
+        for task_id, events in groups.items()
+    ]
+
+
+def describe(events):
+    """
+    Добавляет событиям строки для показа: event.rows = [(поле, было, стало), ...]
+
+    Исполнители подставляются по именам одним запросом на всю страницу
+    """
+    user_ids = {
+        pk
+        for event in events
+        for pk in event.changes.get("performer_id", [])
+        if pk is not None
+    }
+    usernames = dict(User.objects.filter(pk__in=user_ids).values_list("pk", "username"))
+
+    def display(field, raw):
+        if raw is None:
+            return "—"
+        if field == "performer_id":
+            return usernames.get(raw, f"#{raw}")
+        if field == "deadline":
+            return timezone.localtime(parse_datetime(raw)).strftime("%d.%m.%Y %H:%M")
+        if field == "status" and raw in Task.Status.values:
+            return Task.Status(raw).label
+        if field == "evaluation" and raw in Evaluation.EvaluationChoices.values:
+            return Evaluation.EvaluationChoices(raw).label
+        return raw
+
+    for event in events:
+        event.rows = [
+            (FIELD_LABELS.get(field, field), display(field, old), display(field, new))
+            for field, (old, new) in event.changes.items()
+        ]
+    return events
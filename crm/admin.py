@@ -1,5 +1,111 @@
-from django.contrib import admin
+import contextlib
+import csv
+import io
+import tempfile
 
-from crm.models import Team, Task, TeamUser, Meeting, MeetingUser, Comment, Evaluation
+from django.contrib import admin, messages
+from django.http import FileResponse
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
 
-admin.site.register([Team, Task, TeamUser, Meeting, MeetingUser, Comment, Evaluation])
+from crm.forms import TaskImportForm
+from crm.importers import TaskImporter, detect_format, iter_rows
+from crm.models import (
+    Team,
+    Task,
+    TeamUser,
+    Meeting,
+    MeetingUser,
+    Comment,
+    Evaluation,
+    CalendarEntry,
+    TaskReminder,
+)
+
+admin.site.register(
+    [
+        Team,
+        TeamUser,
+        Meeting,
+        MeetingUser,
+        Comment,
+        Evaluation,
+        CalendarEntry,
+        TaskReminder,
+    ]
+)
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    """
+    Админка задач с загрузкой файла для массового импорта
+    """
+
+    change_list_template = "admin/crm/task/change_list.html"
+
+    def get_urls(self):
+        return [
+            path(
+                "import/",
+                self.admin_site.admin_view(self.import_view),
+                name="crm_task_import",
+            ),
+            *super().get_urls(),
+        ]
+
+    def import_view(self, request):
+        """
+        Импорт задач из загруженного файла
+
+        Файл разбирается потоково, отказы пишутся во временный файл на диске
+        и отдаются на скачивание, если они есть
+        :param request:
+        :return:
+        """
+        if not self.has_add_permission(request):
+            return redirect("admin:crm_task_changelist")
+        form = TaskImportForm(request.POST or None, request.FILES or None)
+        if request.method == "POST" and form.is_valid():
+            upload = form.cleaned_data["file"]
+            fmt = form.cleaned_data["format"] or detect_format(upload.name)
+            with contextlib.ExitStack() as cleanup:
+                # файл закрывается при любом выходе, кроме отдачи в FileResponse
+                rejects_file = cleanup.enter_context(tempfile.TemporaryFile())
+                rejects = io.TextIOWrapper(rejects_file, encoding="utf-8", newline="")
+                source = io.TextIOWrapper(
+                    upload.file, encoding="utf-8-sig", newline=""
+                )
+                importer = TaskImporter(
+                    rejects=rejects,
+                    batch_size=form.cleaned_data["batch_size"],
+                    default_author=request.user.pk,
+                )
+                try:
+                    created, rejected = importer.run(iter_rows(source, fmt))
+                except (ValueError, csv.Error) as e:
+                    messages.error(request, f"Ошибка: {e}")
+                    return redirect("admin:crm_task_import")
+
+                messages.success(request, f"Создано задач: {created}")
+                if not rejected:
+                    return redirect("admin:crm_task_changelist")
+                messages.warning(request, f"Отклонено строк: {rejected}")
+                rejects.flush()
+                rejects.detach().seek(0)
+                cleanup.pop_all()
+                return FileResponse(
+                    rejects_file, as_attachment=True, filename="tasks.rejects.csv"
+                )
+
+        return TemplateResponse(
+            request,
+            "admin/crm/task/import.html",
+            {
+                **self.admin_site.each_context(request),
+                "opts": self.model._meta,
+                "form": form,
+                "title": "Импорт задач",
+            },
+        )
@@ -0,0 +1,84 @@
+import string
+
+from django.contrib.auth.models import User
+from django.db.models import Exists, OuterRef, Q
+from django.db.models.functions import Lower
+
+from crm.models import MeetingUser, TeamUser
+from crm.pagination import KeysetPaginator
+
+PER_PAGE = 20
+MAX_PER_PAGE = 50
+
+# LOWER() в SQLite переводит в нижний регистр только латиницу (как и LIKE в istartswith),
+# поэтому префикс приводится так же, иначе он не совпадет со значениями в индексе
+ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def fold(prefix):
+    return prefix.translate(ASCII_LOWER)
+
+
+def prefix_range(name, prefix):
+    """
+    Условие "name начинается с prefix" в виде диапазона name >= prefix AND name < верхняя граница
+
+    Диапазон читается по индексу на выражении, в отличие от LIKE 'prefix%',
+    который SQLite по индексу на LOWER() не ищет.
+    Верхняя граница - префикс с увеличенным на единицу последним символом.
+    """
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return Q(**{f"{name}__gte": prefix, f"{name}__lt": upper})
+
+
+def search_users(query="", not_in_team=None, not_in_meeting=None, without_team=False):
+    """
+    Пользователи, у которых username или email начинается с query (без учета регистра)
+
+    Поиск идет по индексам crm_user_username_lower и crm_user_email_lower (миграция 0020),
+    исключения - через NOT EXISTS по индексам участников команд и встреч.
+    :param query: префикс, пустой - все пользователи
+    :param not_in_team: id команды, ее участники исключаются
+    :param not_in_meeting: id встречи, ее участники исключаются
+    :param without_team: только пользователи без команды (их можно добавить в команду)
+    :return: выборка с аннотацией username_lower для сортировки
+    """
+    users = User.objects.annotate(username_lower=Lower("username"))
+    query = fold(query.strip())
+    if query:
+        users = users.annotate(email_lower=Lower("email")).filter(
+            prefix_range("username_lower", query) | prefix_range("email_lower", query)
+        )
+    if without_team:
+        users = users.filter(~Exists(TeamUser.objects.filter(user=OuterRef("pk"))))
+    if not_in_team is not None:
+        users = users.filter(
+            ~Exists(TeamUser.objects.filter(user=OuterRef("pk"), team_id=not_in_team))
+        )
+    if not_in_meeting is not None:
+        users = users.filter(
+            ~Exists(
+                MeetingUser.objects.filter(
+                    user=OuterRef("pk"), meeting_id=not_in_meeting
+                )
+            )
+        )
+    return users
+
+
+def user_page(users, cursor=None, per_page=PER_PAGE):
+    """
+    Страница пользователей по алфавиту: keyset по (LOWER(username), id)
+
+    Порядок совпадает с индексом crm_user_username_lower, поэтому любая страница
+    стоит как первая.
+    """
+    paginator = KeysetPaginator(
+        users.only("pk", "username"), ["username_lower", "id"], per_page
+    )
+    return paginator.get_page(cursor)
+
+
+def user_json(user):
+    """Пользователь в ответе автодополнения; email не отдается"""
+    return {"id": user.pk, "username": user.username}
@@ -0,0 +1,103 @@
+from collections import Counter
+
+from django.db import transaction
+from django.utils import timezone
+
+from crm import activity, stats
+from crm.calendar_engine import deferred_sync, sync_task_calendars
+from crm.models import Task, TaskEvent, TeamUser
+
+REASSIGN = "reassign"
+STATUS = "status"
+DELETE = "delete"
+
+NOT_FOUND = "Задача не найдена в команде"
+DELETE_FORBIDDEN = "Удалять может только автор задачи или администратор команды"
+
+
+def task_action(user, role, team_pk, task_ids, action, status=None, performer=None):
+    """
+    Применяет одно действие к списку задач команды
+
+    Права проверяются одним запросом: выбираются задачи команды из списка с их авторами
+    и текущими значениями для журнала, все, что не найдено или не разрешено,
+    попадает в отчет. Выборка блокирует строки задач (select_for_update) в той же
+    транзакции, что и запись, поэтому счетчики статусов и журнал считаются от значений,
+    которые меняет UPDATE. Изменение выполняется одним UPDATE или DELETE,
+    события журнала - одним INSERT.
+    UPDATE не отправляет сигналы, поэтому updated_at, календарь и счетчики статусов
+    команды обновляются явно, сигналы удаления копятся в deferred_sync и stats.deferred
+    и применяются одним набором запросов.
+    :param user: пользователь, выполняющий действие
+    :param role: роль пользователя в команде (None для суперпользователя вне команды)
+    :param team_pk: id команды
+    :param task_ids: id задач
+    :param action: REASSIGN, STATUS или DELETE
+    :param status: новый статус для STATUS
+    :param performer: новый исполнитель для REASSIGN
+    :return: {"done": [id, ...], "failed": {id: причина}}
+    """
+    with transaction.atomic():
+        current = {
+            task.pk: task
+            for task in Task.objects.select_for_update()
+            .filter(team_id=team_pk, pk__in=task_ids)
+            .only("pk", "team_id", "author_id", "name", "status", "performer_id")
+        }
+        authors = {pk: task.author_id for pk, task in current.items()}
+        failed = {pk: NOT_FOUND for pk in task_ids if pk not in authors}
+        allowed = set(authors)
+        if action == DELETE and not (user.is_superuser or role == TeamUser.Role.ADMIN):
+            allowed = {pk for pk, author_id in authors.items() if author_id == user.pk}
+            failed.update({pk: DELETE_FORBIDDEN for pk in authors if pk not in allowed})
+
+        if allowed:
+            # team_id остается в условии записи, как и в выборке выше
+            tasks = Task.objects.filter(team_id=team_pk, pk__in=allowed)
+            with deferred_sync(), stats.deferred():
+                if action == DELETE:
+                    kind, changes = TaskEvent.Kind.DELETED, {"name": None}
+                    tasks.delete()
+                elif action == STATUS:
+                    kind, changes = TaskEvent.Kind.UPDATED, {"status": status}
+                    tasks.update(status=status, updated_at=timezone.now())
+                    stats.apply(status_deltas(current, allowed, status))
+                elif action == REASSIGN:
+                    kind = TaskEvent.Kind.UPDATED
+                    changes = {
+                        "performer_id": performer.pk,
+                        "status": Task.Status.processing,
+                    }
+                    # как и при редактировании задачи, назначение переводит ее в работу
+                    tasks.update(
+                        performer=performer,
+                        status=Task.Status.processing,
+                        updated_at=timezone.now(),
+                    )
+                    sync_task_calendars(allowed)
+                    stats.apply(status_deltas(current, allowed, Task.Status.processing))
+                activity.record(
+                    activity.event(
+                        current[pk],
+                        user,
+                        kind,
+                        {
+                            field: [getattr(current[pk], field), new]
+                            for field, new in changes.items()
+                            if getattr(current[pk], field) != new
+                        },
+                    )
+                    for pk in sorted(allowed)
+                )
+
+    return {"done": sorted(allowed), "failed": failed}
+
+
+def status_deltas(current, task_ids, status):
+    """Изменения счетчиков статусов при переводе задач task_ids в status"""
+    deltas = Counter()
+    for pk in task_ids:
+        task = current[pk]
+        deltas[(task.team_id, task.status)] -= 1
+        deltas[(task.team_id, status)] += 1
+    return deltas
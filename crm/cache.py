@@ -0,0 +1,128 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from crm.models import TeamUser
+
+KEY_PREFIX = "crm"
+
+
+def make_key(*parts):
+    return ":".join(str(part) for part in (KEY_PREFIX, *parts))
+
+
+def incr_counter(name):
+    """Увеличивает счетчик мониторинга, создавая его при первом обращении"""
+    key = make_key("stats", name)
+    if cache.add(key, 1, timeout=None):
+        return
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def get_counters(names):
+    """Текущие значения счетчиков мониторинга по именам"""
+    keys = {make_key("stats", name): name for name in names}
+    values = cache.get_many(keys)
+    return {name: values.get(key, 0) for key, name in keys.items()}
+
+
+def hit_stats(names):
+    """
+    Статистика попаданий для кэшей names
+
+    Для каждого имени используются счетчики <name>_hit и <name>_miss
+    :return: {имя: {"hits": .., "misses": .., "hit_rate": ..}}
+    """
+    counters = get_counters(
+        [f"{name}_{kind}" for name in names for kind in ("hit", "miss")]
+    )
+    stats = {}
+    for name in names:
+        hits = counters[f"{name}_hit"]
+        misses = counters[f"{name}_miss"]
+        total = hits + misses
+        stats[name] = {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / total, 4) if total else None,
+        }
+    return stats
+
+
+def get_version(namespace, owner_id):
+    """
+    Текущая версия набора ключей namespace для владельца owner_id
+
+    Начальное значение берется из времени, а не 1: если ключ версии вытеснят из кэша,
+    новая версия не совпадет со старыми данными, которые еще лежат в кэше.
+    """
+    key = make_key(namespace, "version", owner_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_versions(namespace, owner_ids):
+    """Инвалидирует все ключи namespace у переданных владельцев сменой версии"""
+    for owner_id in owner_ids:
+        key = make_key(namespace, "version", owner_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), timeout=None)
+
+
+ROLE_NAMESPACE = "role"
+
+# Пользователь без команды: в кэше хранится пустой список, None означает промах
+NO_MEMBERSHIP = []
+
+
+def get_membership(user_id):
+    """
+    Членство пользователя: [id команды, роль] или [] без команды
+
+    Пользователь состоит не больше чем в одной команде (ограничение unique_user_one_team),
+    поэтому на пользователя хранится одна короткая запись. Сбрасывается сигналами
+    TeamUser (удаление команды удаляет и ее TeamUser, так что сбрасывает тоже).
+    CRM_ROLE_CACHE_ENABLED = False отключает кэш, членство читается из базы.
+    """
+
+    def load():
+        membership = (
+            TeamUser.objects.filter(user_id=user_id)
+            .values_list("team_id", "role")
+            .first()
+        )
+        return list(membership) if membership else NO_MEMBERSHIP
+
+    if not settings.CRM_ROLE_CACHE_ENABLED:
+        return load()
+    key = make_key(ROLE_NAMESPACE, user_id)
+    membership = cache.get(key)
+    if membership is None:
+        incr_counter("role_miss")
+        membership = load()
+        cache.set(key, membership, settings.CRM_ROLE_CACHE_TIMEOUT)
+    else:
+        incr_counter("role_hit")
+    return membership
+
+
+def get_role(user_id, team_id):
+    """Роль пользователя в команде или None, если он в ней не состоит"""
+    membership = get_membership(user_id)
+    if membership and membership[0] == int(team_id):
+        return membership[1]
+    return None
+
+
+def invalidate_roles(user_ids):
+    """Сбрасывает закэшированное членство пользователей"""
+    cache.delete_many([make_key(ROLE_NAMESPACE, user_id) for user_id in user_ids])
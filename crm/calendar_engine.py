@@ -0,0 +1,309 @@
+from calendar import monthrange
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date, datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from crm.cache import bump_versions, get_version, incr_counter, make_key
+from crm.models import CalendarEntry, Meeting, MeetingUser, Task
+
+CACHE_NAMESPACE = "calendar"
+
+MONTH_NAMES = {
+    1: "Январь",
+    2: "Февраль",
+    3: "Март",
+    4: "Апрель",
+    5: "Май",
+    6: "Июнь",
+    7: "Июль",
+    8: "Август",
+    9: "Сентябрь",
+    10: "Октябрь",
+    11: "Ноябрь",
+    12: "Декабрь",
+}
+
+
+def day_start(day):
+    """Начало дня day в текущей временной зоне (aware datetime)"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def day_bounds(day):
+    """
+    Полуоткрытый интервал [начало дня, начало следующего дня)
+
+    Сравнение с границами вместо lookup __date не оборачивает колонку в функцию,
+    поэтому запрос может использовать индекс
+    """
+    return day_start(day), day_start(day + timedelta(days=1))
+
+
+def month_bounds(year, month):
+    """Полуоткрытый интервал [первый день месяца, первый день следующего месяца)"""
+    first_day = date(year, month, 1)
+    last_day = date(year, month, monthrange(year, month)[1])
+    return day_start(first_day), day_start(last_day + timedelta(days=1))
+
+
+def user_tasks(user):
+    """Задачи, в которых пользователь является исполнителем"""
+    return Task.objects.filter(performer=user)
+
+
+def expand_recurring(user, window_start, window_end):
+    """
+    Повторения серий встреч пользователя, попадающие в окно
+
+    Серии выбираются по частичному индексу (user, start) для is_recurring,
+    правила повторения читаются одним запросом, повторения разворачиваются генератором
+    только на запрошенное окно.
+    :return: список несохраняемых CalendarEntry, по одному на повторение
+    """
+    series = list(
+        CalendarEntry.objects.filter(
+            user=user, is_recurring=True, start__lt=window_end
+        ).filter(Q(end__isnull=True) | Q(end__gt=window_start))
+    )
+    if not series:
+        return []
+    meetings = Meeting.objects.in_bulk({entry.object_id for entry in series})
+    occurrences = []
+    for entry in series:
+        meeting = meetings.get(entry.object_id)
+        if meeting is None:
+            continue
+        for start, end in meeting.occurrences(window_start, window_end):
+            occurrences.append(
+                CalendarEntry(
+                    pk=entry.pk,
+                    user_id=entry.user_id,
+                    kind=entry.kind,
+                    object_id=entry.object_id,
+                    title=entry.title,
+                    start=start,
+                    end=end,
+                    is_recurring=True,
+                )
+            )
+    return occurrences
+
+
+def fetch_entries(user, window_start, window_end):
+    """
+    Выполняет выборку событий календаря в окне [window_start, window_end) и раскладывает их по типам
+
+    Одиночные события читаются одним range-запросом, серии встреч разворачиваются отдельно.
+    Для встреч одним групповым запросом добавляется participants_count
+    :param user: пользователь, для которого строится календарь
+    :param window_start: начало окна
+    :param window_end: конец окна
+    :return: (задачи, встречи) - списки CalendarEntry
+    """
+    tasks = []
+    meetings = []
+    entries = CalendarEntry.objects.filter(
+        user=user, start__gte=window_start, start__lt=window_end
+    ).order_by("start")
+    for entry in entries:
+        if entry.is_recurring:
+            continue
+        if entry.kind == CalendarEntry.Kind.MEETING:
+            meetings.append(entry)
+        else:
+            tasks.append(entry)
+
+    meetings += expand_recurring(user, window_start, window_end)
+    meetings.sort(key=lambda entry: entry.start)
+
+    if meetings:
+        counts = dict(
+            MeetingUser.objects.filter(
+                meeting_id__in={entry.object_id for entry in meetings}
+            )
+            .values("meeting_id")
+            .annotate(total=Count("id"))
+            .values_list("meeting_id", "total")
+        )
+        for entry in meetings:
+            entry.participants_count = counts.get(entry.object_id, 0)
+    return tasks, meetings
+
+
+def build_day(user, day):
+    """
+    Собирает события одного дня
+
+    :param user: пользователь, для которого строится календарь
+    :param day: дата (datetime.date)
+    :return: словарь для шаблона дневного вида
+    """
+    tasks, meetings = fetch_entries(user, *day_bounds(day))
+    return {"date": day, "tasks": tasks, "meetings": meetings}
+
+
+def build_month(user, year, month):
+    """
+    Собирает сетку месяца за ограниченное число запросов
+
+    События месяца читаются из CalendarEntry одним range-запросом и раскладываются по дням в Python.
+    Результат - список недель, каждая неделя - 7 ячеек (None для дней соседних месяцев),
+    ячейка содержит дату и списки задач и встреч этого дня.
+    :param user: пользователь, для которого строится календарь
+    :param year: год
+    :param month: месяц
+    :return: словарь для шаблона месячного вида
+    """
+    first_day = date(year, month, 1)
+    last_day = date(year, month, monthrange(year, month)[1])
+
+    tasks, meetings = fetch_entries(user, *month_bounds(year, month))
+
+    tasks_by_day = {}
+    for entry in tasks:
+        tasks_by_day.setdefault(timezone.localdate(entry.start), []).append(entry)
+
+    meetings_by_day = {}
+    for entry in meetings:
+        meetings_by_day.setdefault(timezone.localdate(entry.start), []).append(entry)
+
+    weeks = []
+    week = [None] * first_day.weekday()
+    for number in range(1, last_day.day + 1):
+        current = date(year, month, number)
+        week.append(
+            {
+                "date": current,
+                "tasks": tasks_by_day.get(current, []),
+                "meetings": meetings_by_day.get(current, []),
+            }
+        )
+        if len(week) == 7:
+            weeks.append(week)
+            week = []
+    if week:
+        weeks.append(week + [None] * (7 - len(week)))
+
+    prev_year, prev_month = (year - 1, 12) if month == 1 else (year, month - 1)
+    next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+    return {
+        "year": year,
+        "month": month,
+        "month_name": MONTH_NAMES[month],
+        "prev_year": prev_year,
+        "prev_month": prev_month,
+        "prev_month_name": MONTH_NAMES[prev_month],
+        "next_year": next_year,
+        "next_month": next_month,
+        "next_month_name": MONTH_NAMES[next_month],
+        "weeks": weeks,
+    }
+
+
+def cached(user, key_parts, builder):
+    """
+    Достает результат построения календаря из кэша или строит и кладет его туда
+
+    Ключ содержит версию календаря пользователя, которую сигналы из crm.signals
+    увеличивают при изменении его задач и встреч, поэтому явное удаление ключей не нужно.
+    :param user: пользователь
+    :param key_parts: части ключа (вид календаря и период)
+    :param builder: функция без аргументов, которая строит результат
+    """
+    version = get_version(CACHE_NAMESPACE, user.pk)
+    key = make_key(CACHE_NAMESPACE, user.pk, version, *key_parts)
+    data = cache.get(key)
+    if data is None:
+        incr_counter("calendar_miss")
+        data = builder()
+        cache.set(key, data, timeout=settings.CRM_CALENDAR_CACHE_TIMEOUT)
+    else:
+        incr_counter("calendar_hit")
+    return data
+
+
+def get_month(user, year, month):
+    """Сетка месяца с кэшированием по (пользователь, год, месяц)"""
+    return cached(user, ("month", year, month), lambda: build_month(user, year, month))
+
+
+def get_day(user, day):
+    """События дня с кэшированием по (пользователь, дата)"""
+    return cached(user, ("day", day.isoformat()), lambda: build_day(user, day))
+
+
+_deferred = ContextVar("calendar_sync_deferred", default=None)
+
+
+@contextmanager
+def deferred_sync():
+    """
+    Откладывает синхронизацию календаря до выхода из блока
+
+    Сигналы внутри блока только запоминают id задач и встреч, на выходе
+    все они синхронизируются одним набором запросов. Нужно для массовых операций,
+    где сигналы приходят на каждую строку (например, QuerySet.delete()).
+    """
+    if _deferred.get() is not None:
+        yield
+        return
+    pending = {"tasks": set(), "meetings": set()}
+    token = _deferred.set(pending)
+    try:
+        yield
+    finally:
+        _deferred.reset(token)
+    if pending["tasks"]:
+        sync_task_calendars(pending["tasks"])
+    if pending["meetings"]:
+        sync_meeting_calendars(pending["meetings"])
+
+
+def bump_after_commit(user_ids):
+    """
+    Сбрасывает кэш календаря пользователей после коммита транзакции
+
+    До коммита параллельный запрос прочитал бы старые записи и сохранил их
+    под новой версией, и они жили бы в кэше до CRM_CALENDAR_CACHE_TIMEOUT
+    """
+    if user_ids:
+        transaction.on_commit(lambda: bump_versions(CACHE_NAMESPACE, user_ids))
+
+
+def sync_task_calendars(task_ids):
+    """Синхронизирует записи календаря задач и сбрасывает кэш затронутым исполнителям"""
+    pending = _deferred.get()
+    if pending is not None:
+        pending["tasks"].update(task_ids)
+        return
+    changed = CalendarEntry.objects.sync_tasks(task_ids)
+    bump_after_commit(changed)
+
+
+def sync_meeting_calendars(meeting_ids):
+    """
+    Синхронизирует записи календаря встреч и сбрасывает кэш календаря всем их участникам
+
+    Сбрасываем всем, а не только тем, чьи записи изменились: у участников меняется
+    количество участников встречи, а у серий - повторения (например, исключения),
+    которые в записи календаря не хранятся.
+    Вызывается сигналами и напрямую из массовых операций, которые сигналы не отправляют.
+    """
+    pending = _deferred.get()
+    if pending is not None:
+        pending["meetings"].update(meeting_ids)
+        return
+    changed = CalendarEntry.objects.sync_meetings(meeting_ids)
+    changed.update(
+        MeetingUser.objects.filter(meeting_id__in=meeting_ids).values_list(
+            "user_id", flat=True
+        )
+    )
+    bump_after_commit(changed)
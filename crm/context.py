@@ -0,0 +1,81 @@
+from django.db.models import OuterRef, Subquery
+from django.http import Http404
+
+from crm.cache import get_role
+from crm.models import Task, Team, TeamUser
+
+
+class CrmContext:
+    """
+    Кэш объектов CRM на время одного запроса
+
+    Миксины прав и views берут задачу, команду и роль пользователя отсюда,
+    поэтому каждая из них загружается не больше одного раза за запрос.
+    Задача загружается одним запросом вместе с командой, автором, исполнителем
+    и ролью текущего пользователя в команде задачи.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.tasks = {}
+        self.teams = {}
+        self.roles = {}
+
+    def task(self, task_pk):
+        """
+        Задача с командой, автором и исполнителем; роль пользователя в ее команде запоминается
+
+        :raise Http404: задачи нет
+        """
+        task_pk = int(task_pk)
+        if task_pk not in self.tasks:
+            tasks = Task.objects.select_related("team", "author", "performer")
+            if self.user.is_authenticated:
+                tasks = tasks.annotate(
+                    user_role=Subquery(
+                        TeamUser.objects.filter(
+                            team=OuterRef("team"), user=self.user
+                        ).values("role")[:1]
+                    )
+                )
+            task = tasks.filter(pk=task_pk).first()
+            if task is None:
+                raise Http404("Задача не найдена")
+            self.tasks[task_pk] = task
+            self.teams.setdefault(task.team_id, task.team)
+            self.roles.setdefault(task.team_id, getattr(task, "user_role", None))
+        return self.tasks[task_pk]
+
+    def role(self, team_pk):
+        """
+        Роль пользователя в команде или None, если он в ней не состоит
+
+        Берется из кэша ролей между запросами (crm.cache.get_role)
+        """
+        team_pk = int(team_pk)
+        if team_pk not in self.roles:
+            self.roles[team_pk] = (
+                get_role(self.user.pk, team_pk) if self.user.is_authenticated else None
+            )
+        return self.roles[team_pk]
+
+    def team(self, team_pk):
+        """
+        Команда
+
+        :raise Http404: команды нет
+        """
+        team_pk = int(team_pk)
+        if team_pk not in self.teams:
+            team = Team.objects.filter(pk=team_pk).first()
+            if team is None:
+                raise Http404("Команда не найдена")
+            self.teams[team_pk] = team
+        return self.teams[team_pk]
+
+
+def crm_context(request):
+    """Кэш запроса request.crm_ctx, создается при первом обращении"""
+    if not hasattr(request, "crm_ctx"):
+        request.crm_ctx = CrmContext(request.user)
+    return request.crm_ctx
@@ -0,0 +1,121 @@
+import csv
+import io
+import json
+
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from crm.models import Comment
+
+CSV = "csv"
+NDJSON = "ndjson"
+CONTENT_TYPES = {
+    CSV: "text/csv; charset=utf-8",
+    NDJSON: "application/x-ndjson",
+}
+
+COLUMNS = [
+    "id",
+    "name",
+    "description",
+    "status",
+    "created_at",
+    "updated_at",
+    "deadline",
+    "author_id",
+    "author",
+    "performer_id",
+    "performer",
+    "evaluation",
+    "comments",
+]
+
+CHUNK_SIZE = 2000
+
+
+def export_queryset(tasks):
+    """
+    Задачи для выгрузки: автор, исполнитель и оценка одним JOIN,
+    количество комментариев - коррелированным подзапросом
+
+    Подзапрос считает комментарии одной задачи по индексу crm_comment.task_id,
+    поэтому не нужен GROUP BY по всем колонкам выборки
+    """
+    comments = (
+        Comment.objects.filter(task=OuterRef("pk"))
+        .order_by()
+        .values("task")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    return tasks.select_related("author", "performer", "evaluation").annotate(
+        comments_count=Coalesce(Subquery(comments, output_field=IntegerField()), 0)
+    )
+
+
+def task_row(task):
+    evaluation = getattr(task, "evaluation", None)
+    return {
+        "id": task.pk,
+        "name": task.name,
+        "description": task.description,
+        "status": task.status,
+        "created_at": task.created_at.isoformat(),
+        "updated_at": task.updated_at.isoformat() if task.updated_at else None,
+        "deadline": task.deadline.isoformat() if task.deadline else None,
+        "author_id": task.author_id,
+        "author": task.author.username if task.author else None,
+        "performer_id": task.performer_id,
+        "performer": task.performer.username if task.performer else None,
+        "evaluation": evaluation.evaluation if evaluation else None,
+        "comments": task.comments_count,
+    }
+
+
+def iter_rows(tasks, chunk_size=CHUNK_SIZE):
+    """Строки выгрузки; из базы читается по chunk_size задач, список в памяти не строится"""
+    for task in export_queryset(tasks).iterator(chunk_size=chunk_size):
+        yield task_row(task)
+
+
+def iter_csv(rows, chunk_size=CHUNK_SIZE):
+    """
+    CSV с заголовком, отдается кусками по chunk_size строк
+
+    Буфер очищается после каждого куска, поэтому память не растет с размером выгрузки
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, COLUMNS)
+    writer.writeheader()
+    for number, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if number % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_ndjson(rows, chunk_size=CHUNK_SIZE):
+    """JSON Lines: по обьекту на строку, отдается кусками по chunk_size строк"""
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(row, ensure_ascii=False) + "\n")
+        if len(lines) >= chunk_size:
+            yield "".join(lines)
+            lines = []
+    yield "".join(lines)
+
+
+def stream(tasks, fmt, chunk_size=CHUNK_SIZE):
+    """
+    Выгрузка задач в формате fmt (CSV или NDJSON) как итератор строк
+
+    :param tasks: выборка задач с нужными фильтрами и сортировкой
+    :param fmt: CSV или NDJSON
+    :param chunk_size: сколько задач читать из базы и отдавать за раз
+    """
+    rows = iter_rows(tasks, chunk_size)
+    if fmt == CSV:
+        return iter_csv(rows, chunk_size)
+    return iter_ndjson(rows, chunk_size)
@@ -1,8 +1,14 @@
+from datetime import date, timedelta
+
 from django import forms
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
+from django.db.models import Q
 from django.forms import ModelForm
+from django.utils import timezone
 
+from crm.calendar_engine import day_start
+from crm.memberships import MAX_ASSIGNMENTS, read_assignments
 from crm.models import Team, TeamUser, Task, Evaluation, Meeting, MeetingUser, Comment
 
 
@@ -178,16 +184,90 @@ class CommentCreateForm(ModelForm):
 class MeetingCreateForm(forms.ModelForm):
     """
     Форма для создания встречи
+
+    Исключения повторений вводятся датами через запятую
     """
 
+    recurrence_exceptions = forms.CharField(
+        required=False, help_text="Даты пропуска повторений через запятую, ГГГГ-ММ-ДД"
+    )
+
     class Meta:
         model = Meeting
-        fields = ["start_datetime", "end_datetime", "name", "description"]
+        fields = [
+            "start_datetime",
+            "end_datetime",
+            "name",
+            "description",
+            "recurrence",
+            "recurrence_until",
+            "recurrence_count",
+            "recurrence_exceptions",
+        ]
         widgets = {
-            "start_datetime": forms.DateTimeInput(attrs={"type": "datetime-local"}),
-            "end_datetime": forms.DateTimeInput(attrs={"type": "datetime-local"}),
+            "start_datetime": forms.DateTimeInput(
+                attrs={"type": "datetime-local"}, format="%Y-%m-%dT%H:%M"
+            ),
+            "end_datetime": forms.DateTimeInput(
+                attrs={"type": "datetime-local"}, format="%Y-%m-%dT%H:%M"
+            ),
+            "recurrence_until": forms.DateTimeInput(
+                attrs={"type": "datetime-local"}, format="%Y-%m-%dT%H:%M"
+            ),
         }
 
+    def clean_recurrence_exceptions(self):
+        """
+        Преобразуем строку дат в список ISO-дат для JSON-поля
+        :return:
+        """
+        raw = self.cleaned_data.get("recurrence_exceptions") or ""
+        try:
+            return sorted(
+                {
+                    date.fromisoformat(value.strip()).isoformat()
+                    for value in raw.split(",")
+                    if value.strip()
+                }
+            )
+        except ValueError:
+            raise forms.ValidationError("Даты нужно указывать в формате ГГГГ-ММ-ДД")
+
+
+class MeetingWindowForm(forms.Form):
+    """
+    Окно, за которое показываются встречи и их повторения
+
+    По умолчанию ближайшие DEFAULT_DAYS дней. Окно не длиннее MAX_DAYS:
+    бесконечные серии разворачиваются в повторения на все окно
+    """
+
+    DEFAULT_DAYS = 30
+    MAX_DAYS = 92
+
+    date_from = forms.DateField(required=False)
+    date_to = forms.DateField(required=False)
+
+    def clean(self):
+        """
+        Подставляем значения по умолчанию и проверяем окно
+        :return:
+        """
+        cleaned_data = super().clean()
+        if self.errors:
+            return cleaned_data
+        date_from = cleaned_data.get("date_from") or timezone.localdate()
+        date_to = cleaned_data.get("date_to") or date_from + timedelta(
+            days=self.DEFAULT_DAYS
+        )
+        if date_to <= date_from:
+            raise forms.ValidationError("Конец окна должен быть позже начала")
+        if date_to - date_from > timedelta(days=self.MAX_DAYS):
+            raise forms.ValidationError(f"Окно не может быть длиннее {self.MAX_DAYS} дней")
+        cleaned_data["date_from"] = date_from
+        cleaned_data["date_to"] = date_to
+        return cleaned_data
+
 
 class MeetingAddUserForm(forms.ModelForm):
     """
@@ -197,3 +277,276 @@ class MeetingAddUserForm(forms.ModelForm):
     class Meta:
         model = MeetingUser
         fields = ["user"]
+
+
+class FreeSlotsForm(forms.Form):
+    """
+    Параметры поиска свободных слотов для встречи
+
+    users: id пользователей через запятую
+    meeting: id встречи, ее участников тоже можно указать в users
+    duration: длительность встречи в минутах
+    start, end: окно поиска, по умолчанию ближайшая неделя
+    limit: сколько слотов вернуть
+
+    Занятость видна только для пользователей из команды user и участников встречи,
+    в которой user участвует сам
+    """
+
+    users = forms.CharField(required=False)
+    meeting = forms.IntegerField(required=False)
+    duration = forms.IntegerField(min_value=5, max_value=24 * 60, required=False)
+    start = forms.DateTimeField(required=False)
+    end = forms.DateTimeField(required=False)
+    limit = forms.IntegerField(min_value=1, max_value=50, required=False)
+
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user = user
+
+    def clean_users(self):
+        """
+        Разбираем список id пользователей
+        :return:
+        """
+        raw = self.cleaned_data.get("users") or ""
+        try:
+            return {int(value) for value in raw.split(",") if value.strip()}
+        except ValueError:
+            raise forms.ValidationError("Некорректный список пользователей")
+
+    def clean(self):
+        """
+        Подставляем значения по умолчанию и проверяем окно поиска
+        :return:
+        """
+        cleaned_data = super().clean()
+        users = cleaned_data.get("users") or set()
+        if users - self.visible_users(users, cleaned_data.get("meeting")):
+            self.add_error("users", "Нет доступа к занятости указанных пользователей")
+        start = cleaned_data.get("start") or timezone.now()
+        end = cleaned_data.get("end") or start + timedelta(days=7)
+        if start >= end:
+            raise forms.ValidationError("Конец окна поиска должен быть позже начала")
+        cleaned_data["start"] = start
+        cleaned_data["end"] = end
+        cleaned_data["duration"] = timedelta(minutes=cleaned_data.get("duration") or 60)
+        cleaned_data["limit"] = cleaned_data.get("limit") or 5
+        return cleaned_data
+
+    def visible_users(self, user_ids, meeting_pk):
+        """
+        Id из user_ids, чью занятость может видеть self.user
+        :param user_ids: запрошенные id
+        :param meeting_pk: id встречи или None
+        :return: множество id
+        """
+        if not user_ids:
+            return set()
+        allowed = Q(memberships__team__members__user=self.user)
+        if meeting_pk is not None:
+            allowed |= Q(
+                meeting_participations__meeting_id=meeting_pk,
+                meeting_participations__meeting__participants__user=self.user,
+            )
+        return set(
+            User.objects.filter(allowed, pk__in=user_ids).values_list("pk", flat=True)
+        )
+
+
+class TaskFilterForm(forms.Form):
+    """
+    Фильтры и сортировка списка задач команды
+
+    Используется и в HTML-списке, и в JSON-эндпоинте. Каждой сортировке соответствует
+    ключ keyset-пагинации, последним полем всегда идет id
+    """
+
+    SORTS = {
+        "-created_at": ["-created_at", "-id"],
+        "created_at": ["created_at", "id"],
+        "deadline": ["deadline", "id"],
+    }
+
+    status = forms.ChoiceField(
+        choices=[("", "Все статусы"), *Task.Status.choices], required=False
+    )
+    performer = forms.ModelChoiceField(
+        queryset=User.objects.none(), required=False, empty_label="Все исполнители"
+    )
+    author = forms.ModelChoiceField(
+        queryset=User.objects.none(), required=False, empty_label="Все авторы"
+    )
+    deadline_from = forms.DateField(
+        required=False, widget=forms.DateInput(attrs={"type": "date"})
+    )
+    deadline_to = forms.DateField(
+        required=False, widget=forms.DateInput(attrs={"type": "date"})
+    )
+    overdue = forms.BooleanField(required=False)
+    sort = forms.ChoiceField(
+        choices=[
+            ("-created_at", "Сначала новые"),
+            ("created_at", "Сначала старые"),
+            ("deadline", "По дедлайну"),
+        ],
+        required=False,
+    )
+
+    def __init__(self, *args, team_pk=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        members = User.objects.filter(memberships__team_id=team_pk)
+        self.fields["performer"].queryset = members
+        self.fields["author"].queryset = members
+
+    def filter(self, tasks):
+        """
+        Применяет фильтры формы к выборке задач
+        Границы дедлайна - полуоткрытый интервал [начало deadline_from, начало дня после deadline_to)
+        :param tasks: выборка задач
+        :return: отфильтрованная выборка
+        """
+        data = self.cleaned_data
+        if data.get("status"):
+            tasks = tasks.filter(status=data["status"])
+        if data.get("performer"):
+            tasks = tasks.filter(performer=data["performer"])
+        if data.get("author"):
+            tasks = tasks.filter(author=data["author"])
+        if data.get("deadline_from"):
+            tasks = tasks.filter(deadline__gte=day_start(data["deadline_from"]))
+        if data.get("deadline_to"):
+            tasks = tasks.filter(
+                deadline__lt=day_start(data["deadline_to"] + timedelta(days=1))
+            )
+        if data.get("overdue"):
+            tasks = tasks.overdue()
+        return tasks
+
+    def ordering(self):
+        return self.SORTS[self.cleaned_data.get("sort") or "-created_at"]
+
+
+class TaskBulkForm(forms.Form):
+    """
+    Массовое действие над задачами команды
+
+    task_pks: id задач (несколько значений или через запятую)
+    action: переназначить, сменить статус или удалить
+    status, performer: новые значения для соответствующих действий
+    """
+
+    MAX_TASKS = 500
+
+    task_pks = forms.Field(widget=forms.MultipleHiddenInput)
+    action = forms.ChoiceField(
+        choices=[
+            ("reassign", "Переназначить"),
+            ("status", "Сменить статус"),
+            ("delete", "Удалить"),
+        ]
+    )
+    status = forms.ChoiceField(choices=Task.Status.choices, required=False)
+    performer = forms.ModelChoiceField(queryset=User.objects.none(), required=False)
+
+    def __init__(self, *args, team_pk=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["performer"].queryset = User.objects.filter(
+            memberships__team_id=team_pk
+        )
+
+    def clean_task_pks(self):
+        """
+        Разбираем список id задач
+        :return:
+        """
+        values = self.cleaned_data.get("task_pks") or []
+        try:
+            task_pks = {
+                int(value)
+                for raw in values
+                for value in raw.split(",")
+                if value.strip()
+            }
+        except ValueError:
+            raise forms.ValidationError("Некорректный список задач")
+        if not task_pks:
+            raise forms.ValidationError("Не выбраны задачи")
+        if len(task_pks) > self.MAX_TASKS:
+            raise forms.ValidationError(f"Не больше {self.MAX_TASKS} задач за раз")
+        return task_pks
+
+    def clean(self):
+        """
+        Проверяем, что для действия переданы нужные значения
+        :return:
+        """
+        cleaned_data = super().clean()
+        action = cleaned_data.get("action")
+        if action == "status" and not cleaned_data.get("status"):
+            self.add_error("status", "Укажите статус")
+        if action == "reassign" and not cleaned_data.get("performer"):
+            self.add_error("performer", "Укажите исполнителя")
+        return cleaned_data
+
+
+class TaskImportForm(forms.Form):
+    """
+    Загрузка файла задач для импорта в админке
+    """
+
+    file = forms.FileField(help_text="CSV с заголовком или JSON (массив или JSON Lines)")
+    format = forms.ChoiceField(
+        choices=[("", "По расширению файла"), ("csv", "CSV"), ("json", "JSON")],
+        required=False,
+    )
+    batch_size = forms.IntegerField(min_value=1, max_value=10000, initial=1000)
+
+
+class UserAutocompleteForm(forms.Form):
+    """
+    Параметры автодополнения пользователей
+
+    q: начало username или email
+    not_in_team, not_in_meeting: исключить участников команды или встречи
+    without_team: только пользователи без команды
+    limit: размер страницы
+    """
+
+    q = forms.CharField(max_length=150, required=False)
+    not_in_team = forms.IntegerField(required=False)
+    not_in_meeting = forms.IntegerField(required=False)
+    without_team = forms.BooleanField(required=False)
+    limit = forms.IntegerField(min_value=1, max_value=50, required=False)
+
+
+class TeamMembershipsForm(forms.Form):
+    """
+    Массовое изменение составов команд
+
+    assignments: строки username,team_id,role (пустой team_id - убрать из команды)
+    dry_run: только проверить
+    """
+
+    assignments = forms.CharField(
+        widget=forms.Textarea(attrs={"rows": 15}),
+        label="Назначения",
+        help_text="По строке на пользователя: username,id команды,роль. "
+        "Без id команды - убрать из команды, без роли - обычный пользователь",
+    )
+    dry_run = forms.BooleanField(required=False, label="Только проверить")
+
+    def clean_assignments(self):
+        """
+        Разбираем строки назначений
+        :return:
+        """
+        try:
+            assignments = read_assignments(self.cleaned_data["assignments"].splitlines())
+        except ValueError as e:
+            raise forms.ValidationError(str(e))
+        if not assignments:
+            raise forms.ValidationError("Не указаны назначения")
+        if len(assignments) > MAX_ASSIGNMENTS:
+            raise forms.ValidationError(f"Не больше {MAX_ASSIGNMENTS} назначений за раз")
+        return assignments
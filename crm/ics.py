@@ -0,0 +1,240 @@
+from datetime import UTC, datetime
+from hashlib import md5
+
+from django.core import signing
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+
+from crm import recurrence
+from crm.models import CalendarFeed, Meeting, MeetingUser, Task, new_feed_secret
+
+FEED_SALT = "crm.calendar.feed"
+
+TODO_STATUSES = {
+    Task.Status.open: "NEEDS-ACTION",
+    Task.Status.processing: "IN-PROCESS",
+    Task.Status.done: "COMPLETED",
+}
+
+
+def sign_feed(user_pk, secret):
+    return signing.Signer(salt=FEED_SALT).signature(f"{user_pk}:{secret}")
+
+
+def feed_token(user_pk):
+    """
+    Подпись для ссылки на подписку, чтобы внешний клиент мог читать ленту без сессии
+
+    В подпись входит секрет пользователя из CalendarFeed, при первом обращении он создается
+    """
+    feed, _ = CalendarFeed.objects.get_or_create(user_id=user_pk)
+    return sign_feed(user_pk, feed.secret)
+
+
+def check_feed_token(user_pk, token):
+    if not token:
+        return False
+    secret = (
+        CalendarFeed.objects.filter(user_id=user_pk)
+        .values_list("secret", flat=True)
+        .first()
+    )
+    return secret is not None and constant_time_compare(
+        sign_feed(user_pk, secret), token
+    )
+
+
+def reset_feed_token(user_pk):
+    """
+    Меняет секрет пользователя: все выданные ранее ссылки на подписку перестают работать
+    :param user_pk: id пользователя
+    :return: новый токен
+    """
+    feed, _ = CalendarFeed.objects.update_or_create(
+        user_id=user_pk, defaults={"secret": new_feed_secret()}
+    )
+    return sign_feed(user_pk, feed.secret)
+
+
+def feed_version(user_pk):
+    """
+    Версия ленты пользователя для условного GET
+
+    Считается двумя агрегатами без чтения самих событий: максимальный updated_at
+    и количество задач и участий во встречах. Количество и последний id участия
+    меняются при удалении событий и добавлении в старые встречи,
+    которые не двигают updated_at.
+    :param user_pk: id пользователя
+    :return: (etag, last_modified)
+    """
+    tasks = Task.objects.filter(performer_id=user_pk).aggregate(
+        total=Count("id"), updated=Max("updated_at")
+    )
+    meetings = MeetingUser.objects.filter(user_id=user_pk).aggregate(
+        total=Count("id"), last_id=Max("id"), updated=Max("meeting__updated_at")
+    )
+    updates = [value for value in (tasks["updated"], meetings["updated"]) if value]
+    last_modified = max(updates) if updates else None
+    raw = "|".join(
+        str(value)
+        for value in (
+            tasks["total"],
+            tasks["updated"],
+            meetings["total"],
+            meetings["last_id"],
+            meetings["updated"],
+        )
+    )
+    return md5(raw.encode()).hexdigest(), last_modified
+
+
+def format_datetime(value):
+    return value.astimezone(UTC).strftime("%Y%m%dT%H%M%SZ")
+
+
+def escape_text(value):
+    """Экранирование TEXT-значения по RFC 5545"""
+    return (
+        value.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+def fold(line):
+    """Перенос строк длиннее 75 октетов по RFC 5545"""
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line + "\r\n"
+    parts = []
+    while encoded:
+        limit = 75 if not parts else 74
+        cut = min(limit, len(encoded))
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode())
+        encoded = encoded[cut:]
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def content_lines(properties):
+    return "".join(
+        fold(f"{key}:{value}") for key, value in properties if value is not None
+    )
+
+
+def component(name, properties):
+    return content_lines([("BEGIN", name), *properties, ("END", name)])
+
+
+def recurrence_properties(meeting):
+    """
+    RRULE и EXDATE для серии встреч
+
+    RFC 5545 не разрешает COUNT и UNTIL вместе, поэтому при обоих ограничениях
+    COUNT переводится в UNTIL и берется более раннее
+    """
+    if not recurrence.is_recurring(meeting):
+        return []
+    until = meeting.recurrence_until
+    rule = f"FREQ={meeting.recurrence.upper()}"
+    if meeting.recurrence_count and until:
+        last = recurrence.shift(
+            meeting.start_datetime, meeting.recurrence, meeting.recurrence_count - 1
+        )
+        until = min(until, last)
+    elif meeting.recurrence_count:
+        rule += f";COUNT={meeting.recurrence_count}"
+    if until:
+        rule += f";UNTIL={format_datetime(until)}"
+
+    start_time = timezone.localtime(meeting.start_datetime).time()
+    exceptions = [
+        format_datetime(
+            timezone.make_aware(
+                datetime.combine(datetime.fromisoformat(day).date(), start_time)
+            )
+        )
+        for day in meeting.recurrence_exceptions or []
+    ]
+    properties = [("RRULE", rule)]
+    if exceptions:
+        properties.append(("EXDATE", ",".join(exceptions)))
+    return properties
+
+
+def meeting_component(meeting, stamp):
+    return component(
+        "VEVENT",
+        [
+            ("UID", f"meeting-{meeting.pk}@crm"),
+            ("DTSTAMP", format_datetime(meeting.updated_at or stamp)),
+            ("DTSTART", format_datetime(meeting.start_datetime)),
+            ("DTEND", format_datetime(meeting.end_datetime)),
+            ("SUMMARY", escape_text(meeting.name)),
+            ("DESCRIPTION", escape_text(meeting.description)),
+            *recurrence_properties(meeting),
+        ],
+    )
+
+
+def task_component(task, stamp):
+    return component(
+        "VTODO",
+        [
+            ("UID", f"task-{task.pk}@crm"),
+            ("DTSTAMP", format_datetime(task.updated_at or stamp)),
+            ("DUE", format_datetime(task.deadline) if task.deadline else None),
+            ("SUMMARY", escape_text(task.name)),
+            ("DESCRIPTION", escape_text(task.description)),
+            ("STATUS", TODO_STATUSES.get(task.status)),
+        ],
+    )
+
+
+def iter_calendar(user, chunk_size=500):
+    """
+    Генератор iCalendar-ленты пользователя
+
+    Встречи и задачи читаются через .iterator(), поэтому память не растет
+    с количеством событий. Отдает по одному компоненту за шаг.
+    :param user: пользователь
+    :param chunk_size: размер пачки при чтении из базы
+    """
+    stamp = timezone.now()
+    yield content_lines(
+        [
+            ("BEGIN", "VCALENDAR"),
+            ("VERSION", "2.0"),
+            ("PRODID", "-//finalProjectCrm//CRM Calendar//RU"),
+            ("CALSCALE", "GREGORIAN"),
+            ("X-WR-CALNAME", escape_text(f"CRM: {user.username}")),
+        ]
+    )
+
+    meetings = Meeting.objects.filter(
+        pk__in=MeetingUser.objects.filter(user=user).values("meeting_id")
+    ).only(
+        "name",
+        "description",
+        "start_datetime",
+        "end_datetime",
+        "updated_at",
+        "recurrence",
+        "recurrence_until",
+        "recurrence_count",
+        "recurrence_exceptions",
+    )
+    for meeting in meetings.iterator(chunk_size=chunk_size):
+        yield meeting_component(meeting, stamp)
+
+    tasks = Task.objects.filter(performer=user).only(
+        "name", "description", "status", "deadline", "updated_at"
+    )
+    for task in tasks.iterator(chunk_size=chunk_size):
+        yield task_component(task, stamp)
+
+    yield content_lines([("END", "VCALENDAR")])
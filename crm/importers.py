@@ -0,0 +1,308 @@
+import csv
+import json
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from crm import activity, stats
+from crm.calendar_engine import sync_task_calendars
+from crm.forms import TaskCreateForm
+from crm.models import Task, TaskEvent, Team, TeamUser
+
+CSV = "csv"
+JSON = "json"
+
+FIELDS = ["name", "description", "status", "deadline", "team", "performer", "author"]
+REJECT_FIELDS = ["line", *FIELDS, "errors"]
+
+
+def detect_format(filename):
+    return JSON if filename.lower().endswith((".json", ".jsonl", ".ndjson")) else CSV
+
+
+MAX_OBJECT_SIZE = 1024 * 1024
+
+WHITESPACE = " \t\r\n"
+
+
+class Malformed:
+    """Фрагмент JSON-файла, который не удалось разобрать; импорт пишет его в отказы"""
+
+    def __init__(self, error):
+        self.error = error
+
+
+def iter_json(stream, chunk_size=64 * 1024, max_size=MAX_OBJECT_SIZE):
+    """
+    Потоково читает JSON-массив обьектов или обьекты по одному на строку (JSON Lines)
+
+    Файл читается кусками, в памяти одновременно не больше одного обьекта
+    длиной до max_size символов и текущего куска. Вместо нераспознанного
+    фрагмента отдается Malformed, импорт продолжается со следующей строки.
+    """
+    chunks = iter(lambda: stream.read(chunk_size), "")
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk
+        if buffer.strip(WHITESPACE):
+            break
+    if buffer.lstrip(WHITESPACE).startswith("["):
+        yield from iter_json_array(buffer, chunks, max_size)
+    else:
+        yield from iter_json_lines(buffer, chunks, max_size)
+
+
+def decode_line(line, number):
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError as e:
+        return Malformed(f"Строка {number}: некорректный JSON ({e.msg})")
+
+
+def iter_json_lines(buffer, chunks, max_size):
+    """
+    JSON Lines: каждая строка разбирается отдельно, некорректная строка - Malformed
+
+    Строка длиннее max_size не накапливается, а пропускается до конца
+    """
+    number = 0
+    skipping = False
+    while True:
+        start = 0
+        while (newline := buffer.find("\n", start)) != -1:
+            line = buffer[start:newline]
+            start = newline + 1
+            if skipping:
+                skipping = False
+                continue
+            number += 1
+            if line.strip(WHITESPACE):
+                yield decode_line(line, number)
+        buffer = buffer[start:]
+        if len(buffer) > max_size:
+            if not skipping:
+                number += 1
+                skipping = True
+                yield Malformed(f"Строка {number}: длиннее {max_size} символов")
+            buffer = ""
+        chunk = next(chunks, None)
+        if chunk is None:
+            if not skipping and buffer.strip(WHITESPACE):
+                yield decode_line(buffer, number + 1)
+            return
+        buffer += chunk
+
+
+def iter_json_array(buffer, chunks, max_size):
+    """
+    Элементы JSON-массива верхнего уровня, вложенные массивы остаются значениями
+
+    Недочитанный элемент дополняется следующими кусками, пока он не длиннее max_size.
+    После ошибки разбора границы следующих элементов неизвестны, поэтому отдается
+    Malformed с позицией ошибки в файле и чтение заканчивается.
+    """
+    decoder = json.JSONDecoder()
+    offset = 0
+    position = buffer.index("[") + 1
+    expect_value = True
+    empty = True
+    while True:
+        while position < len(buffer) and buffer[position] in WHITESPACE:
+            position += 1
+        if position >= len(buffer):
+            chunk = next(chunks, None)
+            if chunk is None:
+                yield Malformed(f"Позиция {offset + position}: массив не закрыт")
+                return
+            offset += position
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        char = buffer[position]
+        if char == "]" and (not expect_value or empty):
+            return
+        if not expect_value:
+            if char != ",":
+                yield Malformed(f"Позиция {offset + position}: ожидалась запятая")
+                return
+            position += 1
+            expect_value = True
+            continue
+        try:
+            obj, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError as e:
+            chunk = None
+            if len(buffer) - position <= max_size:
+                chunk = next(chunks, None)
+            if chunk is None:
+                yield Malformed(
+                    f"Позиция {offset + e.pos}: некорректный JSON ({e.msg})"
+                )
+                return
+            offset += position
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        if end == len(buffer):
+            # число на границе куска могло разобраться не целиком
+            chunk = next(chunks, None)
+            if chunk is not None:
+                offset += position
+                buffer, position = buffer[position:] + chunk, 0
+                continue
+        yield obj
+        position = end
+        expect_value = empty = False
+
+
+def iter_rows(stream, fmt):
+    """Строки файла как словари, по одной"""
+    if fmt == JSON:
+        yield from iter_json(stream)
+    else:
+        yield from csv.DictReader(stream)
+
+
+class TaskImporter:
+    """
+    Потоковый импорт задач из CSV или JSON
+
+    Каждая строка проверяется правилами TaskCreateForm, команды и пользователи
+    ищутся по заранее загруженным словарям, корректные задачи вставляются
+    пачками через bulk_create, некорректные строки пишутся в файл отказов.
+    В памяти держится только текущая пачка.
+
+    Колонки: name, description, status, deadline, team (id или название),
+    performer и author (username или id). Исполнитель должен состоять в команде задачи.
+    :param rejects: текстовый файл для отказов (CSV) или None
+    :param batch_size: размер пачки bulk_create
+    :param progress: функция (обработано, создано, отклонено), вызывается после каждой пачки
+    :param default_author: автор задач, если в строке он не указан
+    """
+
+    def __init__(
+        self, rejects=None, batch_size=1000, progress=None, default_author=None
+    ):
+        self.batch_size = batch_size
+        self.progress = progress
+        self.default_author = default_author
+        self.rejects = None
+        if rejects is not None:
+            self.rejects = csv.DictWriter(rejects, REJECT_FIELDS, extrasaction="ignore")
+            self.rejects.writeheader()
+        self.processed = 0
+        self.created = 0
+        self.rejected = 0
+
+        self.teams = {}
+        for pk, name in Team.objects.values_list("pk", "name").iterator():
+            self.teams[str(pk)] = pk
+            self.teams.setdefault(name, pk)
+        self.users = {}
+        for pk, username in User.objects.values_list("pk", "username").iterator():
+            self.users[str(pk)] = pk
+            self.users.setdefault(username, pk)
+        self.memberships = dict(TeamUser.objects.values_list("user_id", "team_id"))
+
+    def resolve(self, row):
+        """
+        Проверяет строку и собирает из нее несохраненную задачу
+
+        :return: (Task или None, список ошибок)
+        """
+        data = {field: row.get(field) or "" for field in TaskCreateForm.Meta.fields}
+        data["status"] = data["status"] or Task.Status.open
+        form = TaskCreateForm(data)
+        errors = [
+            f"{field}: {message}"
+            for field, messages in form.errors.items()
+            for message in messages
+        ]
+
+        team_id = self.teams.get(str(row.get("team") or "").strip())
+        if team_id is None:
+            errors.append("team: команда не найдена")
+
+        performer_id = None
+        performer = str(row.get("performer") or "").strip()
+        if performer:
+            performer_id = self.users.get(performer)
+            if performer_id is None:
+                errors.append("performer: пользователь не найден")
+            elif team_id is not None and self.memberships.get(performer_id) != team_id:
+                errors.append("performer: пользователь не состоит в команде")
+
+        author_id = self.default_author
+        author = str(row.get("author") or "").strip()
+        if author:
+            author_id = self.users.get(author)
+            if author_id is None:
+                errors.append("author: пользователь не найден")
+
+        if errors:
+            return None, errors
+        task = form.save(commit=False)
+        task.team_id = team_id
+        task.performer_id = performer_id
+        task.author_id = author_id
+        return task, []
+
+    def run(self, rows):
+        """
+        Импортирует строки
+
+        :param rows: итератор словарей
+        :return: (создано, отклонено)
+        """
+        batch = []
+        for line, row in enumerate(rows, start=1):
+            self.processed += 1
+            if isinstance(row, Malformed):
+                self.reject(line, {}, [row.error])
+                continue
+            if not isinstance(row, dict):
+                self.reject(line, {}, ["строка должна быть обьектом"])
+                continue
+            task, errors = self.resolve(row)
+            if errors:
+                self.reject(line, row, errors)
+                continue
+            batch.append(task)
+            if len(batch) >= self.batch_size:
+                self.flush(batch)
+                batch = []
+        self.flush(batch)
+        return self.created, self.rejected
+
+    def reject(self, line, row, errors):
+        self.rejected += 1
+        if self.rejects is not None:
+            self.rejects.writerow({**row, "line": line, "errors": "; ".join(errors)})
+
+    def flush(self, batch):
+        """
+        Вставляет пачку одним bulk_create
+
+        bulk_create не отправляет сигналы, поэтому календарь синхронизируется явно,
+        поисковый индекс обновляют триггеры базы. События создания задач
+        записываются в журнал вторым INSERT на пачку, счетчики статусов команд
+        сдвигаются одним UPDATE на команду
+        """
+        if batch:
+            with transaction.atomic():
+                tasks = Task.objects.bulk_create(batch)
+                sync_task_calendars(
+                    [task.pk for task in tasks if task.performer_id and task.deadline]
+                )
+                stats.apply(Counter((task.team_id, task.status) for task in tasks))
+                activity.record(
+                    TaskEvent(
+                        task_id=task.pk,
+                        team_id=task.team_id,
+                        user_id=task.author_id,
+                        kind=TaskEvent.Kind.CREATED,
+                    )
+                    for task in tasks
+                )
+            self.created += len(batch)
+        if self.progress:
+            self.progress(self.processed, self.created, self.rejected)
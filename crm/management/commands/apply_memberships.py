@@ -0,0 +1,59 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from crm import memberships
+
+
+class Command(BaseCommand):
+    """
+    Массовое изменение составов команд из CSV username,team_id,role
+    """
+
+    help = (
+        "Добавляет, переводит, меняет роль и убирает пользователей из команд "
+        "одной транзакцией; при ошибке в любой строке ничего не меняет"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только проверить назначения и показать изменения",
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        if not path.exists():
+            raise CommandError(f"Файл {path} не найден")
+        with path.open(encoding="utf-8-sig", newline="") as source:
+            try:
+                assignments = memberships.read_assignments(source)
+            except ValueError as e:
+                raise CommandError(str(e))
+
+        try:
+            report = memberships.apply(assignments, dry_run=options["dry_run"])
+        except IntegrityError as e:
+            raise CommandError(f"Ошибка: {e}")
+
+        for username, reason in report["errors"].items():
+            self.stderr.write(f"{username}: {reason}")
+        if report["errors"]:
+            raise CommandError(
+                f"Некорректных назначений: {len(report['errors'])}, изменения не применены"
+            )
+
+        summary = (
+            f"добавлено {len(report[memberships.ADDED])}, "
+            f"переведено {len(report[memberships.MOVED])}, "
+            f"роль изменена {len(report[memberships.UPDATED])}, "
+            f"удалено {len(report[memberships.REMOVED])}, "
+            f"без изменений {len(report[memberships.UNCHANGED])}"
+        )
+        if options["dry_run"]:
+            self.stdout.write(f"Будет: {summary}")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Готово: {summary}"))
@@ -0,0 +1,122 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from crm.models import Meeting, MeetingUser, overlap_filter
+
+# Встречи истории идут через STEP и длятся DURATION, поэтому не пересекаются
+STEP = timedelta(hours=2)
+DURATION = timedelta(hours=1)
+
+
+class Command(BaseCommand):
+    """
+    Замер времени проверки пересечения встреч при росте истории пользователя
+
+    История создается в транзакции, которая откатывается в конце, данные в базе не остаются.
+    Для сравнения замеряется и прежний запрос через join с Meeting.
+    """
+
+    help = "Замеряет время проверки пересечений встреч для истории разного размера"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default="1000,10000,100000,1000000",
+            help="Размеры истории через запятую",
+        )
+        parser.add_argument("--probes", type=int, default=100)
+        parser.add_argument("--batch-size", type=int, default=10000)
+        parser.add_argument(
+            "--skip-join", action="store_true", help="Не замерять прежний запрос"
+        )
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options["sizes"].split(","))
+        self.stdout.write(f"{'история':>10} {'probe, мс':>20} {'join, мс':>20}")
+        with transaction.atomic():
+            user = User.objects.create(username=f"benchmark-{time.time_ns()}")
+            origin = timezone.now() - STEP * sizes[-1]
+            created = 0
+            for size in sizes:
+                self.grow_history(user, origin, created, size, options["batch_size"])
+                created = size
+                probe = self.measure(
+                    lambda meeting: MeetingUser.objects.conflicts(meeting, [user.pk]),
+                    origin,
+                    size,
+                    options["probes"],
+                )
+                join = "-"
+                if not options["skip_join"]:
+                    join = self.measure(
+                        lambda meeting: list(
+                            MeetingUser.objects.filter(user=user).filter(
+                                overlap_filter(
+                                    meeting.start_datetime,
+                                    meeting.end_datetime,
+                                    prefix="meeting__",
+                                )
+                            )
+                        ),
+                        origin,
+                        size,
+                        options["probes"],
+                    )
+                self.stdout.write(f"{size:>10} {probe:>20} {join:>20}")
+            transaction.set_rollback(True)
+
+    def grow_history(self, user, origin, start, stop, batch_size):
+        """
+        Достраивает историю встреч пользователя с номера start до stop
+
+        Используется bulk_create, поэтому series_end и интервал участия заполняются вручную
+        """
+        for offset in range(start, stop, batch_size):
+            meetings = []
+            for number in range(offset, min(offset + batch_size, stop)):
+                begin = origin + STEP * number
+                meetings.append(
+                    Meeting(
+                        creator=user,
+                        name="benchmark",
+                        description="benchmark",
+                        start_datetime=begin,
+                        end_datetime=begin + DURATION,
+                        series_end=begin + DURATION,
+                    )
+                )
+            meetings = Meeting.objects.bulk_create(meetings)
+            participations = [MeetingUser(user=user, meeting=m) for m in meetings]
+            for participation in participations:
+                participation.copy_interval()
+            MeetingUser.objects.bulk_create(participations)
+
+    def measure(self, check, origin, size, probes):
+        """
+        Медиана и p95 времени проверки для случайных встреч внутри истории
+
+        Половина встреч попадает на существующие, половина - в промежутки между ними
+        :return: строка "медиана / p95" в миллисекундах
+        """
+        timings = []
+        for _ in range(probes):
+            begin = (
+                origin
+                + STEP * random.randrange(size)
+                + random.choice([timedelta(0), DURATION])
+            )
+            meeting = Meeting(start_datetime=begin, end_datetime=begin + DURATION)
+            started = time.perf_counter()
+            check(meeting)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        median = statistics.median(timings)
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        return f"{median:.2f} / {p95:.2f}"
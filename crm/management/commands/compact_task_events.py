@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from crm import activity
+
+
+class Command(BaseCommand):
+    """
+    Сворачивание старых событий журнала задач в дневные сводки
+    """
+
+    help = "Сворачивает события задач старше --days дней в сводки по задаче за день"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=90)
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if options["days"] < 1:
+            raise CommandError("--days должен быть положительным")
+        before = timezone.now() - timedelta(days=options["days"])
+        removed, created = activity.compact(before, options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Свернуто событий: {removed}, создано сводок: {created}"
+            )
+        )
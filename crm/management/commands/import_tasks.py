@@ -0,0 +1,69 @@
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.importers import TaskImporter, detect_format, iter_rows
+
+
+class Command(BaseCommand):
+    """
+    Потоковый импорт задач из CSV или JSON (массив или JSON Lines)
+    """
+
+    help = (
+        "Импортирует задачи из файла пачками, некорректные строки пишет в файл отказов"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=["csv", "json"])
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--rejects", help="Файл отказов, по умолчанию <path>.rejects.csv"
+        )
+        parser.add_argument(
+            "--author", help="username автора для строк без колонки author"
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        if not path.exists():
+            raise CommandError(f"Файл {path} не найден")
+        fmt = options["format"] or detect_format(path.name)
+        rejects_path = Path(options["rejects"] or f"{path}.rejects.csv")
+
+        default_author = None
+        if options["author"]:
+            default_author = (
+                User.objects.filter(username=options["author"])
+                .values_list("pk", flat=True)
+                .first()
+            )
+            if default_author is None:
+                raise CommandError(f"Пользователь {options['author']} не найден")
+
+        def progress(processed, created, rejected):
+            self.stdout.write(
+                f"Обработано: {processed}, создано: {created}, отклонено: {rejected}"
+            )
+
+        with (
+            path.open(encoding="utf-8-sig", newline="") as source,
+            rejects_path.open("w", encoding="utf-8", newline="") as rejects,
+        ):
+            importer = TaskImporter(
+                rejects=rejects,
+                batch_size=options["batch_size"],
+                progress=progress,
+                default_author=default_author,
+            )
+            created, rejected = importer.run(iter_rows(source, fmt))
+
+        self.stdout.write(self.style.SUCCESS(f"Создано задач: {created}"))
+        if rejected:
+            self.stdout.write(
+                self.style.WARNING(f"Отклонено строк: {rejected}, см. {rejects_path}")
+            )
+        else:
+            rejects_path.unlink()
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from crm.calendar_engine import bump_after_commit
+from crm.models import CalendarEntry
+
+
+class Command(BaseCommand):
+    """
+    Полная пересборка таблицы CalendarEntry из задач и встреч
+
+    После коммита сбрасывается кэш календаря всех пользователей,
+    у которых были записи до или появились после пересборки
+    """
+
+    help = "Пересобирает денормализованную таблицу календаря с нуля"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user_ids = self.owners()
+            created = CalendarEntry.objects.rebuild(batch_size=options["batch_size"])
+            bump_after_commit(user_ids | self.owners())
+        self.stdout.write(self.style.SUCCESS(f"Создано записей календаря: {created}"))
+
+    def owners(self):
+        return set(CalendarEntry.objects.values_list("user_id", flat=True).distinct())
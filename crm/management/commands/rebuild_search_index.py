@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from crm import search
+
+
+class Command(BaseCommand):
+    """
+    Полная пересборка полнотекстового индекса задач и комментариев
+    """
+
+    help = "Пересобирает индекс FTS5 для поиска по задачам и комментариям"
+
+    def handle(self, *args, **options):
+        if not search.fts_available():
+            raise CommandError("Полнотекстовый индекс есть только на SQLite")
+        with transaction.atomic():
+            search.rebuild()
+        self.stdout.write(self.style.SUCCESS("Поисковый индекс пересобран"))
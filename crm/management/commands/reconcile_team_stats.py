@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from crm import stats
+
+
+class Command(BaseCommand):
+    """
+    Пересчет счетчиков задач команд по статусам с отчетом о расхождениях
+    """
+
+    help = (
+        "Пересчитывает TeamTaskStats по таблице задач и выводит найденные расхождения"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только показать расхождения, не исправляя",
+        )
+
+    def handle(self, *args, **options):
+        drift = stats.reconcile(dry_run=options["dry_run"])
+        for team_id, changes in sorted(drift.items()):
+            details = ", ".join(
+                f"{status}: {old} -> {new}" for status, (old, new) in changes.items()
+            )
+            self.stdout.write(f"Команда {team_id}: {details}")
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("Расхождений нет"))
+        elif options["dry_run"]:
+            self.stdout.write(
+                self.style.WARNING(f"Команд с расхождениями: {len(drift)}")
+            )
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Исправлено команд: {len(drift)}"))
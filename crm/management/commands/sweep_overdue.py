@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from crm.sweeper import sweep_overdue
+
+
+class Command(BaseCommand):
+    """
+    Отметка просроченных задач и постановка напоминаний исполнителям
+    """
+
+    help = (
+        "Отмечает задачи с истекшим сроком и ставит напоминания исполнителям; "
+        "с --loop работает как постоянный воркер"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=10000)
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Повторять проход каждые --interval секунд",
+        )
+        parser.add_argument("--interval", type=int, default=60)
+
+    def handle(self, *args, **options):
+        while True:
+            swept = sweep_overdue(batch_size=options["batch_size"])
+            if swept or not options["loop"]:
+                self.stdout.write(f"Отмечено просроченных задач: {swept}")
+            if not options["loop"]:
+                return
+            try:
+                time.sleep(options["interval"])
+            except KeyboardInterrupt:
+                return
@@ -0,0 +1,161 @@
+import csv
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from crm.cache import invalidate_roles
+from crm.models import Team, TeamUser
+
+MAX_ASSIGNMENTS = 5000
+
+ADDED = "added"
+MOVED = "moved"
+UPDATED = "updated"
+REMOVED = "removed"
+UNCHANGED = "unchanged"
+
+
+def read_assignments(lines):
+    """
+    Назначения из CSV без заголовка: username,team_id,role
+
+    Пустой team_id - убрать пользователя из команды, пустая роль - обычный пользователь.
+    Пустые строки пропускаются.
+    :param lines: строки или открытый файл
+    :return: [(username, team_id или None, role или None), ...]
+    :raise ValueError: некорректная строка
+    """
+    assignments = []
+    for number, row in enumerate(csv.reader(lines), start=1):
+        row = [value.strip() for value in row]
+        if not any(row):
+            continue
+        username, team, role = (row + ["", ""])[:3]
+        if not username:
+            raise ValueError(f"Строка {number}: не указан пользователь")
+        try:
+            team_id = int(team) if team else None
+        except ValueError:
+            raise ValueError(f"Строка {number}: некорректный id команды {team}")
+        assignments.append((username, team_id, role or None))
+    return assignments
+
+
+def apply(assignments, dry_run=False):
+    """
+    Применяет назначения пользователей в команды одной транзакцией
+
+    Строки TeamUser затронутых пользователей блокируются (select_for_update), после чего
+    текущее членство читается одним запросом (LEFT JOIN на TeamUser), команды
+    назначения - вторым, так что проверка и запись видят одно и то же состояние.
+    Если хоть одно назначение некорректно, не меняется ничего.
+    Иначе новые участники вставляются одним bulk_create, переходы в другую команду
+    и смена роли - одним bulk_update (строка TeamUser остается той же, поэтому
+    ограничение unique_user_one_team не мешает), удаление - одним QuerySet.delete().
+    bulk_create и bulk_update не отправляют сигналы, поэтому кэш ролей
+    сбрасывается явно после коммита.
+    :param assignments: [(username, team_id или None, role или None), ...]
+    :param dry_run: только проверить и посчитать изменения
+    :return: отчет {"added": [...], "moved": [...], "updated": [...], "removed": [...],
+        "unchanged": [...], "errors": {username: причина}}
+    :raise IntegrityError: параллельно добавленное членство нарушило unique_user_one_team
+    """
+    errors = {}
+    wanted = {}
+    for username, team_id, role in assignments:
+        if username in wanted:
+            errors[username] = "Пользователь указан несколько раз"
+        elif role is not None and role not in TeamUser.Role.values:
+            errors[username] = f"Неизвестная роль {role}"
+        wanted[username] = (team_id, role or TeamUser.Role.USER)
+
+    with transaction.atomic():
+        report = plan(wanted, errors)
+        changes = report.pop("changes", None)
+        if errors or dry_run:
+            return report
+        to_create, to_update, to_delete = changes
+
+        if to_delete:
+            TeamUser.objects.filter(
+                pk__in=[membership.pk for membership in to_delete]
+            ).delete()
+        TeamUser.objects.bulk_update(to_update, ["team", "role"])
+        TeamUser.objects.bulk_create(to_create)
+        user_ids = [membership.user_id for membership in to_create + to_update]
+        transaction.on_commit(lambda: invalidate_roles(user_ids))
+    return report
+
+
+def plan(wanted, errors):
+    """
+    Сверяет назначения с текущим состоянием и раскладывает их на изменения
+
+    Вызывается внутри транзакции apply: строки TeamUser пользователей блокируются
+    до конца транзакции, поэтому их не удалят и не изменят между проверкой и записью.
+    :return: отчет apply; при отсутствии ошибок в нем есть
+        "changes" = (to_create, to_update, to_delete)
+    """
+    list(
+        TeamUser.objects.select_for_update()
+        .filter(user__username__in=wanted)
+        .values_list("pk", flat=True)
+    )
+    state = {
+        row["username"]: row
+        for row in User.objects.filter(username__in=wanted).values(
+            "pk",
+            "username",
+            "memberships__pk",
+            "memberships__team_id",
+            "memberships__role",
+            "memberships__team__creator_id",
+        )
+    }
+    known_teams = set(
+        Team.objects.filter(
+            pk__in={team_id for team_id, _ in wanted.values() if team_id is not None}
+        ).values_list("pk", flat=True)
+    )
+
+    report = {ADDED: [], MOVED: [], UPDATED: [], REMOVED: [], UNCHANGED: []}
+    to_create, to_update, to_delete = [], [], []
+    for username, (team_id, role) in wanted.items():
+        if username in errors:
+            continue
+        row = state.get(username)
+        if row is None:
+            errors[username] = "Пользователь не найден"
+            continue
+        if team_id is not None and team_id not in known_teams:
+            errors[username] = f"Команда {team_id} не найдена"
+            continue
+
+        current = row["memberships__team_id"]
+        membership = TeamUser(
+            pk=row["memberships__pk"], user_id=row["pk"], team_id=team_id, role=role
+        )
+        if current == team_id:
+            if current is None or row["memberships__role"] == role:
+                report[UNCHANGED].append(username)
+            else:
+                to_update.append(membership)
+                report[UPDATED].append(username)
+            continue
+        if current is not None and row["memberships__team__creator_id"] == row["pk"]:
+            errors[username] = "Нельзя убрать создателя из его команды"
+            continue
+        if team_id is None:
+            to_delete.append(membership)
+            report[REMOVED].append(username)
+        elif current is None:
+            to_create.append(membership)
+            report[ADDED].append(username)
+        else:
+            to_update.append(membership)
+            report[MOVED].append(username)
+
+    report["errors"] = errors
+    if not errors:
+        report["changes"] = (to_create, to_update, to_delete)
+    return report
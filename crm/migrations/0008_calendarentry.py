@@ -0,0 +1,113 @@
+# Generated by Django 6.0.2 on 2026-10-17 21:11
+
+import itertools
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def fill_calendar_entries(apps, schema_editor):
+    """
+    Заполняем календарь из уже существующих задач и встреч
+
+    Записи вставляются пачками по мере чтения, в памяти не больше BATCH_SIZE записей
+    """
+    CalendarEntry = apps.get_model("crm", "CalendarEntry")
+    Task = apps.get_model("crm", "Task")
+    MeetingUser = apps.get_model("crm", "MeetingUser")
+
+    tasks = (
+        CalendarEntry(
+            kind="task",
+            object_id=task.pk,
+            user_id=task.performer_id,
+            start=task.deadline,
+            title=task.name,
+        )
+        for task in Task.objects.filter(
+            performer__isnull=False, deadline__isnull=False
+        ).iterator(chunk_size=BATCH_SIZE)
+    )
+    meetings = (
+        CalendarEntry(
+            kind="meeting",
+            object_id=participant.meeting_id,
+            user_id=participant.user_id,
+            start=participant.meeting.start_datetime,
+            end=participant.meeting.end_datetime,
+            title=participant.meeting.name,
+        )
+        for participant in MeetingUser.objects.select_related("meeting").iterator(
+            chunk_size=BATCH_SIZE
+        )
+    )
+    batch = []
+    for entry in itertools.chain(tasks, meetings):
+        batch.append(entry)
+        if len(batch) >= BATCH_SIZE:
+            CalendarEntry.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        CalendarEntry.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("crm", "0007_alter_task_deadline"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CalendarEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("task", "Задача"), ("meeting", "Встреча")],
+                        max_length=10,
+                    ),
+                ),
+                ("object_id", models.PositiveIntegerField()),
+                ("start", models.DateTimeField()),
+                ("end", models.DateTimeField(blank=True, null=True)),
+                ("title", models.CharField(max_length=200)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="calendar_entries",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Запись календаря",
+                "verbose_name_plural": "Записи календаря",
+                "indexes": [
+                    models.Index(
+                        fields=["user", "start"], name="calendar_entry_user_start"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("kind", "object_id", "user"),
+                        name="unique_calendar_entry",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(fill_calendar_entries, migrations.RunPython.noop),
+    ]
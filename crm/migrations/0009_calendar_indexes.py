@@ -0,0 +1,26 @@
+# Generated by Django 6.0.2 on 2026-10-17 21:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("crm", "0008_calendarentry"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="meeting",
+            index=models.Index(
+                fields=["start_datetime"], name="meeting_start_datetime"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="task",
+            index=models.Index(
+                fields=["performer", "deadline"], name="task_performer_deadline"
+            ),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.0.2 on 2026-10-17 21:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("crm", "0009_calendar_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="meeting",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, null=True),
+        ),
+    ]
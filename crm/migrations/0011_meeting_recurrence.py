@@ -0,0 +1,68 @@
+# Generated by Django 6.0.2 on 2026-10-17 21:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_series_end(apps, schema_editor):
+    """У существующих встреч нет повторений, серия заканчивается вместе со встречей"""
+    Meeting = apps.get_model("crm", "Meeting")
+    Meeting.objects.update(series_end=models.F("end_datetime"))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("crm", "0010_meeting_updated_at"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="calendarentry",
+            name="is_recurring",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name="meeting",
+            name="recurrence",
+            field=models.CharField(
+                choices=[
+                    ("none", "Не повторяется"),
+                    ("daily", "Ежедневно"),
+                    ("weekly", "Еженедельно"),
+                    ("monthly", "Ежемесячно"),
+                ],
+                default="none",
+                max_length=10,
+            ),
+        ),
+        migrations.AddField(
+            model_name="meeting",
+            name="recurrence_count",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="meeting",
+            name="recurrence_exceptions",
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name="meeting",
+            name="recurrence_until",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="meeting",
+            name="series_end",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="calendarentry",
+            index=models.Index(
+                condition=models.Q(("is_recurring", True)),
+                fields=["user", "start"],
+                name="calendar_entry_recurring",
+            ),
+        ),
+        migrations.RunPython(fill_series_end, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 6.0.2 on 2026-10-17 22:05
+
+from django.db import migrations, models
+
+
+def fill_intervals(apps, schema_editor):
+    """Копирует интервал занятости встречи в существующие участия одним запросом"""
+    Meeting = apps.get_model("crm", "Meeting")
+    MeetingUser = apps.get_model("crm", "MeetingUser")
+    meeting = Meeting.objects.filter(pk=models.OuterRef("meeting_id"))
+    MeetingUser.objects.update(
+        start_datetime=models.Subquery(meeting.values("start_datetime")[:1]),
+        end_datetime=models.Subquery(meeting.values("series_end")[:1]),
+        is_recurring=models.Exists(meeting.exclude(recurrence="none")),
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("crm", "0011_meeting_recurrence"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="meetinguser",
+            name="start_datetime",
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="meetinguser",
+            name="end_datetime",
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="meetinguser",
+            name="is_recurring",
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(fill_intervals, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="meetinguser",
+            name="start_datetime",
+            field=models.DateTimeField(editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="meetinguser",
+            index=models.Index(
+                fields=["user", "start_datetime", "end_datetime"],
+                name="meeting_user_interval",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="meetinguser",
+            index=models.Index(
+                condition=models.Q(("is_recurring", True)),
+                fields=["user", "start_datetime"],
+                name="meeting_user_recurring",
+            ),
+        ),
+    ]
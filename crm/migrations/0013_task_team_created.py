@@ -0,0 +1,20 @@
+# Generated by Django 6.0.2 on 2026-10-17 21:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("crm", "0012_meeting_user_interval"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="task",
+            index=models.Index(
+                fields=["team", "created_at", "id"], name="task_team_created"
+            ),
+        ),
+    ]
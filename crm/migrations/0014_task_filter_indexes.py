@@ -0,0 +1,39 @@
+# Generated by Django 6.0.2 on 2026-10-17 21:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("crm", "0013_task_team_created"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="task",
+            index=models.Index(
+                fields=["team", "status", "deadline"], name="task_team_status_deadline"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="task",
+            index=models.Index(
+                fields=["team", "deadline", "id"], name="task_team_deadline"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="task",
+            index=models.Index(
+                fields=["team", "performer", "created_at", "id"],
+                name="task_team_performer",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="task",
+            index=models.Index(
+                fields=["team", "author", "created_at", "id"], name="task_team_author"
+            ),
+        ),
+    ]
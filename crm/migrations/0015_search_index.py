@@ -0,0 +1,109 @@
+# Generated by Django 6.0.2 on 2026-10-17 22:40
+
+from django.db import migrations
+
+# Полнотекстовый индекс задач и комментариев (SQLite FTS5).
+# rowid: задача - id * 2, комментарий - id * 2 + 1.
+# scope хранит токен команды ("team<id>"), чтобы ограничение по командам
+# шло пересечением списков FTS, а не фильтром по всем совпадениям.
+# prefix: индексы префиксов из 2 и 3 символов, иначе короткий префикс
+# разворачивается в тысячи терминов.
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE crm_search USING fts5(
+        title,
+        body,
+        scope,
+        kind UNINDEXED,
+        task_id UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER crm_search_task_insert AFTER INSERT ON crm_task BEGIN
+        INSERT INTO crm_search (rowid, title, body, scope, kind, task_id)
+        VALUES (new.id * 2, new.name, new.description, 'team' || new.team_id, 'task', new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER crm_search_task_update AFTER UPDATE OF name, description, team_id ON crm_task
+    WHEN new.name IS NOT old.name
+        OR new.description IS NOT old.description
+        OR new.team_id IS NOT old.team_id
+    BEGIN
+        UPDATE crm_search
+        SET title = new.name, body = new.description, scope = 'team' || new.team_id
+        WHERE rowid = new.id * 2;
+        UPDATE crm_search
+        SET scope = 'team' || new.team_id
+        WHERE new.team_id IS NOT old.team_id
+            AND rowid IN (SELECT id * 2 + 1 FROM crm_comment WHERE task_id = new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER crm_search_task_delete AFTER DELETE ON crm_task BEGIN
+        DELETE FROM crm_search WHERE rowid = old.id * 2;
+    END
+    """,
+    """
+    CREATE TRIGGER crm_search_comment_insert AFTER INSERT ON crm_comment BEGIN
+        INSERT INTO crm_search (rowid, title, body, scope, kind, task_id)
+        SELECT new.id * 2 + 1, '', new.text, 'team' || team_id, 'comment', new.task_id
+        FROM crm_task WHERE id = new.task_id;
+    END
+    """,
+    """
+    CREATE TRIGGER crm_search_comment_update AFTER UPDATE OF text ON crm_comment
+    WHEN new.text IS NOT old.text
+    BEGIN
+        UPDATE crm_search SET body = new.text WHERE rowid = new.id * 2 + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER crm_search_comment_delete AFTER DELETE ON crm_comment BEGIN
+        DELETE FROM crm_search WHERE rowid = old.id * 2 + 1;
+    END
+    """,
+    """
+    INSERT INTO crm_search (rowid, title, body, scope, kind, task_id)
+    SELECT id * 2, name, description, 'team' || team_id, 'task', id FROM crm_task
+    """,
+    """
+    INSERT INTO crm_search (rowid, title, body, scope, kind, task_id)
+    SELECT c.id * 2 + 1, '', c.text, 'team' || t.team_id, 'comment', c.task_id
+    FROM crm_comment c JOIN crm_task t ON t.id = c.task_id
+    """,
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS crm_search_task_insert",
+    "DROP TRIGGER IF EXISTS crm_search_task_update",
+    "DROP TRIGGER IF EXISTS crm_search_task_delete",
+    "DROP TRIGGER IF EXISTS crm_search_comment_insert",
+    "DROP TRIGGER IF EXISTS crm_search_comment_update",
+    "DROP TRIGGER IF EXISTS crm_search_comment_delete",
+    "DROP TABLE IF EXISTS crm_search",
+]
+
+
+def run(statements):
+    """На других базах индекс не создается, поиск работает через icontains"""
+
+    def execute(apps, schema_editor):
+        if schema_editor.connection.vendor != "sqlite":
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    return execute
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("crm", "0014_task_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE_SQL), run(DROP_SQL)),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 6.0.2 on 2026-10-17 21:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("crm", "0015_search_index"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                fields=["task", "created_at", "id"], name="comment_task_created"
+            ),
+        ),
+    ]
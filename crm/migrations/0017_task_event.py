@@ -0,0 +1,85 @@
+# Generated by Django 6.0.2 on 2026-10-17 21:46
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("crm", "0016_comment_task_created"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TaskEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("created", "Создана"),
+                            ("updated", "Изменена"),
+                            ("done", "Выполнена"),
+                            ("evaluated", "Оценена"),
+                            ("deleted", "Удалена"),
+                            ("summary", "Сводка за день"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("changes", models.JSONField(default=dict)),
+                ("count", models.PositiveIntegerField(default=1)),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "task",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="events",
+                        to="crm.task",
+                    ),
+                ),
+                (
+                    "team",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="task_events",
+                        to="crm.team",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="task_events",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Событие задачи",
+                "verbose_name_plural": "События задач",
+                "indexes": [
+                    models.Index(fields=["task", "id"], name="task_event_task"),
+                    models.Index(
+                        fields=["team", "created_at", "id"],
+                        name="task_event_team_created",
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 6.0.2 on 2026-10-17 21:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_stats(apps, schema_editor):
+    """Начальные счетчики: одна строка на команду, посчитанная по задачам"""
+    Team = apps.get_model("crm", "Team")
+    Task = apps.get_model("crm", "Task")
+    TeamTaskStats = apps.get_model("crm", "TeamTaskStats")
+    counts = {}
+    for team_id, status, total in (
+        Task.objects.order_by()
+        .values_list("team_id", "status")
+        .annotate(total=models.Count("pk"))
+    ):
+        counts.setdefault(team_id, {})[status] = total
+    TeamTaskStats.objects.bulk_create(
+        [
+            TeamTaskStats(
+                team_id=team_id,
+                open=counts.get(team_id, {}).get("open", 0),
+                processing=counts.get(team_id, {}).get("processing", 0),
+                done=counts.get(team_id, {}).get("done", 0),
+            )
+            for team_id in Team.objects.values_list("pk", flat=True)
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("crm", "0017_task_event"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TeamTaskStats",
+            fields=[
+                (
+                    "team",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="task_stats",
+                        serialize=False,
+                        to="crm.team",
+                    ),
+                ),
+                ("open", models.IntegerField(default=0)),
+                ("processing", models.IntegerField(default=0)),
+                ("done", models.IntegerField(default=0)),
+            ],
+            options={
+                "verbose_name": "Статистика задач команды",
+                "verbose_name_plural": "Статистика задач команд",
+            },
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 6.0.2 on 2026-10-17 21:52
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("crm", "0018_team_task_stats"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SweepState",
+            fields=[
+                (
+                    "name",
+                    models.CharField(max_length=100, primary_key=True, serialize=False),
+                ),
+                ("position", models.DateTimeField(null=True)),
+                ("position_id", models.BigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Состояние фоновой задачи",
+                "verbose_name_plural": "Состояния фоновых задач",
+            },
+        ),
+        migrations.CreateModel(
+            name="TaskReminder",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("overdue", "Срок задачи истек")], max_length=20
+                    ),
+                ),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+                ("sent_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "verbose_name": "Напоминание",
+                "verbose_name_plural": "Напоминания",
+            },
+        ),
+        migrations.AddField(
+            model_name="task",
+            name="overdue_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="task",
+            index=models.Index(
+                fields=["status", "deadline", "id"], name="task_status_deadline"
+            ),
+        ),
+        migrations.AddField(
+            model_name="taskreminder",
+            name="task",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="reminders",
+                to="crm.task",
+            ),
+        ),
+        migrations.AddField(
+            model_name="taskreminder",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="task_reminders",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="taskreminder",
+            index=models.Index(
+                condition=models.Q(("sent_at__isnull", True)),
+                fields=["id"],
+                name="task_reminder_pending",
+            ),
+        ),
+    ]
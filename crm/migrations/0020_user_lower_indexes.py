@@ -0,0 +1,27 @@
+# Generated by Django 6.0.2 on 2026-10-17 23:40
+
+from django.db import migrations
+
+# Индексы для автодополнения пользователей (crm.autocomplete).
+# Таблица auth_user принадлежит django.contrib.auth, поэтому индексы на выражениях
+# создаются здесь SQL-ом, а не через Meta.indexes модели.
+# Поиск по префиксу идет диапазоном LOWER(username) >= 'ab' AND < 'ac',
+# сортировка страниц - по (LOWER(username), id).
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("crm", "0019_overdue_sweep"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            "CREATE INDEX crm_user_username_lower ON auth_user (LOWER(username))",
+            "DROP INDEX crm_user_username_lower",
+        ),
+        migrations.RunSQL(
+            "CREATE INDEX crm_user_email_lower ON auth_user (LOWER(email))",
+            "DROP INDEX crm_user_email_lower",
+        ),
+    ]
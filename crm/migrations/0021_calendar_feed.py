@@ -0,0 +1,40 @@
+# Generated by Django 6.0.2 on 2026-10-17 22:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+import crm.models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("crm", "0020_user_lower_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CalendarFeed",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="calendar_feed",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "secret",
+                    models.CharField(default=crm.models.new_feed_secret, max_length=32),
+                ),
+            ],
+            options={
+                "verbose_name": "Подписка на календарь",
+                "verbose_name_plural": "Подписки на календарь",
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 6.0.2 on 2026-10-17 23:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("crm", "0021_calendar_feed"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="task",
+            index=models.Index(
+                condition=models.Q(("overdue_at__isnull", True)),
+                fields=["status", "deadline", "id"],
+                name="task_unmarked_deadline",
+            ),
+        ),
+    ]
@@ -2,7 +2,10 @@ from django.utils import timezone
 
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
+from django.utils.crypto import get_random_string
+
+from crm import recurrence
 
 
 class Team(models.Model):
@@ -55,6 +58,39 @@ class TeamUser(models.Model):
         ]
 
 
+class TaskQuerySet(models.QuerySet):
+    def visible_to(self, user, team):
+        """
+        Задачи команды, которые может видеть пользователь
+
+        Администраторы и менеджеры команды (и суперпользователи) видят все задачи,
+        остальные - только те, где они исполнители. Роль проверяется подзапросом
+        EXISTS в том же запросе, поэтому пагинация и подсчет идут по уже отфильтрованным строкам.
+        :param user: пользователь
+        :param team: команда или ее id
+        """
+        tasks = self.filter(team=team).select_related("performer")
+        if user.is_superuser:
+            return tasks
+        is_manager = TeamUser.objects.filter(
+            team=team,
+            user=user,
+            role__in=[TeamUser.Role.ADMIN, TeamUser.Role.MANAGER],
+        )
+        return tasks.filter(models.Exists(is_manager) | models.Q(performer=user))
+
+    def overdue(self, moment=None):
+        """
+        Невыполненные задачи с прошедшим дедлайном
+
+        Статусы перечислены явно (IN, а не NOT), чтобы условие шло по индексу (team, status, deadline)
+        """
+        return self.filter(
+            status__in=[Task.Status.open, Task.Status.processing],
+            deadline__lt=moment or timezone.now(),
+        )
+
+
 class Task(models.Model):
     """
     Модель задачи в системе.
@@ -69,6 +105,7 @@ class Task(models.Model):
     deadline: Срок, до которого задача должна быть выполнена
     created_at: Дата и время создании задачи
     updated_at: Дата и время обновления задачи
+    overdue_at: Когда задача была отмечена просроченной (команда sweep_overdue)
     """
 
     class Status(models.TextChoices):
@@ -89,10 +126,85 @@ class Task(models.Model):
     deadline = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(null=True, auto_now=True)
+    overdue_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = TaskQuerySet.as_manager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Запоминаем команду и статус в том виде, в каком они загружены из базы,
+        чтобы при сохранении и удалении поправить счетчики TeamTaskStats
+        Если они не загружены (only/defer), их дочитывает stats.remember_loaded
+        """
+        instance = super().from_db(db, field_names, values)
+        if "team_id" in field_names and "status" in field_names:
+            instance._loaded = (instance.team_id, instance.status)
+        return instance
+
+    def save(self, *args, **kwargs):
+        # счетчики команды обновляются сигналом post_save в той же транзакции
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     class Meta:
         verbose_name = "Задача"
         verbose_name_plural = "Задачи"
+        indexes = [
+            models.Index(
+                fields=["performer", "deadline"], name="task_performer_deadline"
+            ),
+            models.Index(fields=["team", "created_at", "id"], name="task_team_created"),
+            models.Index(
+                fields=["team", "status", "deadline"], name="task_team_status_deadline"
+            ),
+            models.Index(fields=["team", "deadline", "id"], name="task_team_deadline"),
+            models.Index(
+                fields=["team", "performer", "created_at", "id"],
+                name="task_team_performer",
+            ),
+            models.Index(
+                fields=["team", "author", "created_at", "id"], name="task_team_author"
+            ),
+            models.Index(
+                fields=["status", "deadline", "id"], name="task_status_deadline"
+            ),
+            # задачи, еще не отмеченные просроченными (см. crm.sweeper.late)
+            models.Index(
+                fields=["status", "deadline", "id"],
+                condition=models.Q(overdue_at__isnull=True),
+                name="task_unmarked_deadline",
+            ),
+        ]
+
+
+class TeamTaskStats(models.Model):
+    """
+    Количество задач команды по статусам
+
+    Обновляется в той же транзакции, что и изменение задачи (см. crm.stats),
+    поэтому для показа счетчиков достаточно прочитать одну строку.
+    Расхождения находит и исправляет команда reconcile_team_stats
+
+    team: Команда
+    open, processing, done: Количество задач в каждом статусе
+    """
+
+    team = models.OneToOneField(
+        Team, on_delete=models.CASCADE, primary_key=True, related_name="task_stats"
+    )
+    # без CHECK >= 0: расхождение в счетчике не должно ломать удаление задач
+    open = models.IntegerField(default=0)
+    processing = models.IntegerField(default=0)
+    done = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Статистика задач команды"
+        verbose_name_plural = "Статистика задач команд"
+
+    @property
+    def total(self):
+        return self.open + self.processing + self.done
 
 
 class Comment(models.Model):
@@ -113,6 +225,35 @@ class Comment(models.Model):
     class Meta:
         verbose_name = "Комментарий"
         verbose_name_plural = "Комментарии"
+        indexes = [
+            models.Index(
+                fields=["task", "created_at", "id"], name="comment_task_created"
+            ),
+        ]
+
+
+def overlap_filter(start, end, prefix=""):
+    """
+    Условие "встреча или серия может пересекать [start, end)"
+
+    Для одиночных встреч series_end равен end_datetime, поэтому условие точное,
+    для серий его нужно уточнять перебором повторений.
+    :param start: начало интервала
+    :param end: конец интервала, None - без ограничения
+    :param prefix: путь до встречи, например "meeting__"
+    """
+    condition = models.Q(**{f"{prefix}series_end__isnull": True}) | models.Q(
+        **{f"{prefix}series_end__gt": start}
+    )
+    if end is not None:
+        condition &= models.Q(**{f"{prefix}start_datetime__lt": end})
+    return condition
+
+
+class MeetingQuerySet(models.QuerySet):
+    def overlapping(self, start, end):
+        """Встречи и серии, которые могут пересекать [start, end)"""
+        return self.filter(overlap_filter(start, end))
 
 
 class Meeting(models.Model):
@@ -121,9 +262,22 @@ class Meeting(models.Model):
 
     Встречи могут назначаться разными пользователями.
     creator: Создатель встречи
-    start_datetime, end_datetime: Дата и время начала и конца встречи
+    start_datetime, end_datetime: Дата и время начала и конца встречи (первого повторения для серии)
+    updated_at: Дата и время обновления встречи
+    recurrence: Правило повторения (не повторяется, ежедневно, еженедельно, ежемесячно)
+    recurrence_until: Повторять до этого момента включительно
+    recurrence_count: Количество повторений
+    recurrence_exceptions: Даты (YYYY-MM-DD), в которые повторение пропускается
+    series_end: Окончание последнего повторения, пусто для бесконечной серии.
+        Считается при сохранении и ограничивает запросы на пересечение встреч
     """
 
+    class Recurrence(models.TextChoices):
+        NONE = recurrence.NONE, "Не повторяется"
+        DAILY = recurrence.DAILY, "Ежедневно"
+        WEEKLY = recurrence.WEEKLY, "Еженедельно"
+        MONTHLY = recurrence.MONTHLY, "Ежемесячно"
+
     creator = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name="created_meetings"
     )
@@ -131,28 +285,175 @@ class Meeting(models.Model):
     description = models.TextField()
     start_datetime = models.DateTimeField()
     end_datetime = models.DateTimeField()
+    updated_at = models.DateTimeField(null=True, auto_now=True)
+    recurrence = models.CharField(
+        choices=Recurrence, default=Recurrence.NONE, max_length=10
+    )
+    recurrence_until = models.DateTimeField(null=True, blank=True)
+    recurrence_count = models.PositiveIntegerField(null=True, blank=True)
+    recurrence_exceptions = models.JSONField(default=list, blank=True)
+    series_end = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = MeetingQuerySet.as_manager()
 
     def clean(self):
         """
         Проверям данные на валидность
         1. Дата начала не может быть позже даты конца
         2. Дата начала не может быть в прошлом при создании.
+        3. Ограничение повторения не может быть раньше начала встречи
+        4. Измененный интервал не может пересекаться с другими встречами участников.
+           Пробы busy_candidates считают, что одиночные встречи пользователя
+           не пересекаются, поэтому правило держится и при редактировании
         """
         errors = {}
         if self.start_datetime >= self.end_datetime:
             errors["end_date"] = "Дата окончания должна быть позже даты начала"
         if self.start_datetime < timezone.now():
             errors["start_date"] = "Дата начала не может быть в прошлом"
+        if self.recurrence_until and self.recurrence_until < self.start_datetime:
+            errors["recurrence_until"] = (
+                "Повторение не может заканчиваться раньше начала встречи"
+            )
+        if not errors and self.pk and self.interval_changed():
+            user_ids = list(self.participants.values_list("user_id", flat=True))
+            if user_ids and MeetingUser.objects.conflicts(self, user_ids):
+                errors["start_datetime"] = (
+                    "Новое время пересекается с другими встречами участников"
+                )
         if errors:
             raise ValidationError(errors)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Запоминаем интервал в том виде, в каком он загружен из базы,
+        чтобы при сохранении перепроверять пересечения только после его изменения
+        """
+        instance = super().from_db(db, field_names, values)
+        instance._loaded = instance.interval_key()
+        return instance
+
+    def interval_key(self):
+        return (
+            self.start_datetime,
+            self.end_datetime,
+            self.recurrence,
+            self.recurrence_until,
+            self.recurrence_count,
+            list(self.recurrence_exceptions or []),
+        )
+
+    def interval_changed(self):
+        return getattr(self, "_loaded", None) != self.interval_key()
+
+    def occurrences(self, window_start=None, window_end=None):
+        """Ленивый генератор повторений встречи в окне, см. crm.recurrence"""
+        return recurrence.iter_occurrences(self, window_start, window_end)
+
+    def interval_fields(self):
+        """Поля интервала занятости, которые копируются в участия MeetingUser"""
+        return {
+            "start_datetime": self.start_datetime,
+            "end_datetime": self.series_end,
+            "is_recurring": recurrence.is_recurring(self),
+        }
+
     def save(self, *args, **kwargs):
         self.full_clean()
+        self.series_end = recurrence.series_end(self)
         super().save(*args, **kwargs)
+        self.participants.update(**self.interval_fields())
 
     class Meta:
         verbose_name = "Встреча"
         verbose_name_plural = "Встречи"
+        indexes = [
+            models.Index(fields=["start_datetime"], name="meeting_start_datetime"),
+        ]
+
+
+class MeetingUserQuerySet(models.QuerySet):
+    def busy_candidates(self, user_ids, start, end):
+        """
+        Участия пользователей, интервал которых может пересекать [start, end)
+
+        Вместо сравнения колонок встречи через join делает ограниченные пробы
+        по индексам на денормализованных полях MeetingUser:
+        1. одиночные встречи, начинающиеся внутри [start, end) - диапазон индекса
+           (user, start_datetime, end_datetime);
+        2. последняя одиночная встреча, начавшаяся раньше start, - одна строка
+           на пользователя. Одиночные встречи пользователя не пересекаются друг
+           с другом (это проверяет clean), поэтому более ранние закончились
+           до ее начала и start пересечь не могут;
+        3. серии, начавшиеся раньше start и еще не закончившиеся, - по частичному
+           индексу серий, их у пользователя немного.
+        Время проверки зависит от числа встреч около интервала, а не от длины истории.
+        :param user_ids: id пользователей
+        :param start: начало интервала
+        :param end: конец интервала, None - без ограничения
+        """
+        participations = MeetingUser.objects.filter(user_id__in=user_ids)
+        inside = participations.filter(start_datetime__gte=start)
+        if end is not None:
+            inside = inside.filter(start_datetime__lt=end)
+        previous = MeetingUser.objects.filter(
+            pk__in=User.objects.filter(pk__in=user_ids)
+            .annotate(
+                participation_id=models.Subquery(
+                    MeetingUser.objects.filter(
+                        user_id=models.OuterRef("pk"),
+                        is_recurring=False,
+                        start_datetime__lt=start,
+                    )
+                    .order_by("-start_datetime")
+                    .values("pk")[:1]
+                )
+            )
+            .values("participation_id"),
+            end_datetime__gt=start,
+        )
+        series = participations.filter(
+            models.Q(end_datetime__isnull=True) | models.Q(end_datetime__gt=start),
+            is_recurring=True,
+            start_datetime__lt=start,
+        )
+        # UNION вместо OR: каждая часть идет по своему индексу, OR свел бы все к перебору
+        # участий пользователя
+        return self.filter(
+            pk__in=inside.values("pk").union(
+                previous.values("pk"), series.values("pk"), all=True
+            )
+        )
+
+    def conflicts(self, meeting, user_ids):
+        """
+        Находит пользователей, у которых уже есть встреча, пересекающаяся с meeting
+
+        Кандидаты для всех пользователей выбираются одним запросом (см. busy_candidates),
+        для серий пересечение уточняется перебором повторений на общем отрезке.
+        :param meeting: встреча, в которую добавляются пользователи
+        :param user_ids: id пользователей
+        :return: словарь {id пользователя: конфликтующая встреча}
+        """
+        candidates = (
+            self.busy_candidates(
+                user_ids, meeting.start_datetime, recurrence.series_end(meeting)
+            )
+            .exclude(meeting_id=meeting.pk)
+            .select_related("meeting")
+        )
+        conflicts = {}
+        for participation in candidates:
+            if participation.user_id in conflicts:
+                continue
+            other = participation.meeting
+            single = not recurrence.is_recurring(
+                meeting
+            ) and not recurrence.is_recurring(other)
+            if single or recurrence.occurrences_overlap(meeting, other):
+                conflicts[participation.user_id] = other
+        return conflicts
 
 
 class MeetingUser(models.Model):
@@ -160,6 +461,9 @@ class MeetingUser(models.Model):
     Запись конкретного пользователя на конкретную встречу.
     user: Внешний ключ на пользователя
     meeting: Внишний ключ на встречу
+    start_datetime, end_datetime, is_recurring: Копия интервала занятости встречи
+        (начало, окончание серии, пусто для бесконечной серии). Обновляется при сохранении
+        встречи и нужна для проверки пересечений по индексу без join
     """
 
     user = models.ForeignKey(
@@ -168,6 +472,16 @@ class MeetingUser(models.Model):
     meeting = models.ForeignKey(
         Meeting, on_delete=models.CASCADE, related_name="participants"
     )
+    start_datetime = models.DateTimeField(editable=False)
+    end_datetime = models.DateTimeField(null=True, editable=False)
+    is_recurring = models.BooleanField(default=False, editable=False)
+
+    objects = MeetingUserQuerySet.as_manager()
+
+    def copy_interval(self):
+        """Копирует интервал занятости из встречи, нужно и перед bulk_create"""
+        for field, value in self.meeting.interval_fields().items():
+            setattr(self, field, value)
 
     def clean(self):
         """
@@ -175,20 +489,40 @@ class MeetingUser(models.Model):
         """
         if not self.meeting or not self.user:
             return
-        overlapping = Meeting.objects.filter(
-            participants__user=self.user,
-            start_datetime__lt=self.meeting.end_datetime,
-            end_datetime__gt=self.meeting.start_datetime,
-        ).exclude(pk=self.meeting.pk)
-
-        if overlapping.exists():
+        if MeetingUser.objects.conflicts(self.meeting, [self.user_id]):
             raise ValidationError(
                 "Пользователь не может единовременно учавствовать в двух встречах"
             )
 
     def save(self, *args, **kwargs):
-        self.full_clean()
-        super().save(*args, **kwargs)
+        """
+        Проверка пересечений и запись идут в одной транзакции под блокировкой строки
+        пользователя, как в scheduling.invite_users
+        """
+        with transaction.atomic():
+            if self.user_id:
+                list(
+                    User.objects.select_for_update()
+                    .filter(pk=self.user_id)
+                    .values_list("pk", flat=True)
+                )
+            if self.meeting_id:
+                self.copy_interval()
+            self.full_clean()
+            super().save(*args, **kwargs)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["user", "start_datetime", "end_datetime"],
+                name="meeting_user_interval",
+            ),
+            models.Index(
+                fields=["user", "start_datetime"],
+                condition=models.Q(is_recurring=True),
+                name="meeting_user_recurring",
+            ),
+        ]
 
 
 class Evaluation(models.Model):
@@ -228,3 +562,321 @@ class Evaluation(models.Model):
         ]
         verbose_name = "Оценка"
         verbose_name_plural = "Оценки"
+
+
+class TaskEvent(models.Model):
+    """
+    Запись журнала изменений задачи, только добавляется
+
+    task: Задача; внешний ключ без ограничения в базе, поэтому после удаления задачи
+        id остается в журнале, а сама запись не переписывается
+    team: Команда задачи, для ленты активности команды
+    user: Кто внес изменение
+    kind: Тип события
+    changes: Изменения полей {поле: [было, стало]}
+    count: Сколько событий свернуто в запись (для дневных сводок, иначе 1)
+    created_at: Время события, для сводки - начало дня
+    """
+
+    class Kind(models.TextChoices):
+        CREATED = "created", "Создана"
+        UPDATED = "updated", "Изменена"
+        DONE = "done", "Выполнена"
+        EVALUATED = "evaluated", "Оценена"
+        DELETED = "deleted", "Удалена"
+        SUMMARY = "summary", "Сводка за день"
+
+    task = models.ForeignKey(
+        Task,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        related_name="events",
+    )
+    team = models.ForeignKey(Team, on_delete=models.CASCADE, related_name="task_events")
+    user = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, related_name="task_events"
+    )
+    kind = models.CharField(choices=Kind, max_length=20)
+    changes = models.JSONField(default=dict)
+    count = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Событие задачи"
+        verbose_name_plural = "События задач"
+        indexes = [
+            models.Index(fields=["task", "id"], name="task_event_task"),
+            models.Index(
+                fields=["team", "created_at", "id"], name="task_event_team_created"
+            ),
+        ]
+
+
+SYNCED_FIELDS = ["start", "end", "title", "is_recurring"]
+
+
+def meeting_entry_row(meeting, user_id):
+    """Поля записи календаря участника встречи"""
+    recurring = recurrence.is_recurring(meeting)
+    return {
+        "user_id": user_id,
+        "object_id": meeting.pk,
+        "start": meeting.start_datetime,
+        "end": meeting.series_end if recurring else meeting.end_datetime,
+        "title": meeting.name,
+        "is_recurring": recurring,
+    }
+
+
+class TaskReminder(models.Model):
+    """
+    Напоминание пользователю о задаче, очередь для рассылки
+
+    task: Задача
+    user: Кому напомнить
+    kind: Повод напоминания
+    created_at: Когда поставлено в очередь
+    sent_at: Когда отправлено, None - еще в очереди
+    """
+
+    class Kind(models.TextChoices):
+        OVERDUE = "overdue", "Срок задачи истек"
+
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name="reminders")
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="task_reminders"
+    )
+    kind = models.CharField(choices=Kind, max_length=20)
+    created_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Напоминание"
+        verbose_name_plural = "Напоминания"
+        indexes = [
+            # очередь: только неотправленные, по порядку постановки
+            models.Index(
+                fields=["id"],
+                condition=models.Q(sent_at__isnull=True),
+                name="task_reminder_pending",
+            ),
+        ]
+
+
+class SweepState(models.Model):
+    """
+    Отметка, до которой фоновая задача уже обработала строки
+
+    name: Имя фоновой задачи
+    position: Значение ключа сортировки последней обработанной строки
+    position_id: id последней обработанной строки (для строк с одинаковым ключом)
+    updated_at: Время последнего прохода
+    """
+
+    name = models.CharField(max_length=100, primary_key=True)
+    position = models.DateTimeField(null=True)
+    position_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Состояние фоновой задачи"
+        verbose_name_plural = "Состояния фоновых задач"
+
+
+class CalendarEntryQuerySet(models.QuerySet):
+    """
+    Синхронизация денормализованных записей календаря с исходными таблицами
+
+    Все методы sync_* сравнивают текущие записи с актуальными данными и
+    пишут в базу только разницу. Возвращают множество id пользователей,
+    чей календарь изменился.
+    """
+
+    def _sync(self, kind, object_ids, rows):
+        """
+        Приводит записи вида kind для object_ids к состоянию rows
+
+        :param kind: тип записи (CalendarEntry.Kind)
+        :param object_ids: id исходных обьектов, которые нужно синхронизировать
+        :param rows: актуальные записи - словари с ключами user_id, object_id, start, end, title, is_recurring
+        :return: id пользователей, чьи записи изменились
+        """
+        existing = {
+            (entry.object_id, entry.user_id): entry
+            for entry in self.filter(kind=kind, object_id__in=object_ids)
+        }
+        changed_users = set()
+        to_create = []
+        to_update = []
+        for row in rows:
+            entry = existing.pop((row["object_id"], row["user_id"]), None)
+            if entry is None:
+                to_create.append(CalendarEntry(kind=kind, **row))
+                changed_users.add(row["user_id"])
+            elif any(getattr(entry, field) != row[field] for field in SYNCED_FIELDS):
+                for field in SYNCED_FIELDS:
+                    setattr(entry, field, row[field])
+                to_update.append(entry)
+                changed_users.add(row["user_id"])
+
+        if existing:
+            self.filter(pk__in=[entry.pk for entry in existing.values()]).delete()
+            changed_users.update(entry.user_id for entry in existing.values())
+        if to_create:
+            self.bulk_create(to_create)
+        if to_update:
+            self.bulk_update(to_update, SYNCED_FIELDS)
+        return changed_users
+
+    def sync_tasks(self, task_ids):
+        """Синхронизирует записи задач: одна запись на исполнителя задачи с дедлайном"""
+        rows = [
+            {
+                "user_id": row["performer_id"],
+                "object_id": row["pk"],
+                "start": row["deadline"],
+                "end": None,
+                "title": row["name"],
+                "is_recurring": False,
+            }
+            for row in Task.objects.filter(
+                pk__in=task_ids, performer__isnull=False, deadline__isnull=False
+            ).values("pk", "performer_id", "deadline", "name")
+        ]
+        return self._sync(CalendarEntry.Kind.TASK, task_ids, rows)
+
+    def sync_meetings(self, meeting_ids):
+        """
+        Синхронизирует записи встреч: одна запись на каждого участника
+
+        Серия хранится одной записью: start - начало первого повторения,
+        end - окончание серии (пусто для бесконечной), повторения разворачиваются при чтении
+        """
+        rows = [
+            meeting_entry_row(participant.meeting, participant.user_id)
+            for participant in MeetingUser.objects.filter(
+                meeting_id__in=meeting_ids
+            ).select_related("meeting")
+        ]
+        return self._sync(CalendarEntry.Kind.MEETING, meeting_ids, rows)
+
+    def rebuild(self, batch_size=1000):
+        """
+        Полностью пересобирает таблицу из Task и Meeting
+
+        :param batch_size: размер пачки для bulk_create
+        :return: количество созданных записей
+        """
+        self.all().delete()
+        tasks = (
+            Task.objects.filter(performer__isnull=False, deadline__isnull=False)
+            .values_list("pk", "performer_id", "deadline", "name")
+            .iterator(chunk_size=batch_size)
+        )
+        meetings = MeetingUser.objects.select_related("meeting").iterator(
+            chunk_size=batch_size
+        )
+        created = 0
+        batch = []
+        for pk, user_id, deadline, name in tasks:
+            batch.append(
+                CalendarEntry(
+                    kind=CalendarEntry.Kind.TASK,
+                    object_id=pk,
+                    user_id=user_id,
+                    start=deadline,
+                    title=name,
+                )
+            )
+            if len(batch) >= batch_size:
+                created += len(self.bulk_create(batch))
+                batch = []
+        for participant in meetings:
+            batch.append(
+                CalendarEntry(
+                    kind=CalendarEntry.Kind.MEETING,
+                    **meeting_entry_row(participant.meeting, participant.user_id),
+                )
+            )
+            if len(batch) >= batch_size:
+                created += len(self.bulk_create(batch))
+                batch = []
+        if batch:
+            created += len(self.bulk_create(batch))
+        return created
+
+
+class CalendarEntry(models.Model):
+    """
+    Денормализованная запись календаря пользователя
+
+    Хранит по одной строке на каждое событие в календаре пользователя,
+    чтобы календарь читался одним range-запросом по индексу (user, start).
+    Поддерживается в актуальном состоянии сигналами из crm.signals,
+    полная пересборка - командой rebuild_calendar_entries.
+
+    user: Пользователь, в календаре которого находится событие
+    kind: Тип события (задача или встреча)
+    object_id: id задачи или встречи
+    start: Дедлайн задачи или начало встречи (первого повторения для серии)
+    end: Окончание встречи или серии, у задач и бесконечных серий пусто
+    title: Название события
+    is_recurring: Запись описывает серию, повторения разворачиваются при чтении
+    """
+
+    class Kind(models.TextChoices):
+        TASK = "task", "Задача"
+        MEETING = "meeting", "Встреча"
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="calendar_entries"
+    )
+    kind = models.CharField(choices=Kind, max_length=10)
+    object_id = models.PositiveIntegerField()
+    start = models.DateTimeField()
+    end = models.DateTimeField(null=True, blank=True)
+    title = models.CharField(max_length=200)
+    is_recurring = models.BooleanField(default=False)
+
+    objects = CalendarEntryQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Запись календаря"
+        verbose_name_plural = "Записи календаря"
+        indexes = [
+            models.Index(fields=["user", "start"], name="calendar_entry_user_start"),
+            models.Index(
+                fields=["user", "start"],
+                condition=models.Q(is_recurring=True),
+                name="calendar_entry_recurring",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["kind", "object_id", "user"], name="unique_calendar_entry"
+            )
+        ]
+
+
+def new_feed_secret():
+    return get_random_string(32)
+
+
+class CalendarFeed(models.Model):
+    """
+    Секрет ссылки на подписку календаря пользователя
+
+    user: Владелец календаря
+    secret: Случайное значение, входит в подпись токена ссылки (см. crm.ics.feed_token).
+        Смена секрета отзывает все выданные ранее ссылки
+    """
+
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name="calendar_feed"
+    )
+    secret = models.CharField(max_length=32, default=new_feed_secret)
+
+    class Meta:
+        verbose_name = "Подписка на календарь"
+        verbose_name_plural = "Подписки на календарь"
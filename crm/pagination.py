@@ -0,0 +1,206 @@
+import base64
+import json
+from datetime import date, datetime
+
+from django.db.models import F, Q
+
+NEXT = "n"
+PREV = "p"
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_value(value):
+    """Значение ключа для курсора; datetime с микросекундами, чтобы сравнение было точным"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def encode_cursor(direction, values):
+    payload = json.dumps([direction, [encode_value(value) for value in values]])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        direction, values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(cursor) from e
+    if direction not in (NEXT, PREV) or not isinstance(values, list):
+        raise InvalidCursor(cursor)
+    return direction, values
+
+
+def capped_count(queryset, cap):
+    """
+    Количество строк, но не больше cap + 1
+
+    Считает не дальше cap строк, поэтому стоимость не растет с размером таблицы.
+    :return: (количество, True если строк больше cap)
+    """
+    total = queryset.order_by()[: cap + 1].count()
+    return min(total, cap), total > cap
+
+
+class CursorPage:
+    """
+    Страница keyset-пагинации
+
+    object_list: объекты страницы
+    next_cursor, previous_cursor: непрозрачные курсоры соседних страниц или None
+    """
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+class KeysetPaginator:
+    """
+    Пагинация по ключу сортировки вместо OFFSET
+
+    Страница выбирается условием "ключ после последней строки предыдущей страницы"
+    и LIMIT, поэтому при индексе, совпадающем с сортировкой, любая страница стоит
+    как первая. Последним полем сортировки должен быть уникальный ключ (обычно id).
+    NULL в nullable полях сортируются в конце при любом направлении.
+    Полем сортировки может быть и аннотация выборки (например Lower("username")).
+    :param queryset: выборка без сортировки
+    :param ordering: поля сортировки в формате order_by, например ["-created_at", "-id"]
+    :param per_page: размер страницы
+    """
+
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.fields = []
+        self.attnames = []
+        for name in ordering:
+            descending = name.startswith("-")
+            name = name.lstrip("-")
+            if name in queryset.query.annotations:
+                field = queryset.query.annotations[name].output_field
+                self.attnames.append(name)
+            else:
+                field = queryset.model._meta.get_field(name)
+                self.attnames.append(field.attname)
+            self.fields.append((name, field, descending))
+
+    def order_by(self, reverse):
+        expressions = []
+        for name, field, descending in self.fields:
+            expression = F(name)
+            nulls = {"nulls_first": True} if reverse else {"nulls_last": True}
+            if not field.null:
+                nulls = {}
+            if descending != reverse:
+                expressions.append(expression.desc(**nulls))
+            else:
+                expressions.append(expression.asc(**nulls))
+        return expressions
+
+    def key(self, obj):
+        return [getattr(obj, attname) for attname in self.attnames]
+
+    def seek(self, values, reverse):
+        """
+        Условие "строка строго после ключа values" (при reverse - строго перед ним)
+
+        Строится как f1 > v1 OR (f1 = v1 AND (f2 > v2 OR (f2 = v2 AND ...))) AND f1 >= v1
+        """
+        condition = None
+        for (name, field, descending), value in reversed(
+            list(zip(self.fields, values))
+        ):
+            lookup = "lt" if descending != reverse else "gt"
+            if value is None:
+                equal = Q(**{f"{name}__isnull": True})
+                after = Q(**{f"{name}__isnull": False}) if reverse else Q(pk__in=[])
+            else:
+                equal = Q(**{name: value})
+                after = Q(**{f"{name}__{lookup}": value})
+                if field.null and not reverse:
+                    after |= Q(**{f"{name}__isnull": True})
+            condition = after if condition is None else after | (equal & condition)
+
+        # Избыточная нестрогая граница по первому полю: с ней база начинает чтение
+        # индекса сразу с курсора, а не фильтрует строки с начала
+        name, field, descending = self.fields[0]
+        if values[0] is not None:
+            lookup = "lte" if descending != reverse else "gte"
+            bound = Q(**{f"{name}__{lookup}": values[0]})
+            if field.null and not reverse:
+                bound |= Q(**{f"{name}__isnull": True})
+            condition &= bound
+        return condition
+
+    def parse(self, cursor):
+        direction, raw = decode_cursor(cursor)
+        if len(raw) != len(self.fields):
+            raise InvalidCursor(cursor)
+        try:
+            values = [
+                None if value is None else field.to_python(value)
+                for (_, field, _), value in zip(self.fields, raw)
+            ]
+        except Exception as e:
+            raise InvalidCursor(cursor) from e
+        return direction, values
+
+    def get_page(self, cursor=None):
+        """
+        Страница после (или перед) курсором, без курсора - первая
+
+        Некорректный курсор, как и в Paginator.get_page, дает первую страницу
+        """
+        direction, values = NEXT, None
+        if cursor:
+            try:
+                direction, values = self.parse(cursor)
+            except InvalidCursor:
+                values = None
+        reverse = direction == PREV and values is not None
+
+        queryset = self.queryset.order_by(*self.order_by(reverse))
+        if values is not None:
+            queryset = queryset.filter(self.seek(values, reverse))
+        rows = list(queryset[: self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if reverse:
+            rows.reverse()
+        if not rows:
+            return CursorPage([], None, None)
+
+        has_next = has_more if not reverse else True
+        has_previous = has_more if reverse else values is not None
+        return CursorPage(
+            rows,
+            encode_cursor(NEXT, self.key(rows[-1])) if has_next else None,
+            encode_cursor(PREV, self.key(rows[0])) if has_previous else None,
+        )
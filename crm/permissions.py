@@ -3,8 +3,10 @@ from django.contrib.auth.mixins import UserPassesTestMixin
 from django.contrib.auth.models import User
 from django.core.exceptions import PermissionDenied
 from django.shortcuts import redirect, get_object_or_404
+from django.utils.functional import cached_property
 
-from crm.models import TeamUser, Task, Meeting
+from crm.context import crm_context
+from crm.models import TeamUser, Meeting
 
 
 class TeamRoleMixin:
@@ -16,6 +18,11 @@ class TeamRoleMixin:
     3. Проверяем состоит ли пользователь в этой команде
     4. Присваиваем атрибуты класса
     5. Проверяем конкретную роль через классы наследники
+
+    Роль берется из кэша запроса (request.crm_ctx): если задача уже загружена
+    TaskTeamInjectorMixin, роль пришла вместе с ней, иначе - из кэша ролей между запросами,
+    поэтому проверка обычно обходится без запроса к базе. Команда загружается
+    только при обращении к self.team
     """
 
     def dispatch(self, request, *args, **kwargs):
@@ -28,19 +35,14 @@ class TeamRoleMixin:
         if not team_pk:
             raise PermissionDenied("Не указана команда")
 
-        try:
-            team_user = TeamUser.objects.get(
-                team_id=team_pk,
-                user=request.user
-            )
-        except TeamUser.DoesNotExist:
+        ctx = crm_context(request)
+        role = ctx.role(team_pk)
+        if role is None:
             messages.error(request, "Вы не состоите в этой команде")
             return redirect("team_list")
 
-
         self.user = request.user
-        self.user_role = team_user.role
-        self.team = team_user.team
+        self.user_role = role
 
         if not self.has_required_role():
             messages.error(request, f"Нужны права: {self.get_required_role()}")
@@ -48,6 +50,10 @@ class TeamRoleMixin:
 
         return super().dispatch(request, *args, **kwargs)
 
+    @cached_property
+    def team(self):
+        return crm_context(self.request).team(self.kwargs["team_pk"])
+
     def has_required_role(self):
         return self.user_role in self.required_roles
 
@@ -97,7 +103,7 @@ class TaskOwnerMixin:
     def dispatch(self, request, *args, **kwargs):
 
         task_pk = kwargs.get('task_pk') or kwargs.get('pk')
-        self.task = get_object_or_404(Task, pk=task_pk)
+        self.task = crm_context(request).task(task_pk)
         if request.user != self.task.author:
             raise PermissionDenied('Только автор может редактировать задачу')
         return super().dispatch(request, *args, **kwargs)
@@ -110,7 +116,7 @@ class TaskPerformerMixin:
     def dispatch(self, request, *args, **kwargs):
 
         task_pk = kwargs.get('task_pk') or kwargs.get('pk')
-        self.task = get_object_or_404(Task, pk=task_pk)
+        self.task = crm_context(request).task(task_pk)
         if request.user != self.task.performer:
             raise PermissionDenied('Только исполнитель может может менять статус задачи')
         return super().dispatch(request, *args, **kwargs)
@@ -146,6 +152,6 @@ class TaskTeamInjectorMixin:
     def dispatch(self, request, *args, **kwargs):
         task_pk = kwargs.get('task_pk')
         if task_pk:
-            self.task = get_object_or_404(Task, pk=task_pk)
-            kwargs['team_pk'] = self.task.team.pk
+            self.task = crm_context(request).task(task_pk)
+            kwargs['team_pk'] = self.task.team_id
         return super().dispatch(request, *args, **kwargs)
\ No newline at end of file
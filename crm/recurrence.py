@@ -0,0 +1,140 @@
+from calendar import monthrange
+from datetime import timedelta
+
+from django.utils import timezone
+
+NONE = "none"
+DAILY = "daily"
+WEEKLY = "weekly"
+MONTHLY = "monthly"
+
+PERIODS = {DAILY: timedelta(days=1), WEEKLY: timedelta(weeks=1)}
+
+# На каком отрезке после начала пересечения ищем конфликт двух бесконечных серий
+CONFLICT_HORIZON = timedelta(days=366 * 2)
+
+
+def is_recurring(meeting):
+    return bool(meeting.recurrence) and meeting.recurrence != NONE
+
+
+def shift(start, frequency, number):
+    """
+    Начало occurrence с номером number
+
+    Сдвиг считается в локальном времени, чтобы встреча оставалась в тот же час
+    после перехода на летнее/зимнее время. Для ежемесячных встреч день
+    ограничивается длиной месяца (31 число -> 28/29/30).
+    """
+    local = timezone.localtime(start).replace(tzinfo=None)
+    if frequency == MONTHLY:
+        month_index = local.month - 1 + number
+        year = local.year + month_index // 12
+        month = month_index % 12 + 1
+        local = local.replace(
+            year=year, month=month, day=min(local.day, monthrange(year, month)[1])
+        )
+    else:
+        local = local + PERIODS[frequency] * number
+    return timezone.make_aware(local)
+
+
+def first_index(meeting, window_start):
+    """Номер первого occurrence, который может пересечь окно, без перебора с начала серии"""
+    if window_start is None or meeting.recurrence not in PERIODS:
+        return 0
+    duration = meeting.end_datetime - meeting.start_datetime
+    skipped = (window_start - duration - meeting.start_datetime) // PERIODS[
+        meeting.recurrence
+    ]
+    # запас в один шаг на сдвиг локального времени при смене часового пояса
+    return max(0, skipped - 1)
+
+
+def series_end(meeting):
+    """
+    Верхняя граница окончания серии, None для бесконечной серии
+
+    Для одиночной встречи это end_datetime
+    """
+    if not is_recurring(meeting):
+        return meeting.end_datetime
+    duration = meeting.end_datetime - meeting.start_datetime
+    ends = []
+    if meeting.recurrence_count:
+        last = shift(
+            meeting.start_datetime, meeting.recurrence, meeting.recurrence_count - 1
+        )
+        ends.append(last + duration)
+    if meeting.recurrence_until:
+        ends.append(meeting.recurrence_until + duration)
+    return min(ends) if ends else None
+
+
+def iter_occurrences(meeting, window_start=None, window_end=None):
+    """
+    Лениво перечисляет occurrences встречи, пересекающие окно [window_start, window_end)
+
+    Для одиночной встречи отдает ее саму, если она попадает в окно.
+    Бесконечную серию без window_end нужно ограничивать на стороне вызывающего.
+    :param meeting: встреча (Meeting или обьект с теми же полями)
+    :param window_start: начало окна, None - без ограничения
+    :param window_end: конец окна, None - без ограничения
+    :return: генератор пар (start, end)
+    """
+    duration = meeting.end_datetime - meeting.start_datetime
+    if not is_recurring(meeting):
+        if (window_end is None or meeting.start_datetime < window_end) and (
+            window_start is None or meeting.end_datetime > window_start
+        ):
+            yield meeting.start_datetime, meeting.end_datetime
+        return
+
+    exceptions = set(meeting.recurrence_exceptions or [])
+    number = first_index(meeting, window_start)
+    while True:
+        if meeting.recurrence_count and number >= meeting.recurrence_count:
+            return
+        start = shift(meeting.start_datetime, meeting.recurrence, number)
+        if meeting.recurrence_until and start > meeting.recurrence_until:
+            return
+        if window_end is not None and start >= window_end:
+            return
+        end = start + duration
+        if (window_start is None or end > window_start) and timezone.localdate(
+            start
+        ).isoformat() not in exceptions:
+            yield start, end
+        number += 1
+
+
+def overlap_window(first, second):
+    """Отрезок, на котором две встречи или серии могут пересечься, или None"""
+    start = max(first.start_datetime, second.start_datetime)
+    ends = [end for end in (series_end(first), series_end(second)) if end]
+    end = min(ends) if ends else start + CONFLICT_HORIZON
+    end = min(end, start + CONFLICT_HORIZON)
+    return (start, end) if start < end else None
+
+
+def occurrences_overlap(first, second):
+    """
+    Пересекаются ли occurrences двух встреч
+
+    Оба потока occurrences отсортированы, поэтому достаточно одного прохода
+    двумя указателями по общему отрезку.
+    """
+    window = overlap_window(first, second)
+    if window is None:
+        return False
+    left = iter_occurrences(first, *window)
+    right = iter_occurrences(second, *window)
+    a, b = next(left, None), next(right, None)
+    while a and b:
+        if a[0] < b[1] and b[0] < a[1]:
+            return True
+        if a[1] <= b[1]:
+            a = next(left, None)
+        else:
+            b = next(right, None)
+    return False
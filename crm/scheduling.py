@@ -0,0 +1,143 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from crm.calendar_engine import sync_meeting_calendars
+from crm.models import Meeting, MeetingUser
+
+MAX_WINDOW = timedelta(days=31)
+
+
+def busy_intervals(user_ids, window_start, window_end):
+    """
+    Занятые интервалы пользователей в окне одним запросом
+
+    Серии встреч разворачиваются в повторения только внутри окна
+    :param user_ids: id пользователей
+    :param window_start: начало окна поиска
+    :param window_end: конец окна поиска
+    :return: список пар (start, end), не обязательно отсортированный
+    """
+    meetings = (
+        Meeting.objects.filter(participants__user_id__in=user_ids)
+        .overlapping(window_start, window_end)
+        .distinct()
+    )
+    return [
+        interval
+        for meeting in meetings
+        for interval in meeting.occurrences(window_start, window_end)
+    ]
+
+
+def merge_intervals(intervals):
+    """
+    Сливает пересекающиеся и соприкасающиеся интервалы проходом по отсортированному списку
+
+    :param intervals: пары (start, end)
+    :return: отсортированный список непересекающихся пар
+    """
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def align(moment, step):
+    """Округляет момент вверх до сетки шага step от начала часа"""
+    base = moment.replace(minute=0, second=0, microsecond=0)
+    steps = -(-(moment - base) // step)
+    return base + steps * step
+
+
+def free_slots(busy, duration, window_start, window_end, limit=5, step=None):
+    """
+    Ближайшие свободные слоты длительностью duration
+
+    Идет по промежуткам между слитыми занятыми интервалами и нарезает в каждом
+    слоты с началом на сетке step.
+    :param busy: занятые интервалы (start, end)
+    :param duration: длительность встречи (timedelta)
+    :param window_start: начало окна поиска
+    :param window_end: конец окна поиска
+    :param limit: сколько слотов вернуть
+    :param step: шаг сетки начала слота, по умолчанию 30 минут
+    :return: список пар (start, end)
+    """
+    step = step or timedelta(minutes=30)
+    slots = []
+    cursor = window_start
+    for busy_start, busy_end in merge_intervals(busy) + [(window_end, window_end)]:
+        start = align(cursor, step)
+        gap_end = min(busy_start, window_end)
+        while start + duration <= gap_end:
+            slots.append((start, start + duration))
+            if len(slots) >= limit:
+                return slots
+            start += step
+        cursor = max(cursor, busy_end)
+        if cursor >= window_end:
+            break
+    return slots
+
+
+def find_free_slots(user_ids, duration, window_start, window_end, limit=5):
+    """
+    Ближайшие слоты, в которые свободны все пользователи user_ids
+
+    Окно поиска ограничено MAX_WINDOW, чтобы запрос занятости оставался ограниченным
+    """
+    window_end = min(window_end, window_start + MAX_WINDOW)
+    busy = busy_intervals(user_ids, window_start, window_end)
+    return free_slots(busy, duration, window_start, window_end, limit=limit)
+
+
+def invite_users(meeting, user_ids):
+    """
+    Массово добавляет пользователей во встречу
+
+    Строки кандидатов в User блокируются (select_for_update, по возрастанию id), затем
+    пересечения проверяются одним групповым запросом для всех кандидатов в той же
+    транзакции, что и вставка: параллельное приглашение тех же пользователей ждет
+    коммита и видит уже добавленные участия (MeetingUser.save берет ту же блокировку).
+    Участники без конфликтов вставляются одним bulk_create.
+    bulk_create не отправляет сигналы, поэтому календарь синхронизируется явно.
+    :param meeting: встреча
+    :param user_ids: id приглашаемых пользователей
+    :return: отчет {"added": [...], "already": [...], "unknown": [...], "conflicts": {id: встреча}}
+    """
+    user_ids = set(user_ids)
+    with transaction.atomic():
+        known = set(
+            User.objects.select_for_update()
+            .filter(pk__in=user_ids)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+        already = set(
+            MeetingUser.objects.filter(meeting=meeting, user_id__in=known).values_list(
+                "user_id", flat=True
+            )
+        )
+        conflicts = MeetingUser.objects.conflicts(meeting, known - already)
+        to_add = known - already - conflicts.keys()
+
+        participations = [
+            MeetingUser(meeting=meeting, user_id=user_id) for user_id in to_add
+        ]
+        for participation in participations:
+            participation.copy_interval()
+        MeetingUser.objects.bulk_create(participations)
+        if to_add:
+            sync_meeting_calendars([meeting.pk])
+
+    return {
+        "added": sorted(to_add),
+        "already": sorted(already),
+        "unknown": sorted(user_ids - known),
+        "conflicts": conflicts,
+    }
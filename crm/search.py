@@ -0,0 +1,213 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from crm.models import Comment, Task, TeamUser
+
+SEARCH_TABLE = "crm_search"
+
+# Маркеры подсветки в snippet(): управляющие символы не встречаются в тексте
+# и переживают экранирование HTML, после которого заменяются на <mark>
+MARK_START = "\x02"
+MARK_END = "\x03"
+
+# Веса bm25 по колонкам: title, body, scope. Фрагмент берется из body (колонка 1),
+# название задачи показывается отдельно
+WEIGHTS = (5.0, 1.0, 0.0)
+
+SNIPPET_TOKENS = 12
+
+MIN_PREFIX = 2
+
+REBUILD_SQL = [
+    f"DELETE FROM {SEARCH_TABLE}",
+    f"""
+    INSERT INTO {SEARCH_TABLE} (rowid, title, body, scope, kind, task_id)
+    SELECT id * 2, name, description, 'team' || team_id, 'task', id FROM crm_task
+    """,
+    f"""
+    INSERT INTO {SEARCH_TABLE} (rowid, title, body, scope, kind, task_id)
+    SELECT c.id * 2 + 1, '', c.text, 'team' || t.team_id, 'comment', c.task_id
+    FROM crm_comment c JOIN crm_task t ON t.id = c.task_id
+    """,
+    f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')",
+]
+
+
+def fts_available():
+    """Индекс создается миграцией только на SQLite, на других базах используется icontains"""
+    return connection.vendor == "sqlite"
+
+
+def match_expression(query, team_ids=None):
+    """
+    Выражение MATCH из пользовательского запроса
+
+    Запрос разбивается на слова, каждое берется в кавычки, поэтому синтаксис FTS5
+    из ввода не интерпретируется. Последнее слово ищется по префиксу,
+    если оно не короче MIN_PREFIX (для 2-3 символов в таблице есть индекс префиксов).
+    Слова ищутся только в колонках title и body, иначе запрос вида "team1"
+    совпал бы со всеми строками команды по токену scope.
+    Ограничение по командам добавляется токенами колонки scope.
+    :param query: строка поиска
+    :param team_ids: id команд, None - без ограничения
+    :return: выражение или None, если в запросе нет слов
+    """
+    words = re.findall(r"\w+", query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    if len(words[-1]) >= MIN_PREFIX:
+        terms[-1] += "*"
+    expression = "{title body} : (" + " ".join(terms) + ")"
+    if team_ids is not None:
+        scopes = " OR ".join(f"team{team_id}" for team_id in team_ids)
+        expression = f"scope : ({scopes}) AND {expression}"
+    return expression
+
+
+def highlight(snippet):
+    """Экранирует фрагмент и оборачивает совпадения в <mark>"""
+    return mark_safe(
+        escape(snippet).replace(MARK_START, "<mark>").replace(MARK_END, "</mark>")
+    )
+
+
+def search_fts(query, team_ids, limit, performer_team_ids=(), performer_id=None):
+    expression = match_expression(query, team_ids)
+    if expression is None:
+        return []
+    # в командах performer_team_ids видны только задачи исполнителя (как в visible_to):
+    # строки индекса сверяются с crm_task по первичному ключу
+    visibility, params = "", []
+    if performer_team_ids:
+        placeholders = ", ".join(["%s"] * len(performer_team_ids))
+        visibility = f"""
+            AND EXISTS (
+                SELECT 1 FROM crm_task
+                WHERE crm_task.id = {SEARCH_TABLE}.task_id
+                    AND (team_id NOT IN ({placeholders}) OR performer_id = %s)
+            )
+        """
+        params = [*performer_team_ids, performer_id]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT kind, task_id,
+                snippet({SEARCH_TABLE}, 1, %s, %s, '…', %s),
+                bm25({SEARCH_TABLE}, %s, %s, %s) AS score
+            FROM {SEARCH_TABLE}
+            WHERE {SEARCH_TABLE} MATCH %s {visibility}
+            ORDER BY score
+            LIMIT %s
+            """,
+            [
+                MARK_START,
+                MARK_END,
+                SNIPPET_TOKENS,
+                *WEIGHTS,
+                expression,
+                *params,
+                limit,
+            ],
+        )
+        return [
+            {"kind": kind, "task_id": task_id, "snippet": highlight(snippet)}
+            for kind, task_id, snippet, _ in cursor.fetchall()
+        ]
+
+
+def search_fallback(query, team_ids, limit, performer_team_ids=(), performer_id=None):
+    """
+    Поиск через icontains для баз без FTS5
+
+    Без ранжирования и с полным просмотром, поэтому только как запасной вариант
+    """
+    query = query.strip()
+    if not query:
+        return []
+    tasks = Task.objects.filter(
+        Q(name__icontains=query) | Q(description__icontains=query)
+    )
+    comments = Comment.objects.filter(text__icontains=query)
+    if team_ids is not None:
+        tasks = tasks.filter(team_id__in=team_ids)
+        comments = comments.filter(task__team_id__in=team_ids)
+    if performer_team_ids:
+        tasks = tasks.exclude(
+            Q(team_id__in=performer_team_ids) & ~Q(performer_id=performer_id)
+        )
+        comments = comments.exclude(
+            Q(task__team_id__in=performer_team_ids)
+            & ~Q(task__performer_id=performer_id)
+        )
+    results = [
+        {"kind": "task", "task_id": task.pk, "snippet": escape(task.description[:200])}
+        for task in tasks.order_by("-created_at")[:limit]
+    ]
+    results += [
+        {
+            "kind": "comment",
+            "task_id": comment.task_id,
+            "snippet": escape(comment.text[:200]),
+        }
+        for comment in comments.order_by("-created_at")[: limit - len(results)]
+    ]
+    return results
+
+
+def visible_scope(user):
+    """
+    Область поиска пользователя по тем же правилам, что и Task.objects.visible_to
+
+    Суперпользователь ищет везде, администратор и менеджер - по всем задачам своих команд,
+    обычный участник - только по задачам, где он исполнитель
+    :return: аргументы search: team_ids, performer_team_ids, performer_id
+    """
+    if user.is_superuser:
+        return {}
+    memberships = list(
+        TeamUser.objects.filter(user=user).values_list("team_id", "role")
+    )
+    return {
+        "team_ids": [team_id for team_id, _ in memberships],
+        "performer_team_ids": [
+            team_id for team_id, role in memberships if role == TeamUser.Role.USER
+        ],
+        "performer_id": user.pk,
+    }
+
+
+def search(query, team_ids=None, limit=20, performer_team_ids=(), performer_id=None):
+    """
+    Поиск по задачам и комментариям
+
+    На SQLite - по индексу FTS5 с ранжированием bm25 и подсветкой совпадений,
+    названия задач подгружаются одним запросом.
+    :param query: строка поиска
+    :param team_ids: id команд, в которых искать, None - во всех
+    :param limit: максимальное количество результатов
+    :param performer_team_ids: команды, в которых видны только задачи performer_id
+    :param performer_id: исполнитель для performer_team_ids
+    :return: список словарей kind, task, snippet
+    """
+    if team_ids is not None and not team_ids:
+        return []
+    search_in = search_fts if fts_available() else search_fallback
+    results = search_in(query, team_ids, limit, performer_team_ids, performer_id)
+    tasks = Task.objects.in_bulk({result["task_id"] for result in results})
+    return [
+        {**result, "task": tasks[result["task_id"]]}
+        for result in results
+        if result["task_id"] in tasks
+    ]
+
+
+def rebuild():
+    """Полная пересборка индекса из таблиц задач и комментариев"""
+    with connection.cursor() as cursor:
+        for statement in REBUILD_SQL:
+            cursor.execute(statement)
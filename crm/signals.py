@@ -0,0 +1,58 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from crm import stats
+from crm.cache import invalidate_roles
+from crm.calendar_engine import sync_meeting_calendars, sync_task_calendars
+from crm.models import Meeting, MeetingUser, Task, TeamUser
+
+
+@receiver([post_save, post_delete], sender=Task)
+def sync_task_calendar(sender, instance, **kwargs):
+    """Обновляем запись календаря исполнителя при изменении или удалении задачи"""
+    sync_task_calendars([instance.pk])
+
+
+@receiver([pre_save, pre_delete], sender=Task)
+def remember_task_counters(sender, instance, **kwargs):
+    """Дочитываем старые команду и статус задачи, загруженной через only/defer"""
+    if not kwargs.get("raw"):
+        stats.remember_loaded(instance)
+
+
+@receiver(post_save, sender=Task)
+def count_saved_task(sender, instance, created, **kwargs):
+    """Сдвигаем счетчики статусов команды (Task.save выполняется в транзакции)"""
+    stats.task_saved(instance, created)
+
+
+@receiver(post_delete, sender=Task)
+def count_deleted_task(sender, instance, **kwargs):
+    """Уменьшаем счетчик статуса команды (удаление выполняется в транзакции)"""
+    stats.task_deleted(instance)
+
+
+@receiver([post_save, post_delete], sender=Meeting)
+def sync_meeting_calendar(sender, instance, **kwargs):
+    """Обновляем записи календаря всех участников при изменении или удалении встречи"""
+    sync_meeting_calendars([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=MeetingUser)
+def sync_participant_calendar(sender, instance, **kwargs):
+    """Добавляем или убираем встречу из календаря участника"""
+    sync_meeting_calendars([instance.meeting_id])
+
+
+@receiver([post_save, post_delete], sender=TeamUser)
+def reset_cached_role(sender, instance, **kwargs):
+    """
+    Сбрасываем закэшированную роль пользователя
+
+    Удаление команды каскадно удаляет ее TeamUser, и сигнал приходит для каждого из них.
+    Сброс идет после коммита: до него параллельный запрос прочитал бы из базы
+    старую роль и снова положил ее в кэш
+    """
+    user_id = instance.user_id
+    transaction.on_commit(lambda: invalidate_roles([user_id]))
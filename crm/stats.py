@@ -0,0 +1,131 @@
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.db.models import Count, F
+
+from crm.models import Task, Team, TeamTaskStats
+
+STATUSES = Task.Status.values
+
+_deferred = ContextVar("team_stats_deferred", default=None)
+
+
+@contextmanager
+def deferred():
+    """
+    Копит изменения счетчиков до выхода из блока
+
+    Нужно для массовых операций, где сигналы приходят на каждую строку
+    (QuerySet.delete()): вместо UPDATE на каждую задачу - один UPDATE на команду
+    """
+    if _deferred.get() is not None:
+        yield
+        return
+    pending = Counter()
+    token = _deferred.set(pending)
+    try:
+        yield
+    finally:
+        _deferred.reset(token)
+    apply(pending)
+
+
+def apply(deltas):
+    """
+    Применяет изменения счетчиков
+
+    :param deltas: {(team_id, статус): изменение}
+    """
+    pending = _deferred.get()
+    if pending is not None:
+        pending.update(deltas)
+        return
+    by_team = defaultdict(dict)
+    for (team_id, status), delta in deltas.items():
+        if delta and team_id is not None and status in STATUSES:
+            by_team[team_id][status] = F(status) + delta
+    for team_id, changes in by_team.items():
+        if not TeamTaskStats.objects.filter(team_id=team_id).update(**changes):
+            # строки еще нет (команда создана после миграции): создаем и повторяем
+            TeamTaskStats.objects.get_or_create(team_id=team_id)
+            TeamTaskStats.objects.filter(team_id=team_id).update(**changes)
+
+
+def remember_loaded(task):
+    """
+    Дочитывает из базы команду и статус задачи, загруженной без них (only/defer)
+
+    Вызывается до сохранения и удаления, пока в базе еще старые значения
+    """
+    if hasattr(task, "_loaded") or task._state.adding or task.pk is None:
+        return
+    row = Task.objects.filter(pk=task.pk).values_list("team_id", "status").first()
+    if row is not None:
+        task._loaded = row
+
+
+def task_saved(task, created):
+    """Сдвигает счетчики после сохранения задачи, старые значения берутся из Task._loaded"""
+    current = (task.team_id, task.status)
+    if created:
+        apply({current: 1})
+    elif hasattr(task, "_loaded") and task._loaded != current:
+        apply({task._loaded: -1, current: 1})
+    task._loaded = current
+
+
+def task_deleted(task):
+    # без _loaded (задача не из базы) берем текущие значения; значение по умолчанию
+    # getattr вычислялось бы всегда и дочитывало бы отложенные поля уже удаленной строки
+    loaded = task._loaded if hasattr(task, "_loaded") else (task.team_id, task.status)
+    apply({loaded: -1})
+
+
+def for_team(team_pk):
+    """Счетчики команды одной строкой; для команды без строки - нулевые"""
+    return TeamTaskStats.objects.filter(team_id=team_pk).first() or TeamTaskStats(
+        team_id=team_pk
+    )
+
+
+def reconcile(dry_run=False):
+    """
+    Пересчитывает счетчики всех команд по таблице задач
+
+    :param dry_run: только найти расхождения, не исправляя
+    :return: {team_id: {статус: (было, должно быть)}} для команд с расхождениями
+    """
+    expected = defaultdict(dict)
+    for team_id, status, total in (
+        Task.objects.order_by()
+        .values_list("team_id", "status")
+        .annotate(total=Count("pk"))
+    ):
+        expected[team_id][status] = total
+
+    drift = {}
+    with transaction.atomic():
+        current = {
+            stats.team_id: stats for stats in TeamTaskStats.objects.select_for_update()
+        }
+        for team_id in Team.objects.values_list("pk", flat=True):
+            stats = current.get(team_id) or TeamTaskStats(team_id=team_id)
+            changes = {
+                status: (getattr(stats, status), expected[team_id].get(status, 0))
+                for status in STATUSES
+                if getattr(stats, status) != expected[team_id].get(status, 0)
+            }
+            if team_id not in current and not dry_run:
+                TeamTaskStats.objects.create(
+                    team_id=team_id,
+                    **{status: expected[team_id].get(status, 0) for status in STATUSES},
+                )
+            elif changes and not dry_run:
+                TeamTaskStats.objects.filter(team_id=team_id).update(
+                    **{status: new for status, (_, new) in changes.items()}
+                )
+            if changes:
+                drift[team_id] = changes
+    return drift
@@ -0,0 +1,136 @@
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from crm.models import SweepState, Task, TaskReminder
+
+OVERDUE = "overdue"
+
+OPEN_STATUSES = [Task.Status.open, Task.Status.processing]
+
+
+def after_mark(position, position_id):
+    """
+    Задачи строго после отметки (deadline, id)
+
+    Ветки deadline IS NULL нет: overdue() и так их не выбирает, а с ней база
+    не смогла бы начать чтение индекса с отметки
+    """
+    return Q(deadline__gte=position) & (
+        Q(deadline__gt=position) | Q(deadline=position, pk__gt=position_id)
+    )
+
+
+def behind_mark(position, position_id):
+    """Задачи не позже отметки (deadline, id) - дополнение after_mark"""
+    return Q(deadline__lte=position) & (
+        Q(deadline__lt=position) | Q(deadline=position, pk__lte=position_id)
+    )
+
+
+def late(status, position, position_id):
+    """
+    Неотмеченные задачи одного статуса за отметкой
+
+    Это задачи, которым срок поставили в прошлое уже после прохода (импорт,
+    редактирование дедлайна). Читаются по частичному индексу task_unmarked_deadline,
+    в котором открытые задачи за отметкой есть только такие, поэтому проба
+    стоит столько, сколько их найдено
+    """
+    return (
+        Task.objects.filter(status=status, overdue_at__isnull=True)
+        .filter(behind_mark(position, position_id))
+        .order_by("deadline", "id")
+        .values_list("pk", "deadline", "performer_id")
+    )
+
+
+def remind(rows, now):
+    TaskReminder.objects.bulk_create(
+        TaskReminder(
+            task_id=pk,
+            user_id=performer_id,
+            kind=TaskReminder.Kind.OVERDUE,
+            created_at=now,
+        )
+        for pk, _, performer_id in rows
+        if performer_id is not None
+    )
+
+
+def pending(status, now, position=None, position_id=None):
+    """
+    Просроченные задачи одного статуса после отметки в порядке индекса (status, deadline, id)
+
+    Статус берется по одному: с IN по двум статусам базе пришлось бы сортировать
+    все строки после отметки, а с равенством строки читаются из индекса уже по порядку
+    """
+    tasks = Task.objects.filter(status=status, deadline__lt=now)
+    if position is not None:
+        tasks = tasks.filter(after_mark(position, position_id))
+    return tasks.order_by("deadline", "id").values_list(
+        "pk", "deadline", "performer_id"
+    )
+
+
+def sweep_overdue(now=None, batch_size=10000):
+    """
+    Отмечает задачи, у которых истек срок, и ставит напоминания исполнителям
+
+    Задачи выбираются по индексу (status, deadline, id) после отметки SweepState,
+    поэтому уже обработанные строки повторно не читаются. Каждая пачка - это
+    SELECT на каждый открытый статус (не больше batch_size строк каждый),
+    UPDATE по диапазону ключа, INSERT напоминаний и сохранение отметки
+    в одной транзакции; отметка блокируется, чтобы два воркера не обработали одно и то же.
+    Задачи, которым после прохода срок поставили в прошлое (раньше отметки),
+    сначала добираются отдельной пробой late пачками того же размера.
+    :param now: момент, на который проверяется срок
+    :param batch_size: сколько задач обрабатывать за одну транзакцию
+    :return: количество отмеченных задач
+    """
+    now = now or timezone.now()
+    total = 0
+    while True:
+        with transaction.atomic():
+            state, _ = SweepState.objects.select_for_update().get_or_create(
+                name=OVERDUE
+            )
+            if state.position is not None:
+                behind = []
+                for status in OPEN_STATUSES:
+                    behind += late(status, state.position, state.position_id)[
+                        :batch_size
+                    ]
+                if behind:
+                    behind = sorted(behind, key=lambda row: (row[1], row[0]))
+                    behind = behind[:batch_size]
+                    Task.objects.filter(
+                        pk__in=[pk for pk, _, _ in behind], overdue_at__isnull=True
+                    ).update(overdue_at=now)
+                    remind(behind, now)
+                    total += len(behind)
+                    continue
+
+            batch = []
+            for status in OPEN_STATUSES:
+                batch += pending(status, now, state.position, state.position_id)[
+                    :batch_size
+                ]
+            batch = sorted(batch, key=lambda row: (row[1], row[0]))[:batch_size]
+            if not batch:
+                return total
+
+            last_id, last_deadline, _ = batch[-1]
+            tasks = Task.objects.overdue(now)
+            if state.position is not None:
+                tasks = tasks.filter(after_mark(state.position, state.position_id))
+            tasks.filter(
+                Q(deadline__lt=last_deadline)
+                | Q(deadline=last_deadline, pk__lte=last_id)
+            ).update(overdue_at=now)
+            remind(batch, now)
+            state.position, state.position_id = last_deadline, last_id
+            state.save()
+        total += len(batch)
+        if len(batch) < batch_size:
+            return total
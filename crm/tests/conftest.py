@@ -2,11 +2,18 @@ from datetime import timedelta
 
 import pytest
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.utils import timezone
 
 from crm.models import Team, Task, Meeting
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Кэш (locmem) живет между тестами, очищаем его перед каждым"""
+    cache.clear()
+
+
 @pytest.fixture
 def user():
     return User.objects.create_user(
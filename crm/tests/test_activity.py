@@ -0,0 +1,111 @@
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.utils import timezone
+
+from crm.models import Evaluation, Task, TaskEvent, TeamUser
+
+
+@pytest.mark.django_db
+def test_task_changes_are_logged(client, user, team, superuser):
+    TeamUser.objects.create(team=team, user=user, role=TeamUser.Role.ADMIN)
+    performer = User.objects.create_user(username="performer", password="password")
+    TeamUser.objects.create(team=team, user=performer)
+    task = Task.objects.create(author=user, team=team, name="task", description="d")
+    client.force_login(user)
+
+    client.post(
+        f"/tasks/{task.pk}/update/",
+        {"performer": performer.pk, "description": "new", "status": "open"},
+    )
+    client.post(f"/tasks/{task.pk}/evaluation/", {"evaluation": 5})
+    # та же оценка еще раз - событие не пишется
+    client.post(f"/tasks/{task.pk}/evaluation/", {"evaluation": 5})
+    client.force_login(performer)
+    client.post(f"/tasks/{task.pk}/task_done")
+
+    events = list(task.events.order_by("id").values_list("kind", "changes"))
+    assert events == [
+        (
+            TaskEvent.Kind.UPDATED,
+            {
+                "description": ["d", "new"],
+                "status": ["open", "processing"],
+                "performer_id": [None, performer.pk],
+            },
+        ),
+        (TaskEvent.Kind.EVALUATED, {"evaluation": [None, 5]}),
+        (TaskEvent.Kind.DONE, {"status": ["processing", "done"]}),
+    ]
+    assert Evaluation.objects.get(task=task).evaluation == 5
+
+    client.force_login(user)
+    response = client.get(f"/teams/{team.pk}/activity/")
+    assert response.status_code == 200
+    assert next(event.kind for event in response.context["page_obj"]) == "done"
+    assert "performer" in response.content.decode()
+
+    client.force_login(performer)
+    assert client.get(f"/teams/{team.pk}/activity/").status_code == 302
+
+
+@pytest.mark.django_db
+def test_deleted_task_keeps_history(client, user, team, task):
+    client.force_login(user)
+    client.post(f"/tasks/{task.pk}/delete/")
+    event = TaskEvent.objects.get()
+    assert event.task_id == task.pk
+    assert event.kind == TaskEvent.Kind.DELETED
+
+
+@pytest.mark.django_db
+def test_compaction_rolls_old_events_into_daily_summaries(user, team, task):
+    old = timezone.now() - timedelta(days=100)
+    TaskEvent.objects.bulk_create(
+        [
+            TaskEvent(
+                task=task,
+                team=team,
+                user=user,
+                kind=TaskEvent.Kind.UPDATED,
+                changes={"status": [old_status, new_status]},
+                created_at=old + timedelta(minutes=number),
+            )
+            for number, (old_status, new_status) in enumerate(
+                [("open", "processing"), ("processing", "done"), ("done", "open")]
+            )
+        ]
+        + [
+            TaskEvent(
+                task=task,
+                team=team,
+                kind=TaskEvent.Kind.UPDATED,
+                changes={"name": ["task", "renamed"]},
+            )
+        ]
+    )
+
+    out = StringIO()
+    call_command("compact_task_events", "--days", "30", stdout=out)
+    call_command("compact_task_events", "--days", "30", stdout=out)
+
+    summary = TaskEvent.objects.get(kind=TaskEvent.Kind.SUMMARY)
+    assert summary.count == 3
+    assert summary.changes == {}
+    assert summary.task_id == task.pk
+    assert TaskEvent.objects.count() == 2
+    assert "Свернуто событий: 3" in out.getvalue()
+
+
+@pytest.mark.django_db
+def test_invalid_evaluation_is_rejected(client, user, team, task):
+    TeamUser.objects.create(team=team, user=user, role=TeamUser.Role.ADMIN)
+    client.force_login(user)
+    for value in ("", "abc", 7):
+        response = client.post(f"/tasks/{task.pk}/evaluation/", {"evaluation": value})
+        assert response.status_code == 302
+    assert not Evaluation.objects.exists()
+    assert not task.events.exists()
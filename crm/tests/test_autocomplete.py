@@ -0,0 +1,83 @@
+import pytest
+from django.contrib.auth.models import User
+
+from crm.models import MeetingUser, TeamUser
+
+
+@pytest.fixture
+def people(db):
+    names = ["Alice", "alex", "albert", "bob", "Alyona"]
+    return {
+        name: User.objects.create_user(
+            username=name, email=f"{name.lower()}@example.com", password="password"
+        )
+        for name in names
+    }
+
+
+def usernames(response):
+    return [row["username"] for row in response.json()["results"]]
+
+
+@pytest.mark.django_db
+def test_prefix_search_ignores_case(client, user, people):
+    client.force_login(user)
+    response = client.get("/users/autocomplete/", {"q": "AL"})
+    assert response.status_code == 200
+    assert usernames(response) == ["albert", "alex", "Alice", "Alyona"]
+    assert "email" not in response.json()["results"][0]
+
+
+@pytest.mark.django_db
+def test_search_matches_email_prefix(client, user, people):
+    people["bob"].email = "robert@example.com"
+    people["bob"].save()
+    client.force_login(user)
+    response = client.get("/users/autocomplete/", {"q": "rob"})
+    assert usernames(response) == ["bob"]
+
+
+@pytest.mark.django_db
+def test_pages_follow_cursor(client, user, people):
+    client.force_login(user)
+    seen = []
+    params = {"limit": 2}
+    while True:
+        data = client.get("/users/autocomplete/", params).json()
+        seen += [row["username"] for row in data["results"]]
+        if not data["next_cursor"]:
+            break
+        params["cursor"] = data["next_cursor"]
+    assert seen == ["albert", "alex", "Alice", "Alyona", "bob", "username"]
+
+
+@pytest.mark.django_db
+def test_exclusion_filters(client, user, team, meeting, people):
+    TeamUser.objects.create(team=team, user=people["alex"])
+    MeetingUser.objects.create(meeting=meeting, user=people["albert"])
+    client.force_login(user)
+    response = client.get("/users/autocomplete/", {"q": "al", "not_in_team": team.pk})
+    assert usernames(response) == ["albert", "Alice", "Alyona"]
+    response = client.get("/users/autocomplete/", {"q": "al", "without_team": "1"})
+    assert usernames(response) == ["albert", "Alice", "Alyona"]
+    response = client.get(
+        "/users/autocomplete/", {"q": "al", "not_in_meeting": meeting.pk}
+    )
+    assert usernames(response) == ["alex", "Alice", "Alyona"]
+
+
+@pytest.mark.django_db
+def test_invalid_params(client, user):
+    client.force_login(user)
+    response = client.get("/users/autocomplete/", {"limit": 500})
+    assert response.status_code == 400
+    assert "limit" in response.json()["errors"]
+
+
+@pytest.mark.django_db
+def test_team_page_lists_one_page_of_matches(client, user, team, people):
+    client.force_login(user)
+    response = client.get(f"/teams/{team.pk}", {"user_q": "al"})
+    assert response.status_code == 200
+    page = response.context["available_users"]
+    assert [person.username for person in page] == ["albert", "alex", "Alice", "Alyona"]
@@ -0,0 +1,90 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from crm.cache import get_role, hit_stats
+from crm.models import Task, TeamUser
+
+
+@pytest.fixture
+def admin_task(user, team):
+    TeamUser.objects.create(team=team, user=user, role=TeamUser.Role.ADMIN)
+    return Task.objects.create(author=user, team=team, name="task", description="d")
+
+
+@pytest.mark.django_db
+def test_evaluation_resolves_task_and_role_once(client, user, admin_task):
+    client.force_login(user)
+    with CaptureQueriesContext(connection) as queries:
+        response = client.post(f"/tasks/{admin_task.pk}/evaluation/", {"evaluation": 5})
+    assert response.status_code == 302
+    sql = [query["sql"] for query in queries.captured_queries]
+    # до работы с оценкой: сессия, пользователь и задача вместе с командой и ролью
+    # (не считая открытия транзакции)
+    first_evaluation = next(
+        number for number, query in enumerate(sql) if '"crm_evaluation"' in query
+    )
+    lookups = [
+        query
+        for query in sql[:first_evaluation]
+        if not query.startswith(("BEGIN", "SAVEPOINT"))
+    ]
+    assert len(lookups) == 3
+    assert sum('FROM "crm_task"' in query for query in sql) == 1
+    assert not any(
+        query.startswith(('SELECT "crm_teamuser"', 'SELECT "crm_team".'))
+        for query in sql
+    )
+
+
+@pytest.mark.django_db
+def test_non_member_is_redirected(client, admin_task):
+    from django.contrib.auth.models import User
+
+    stranger = User.objects.create_user(username="stranger", password="password")
+    client.force_login(stranger)
+    response = client.post(f"/tasks/{admin_task.pk}/comment/", {"text": "hi"})
+    assert response.status_code == 302
+    assert response.url == "/teams/"
+    assert not admin_task.comments.exists()
+
+
+@pytest.mark.django_db
+def test_member_comment_is_saved(client, user, admin_task):
+    client.force_login(user)
+    response = client.post(f"/tasks/{admin_task.pk}/comment/", {"text": "hi"})
+    assert response.url == f"/tasks/{admin_task.pk}"
+    assert admin_task.comments.get().text == "hi"
+
+
+@pytest.mark.django_db
+def test_role_cache_skips_membership_query(
+    client, user, team, settings, django_capture_on_commit_callbacks
+):
+    settings.CRM_ROLE_CACHE_ENABLED = True
+    TeamUser.objects.create(team=team, user=user, role=TeamUser.Role.MANAGER)
+    client.force_login(user)
+    client.get(f"/teams/{team.pk}/activity/")
+
+    with CaptureQueriesContext(connection) as queries:
+        assert client.get(f"/teams/{team.pk}/activity/").status_code == 200
+    assert not any('FROM "crm_teamuser"' in query["sql"] for query in queries)
+    stats = hit_stats(["role"])["role"]
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+    # кэш сбрасывается только после коммита, до него запись остается прежней
+    with django_capture_on_commit_callbacks(execute=True):
+        TeamUser.objects.filter(user=user).get().delete()
+        assert get_role(user.pk, team.pk) == TeamUser.Role.MANAGER
+    assert get_role(user.pk, team.pk) is None
+    with django_capture_on_commit_callbacks(execute=True):
+        TeamUser.objects.create(team=team, user=user, role=TeamUser.Role.USER)
+    assert get_role(user.pk, team.pk) == TeamUser.Role.USER
+
+
+@pytest.mark.django_db
+def test_role_cache_can_be_disabled(user, team, settings):
+    settings.CRM_ROLE_CACHE_ENABLED = False
+    TeamUser.objects.create(team=team, user=user, role=TeamUser.Role.ADMIN)
+    assert get_role(user.pk, team.pk) == TeamUser.Role.ADMIN
+    assert hit_stats(["role"])["role"]["hits"] == 0
@@ -0,0 +1,133 @@
+import io
+import json
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+
+from crm.importers import Malformed, TaskImporter, iter_json
+from crm.models import CalendarEntry, Task, TeamUser
+
+
+def test_iter_json_streams_array_and_lines():
+    rows = [{"name": f"task {number}", "text": "x" * number} for number in range(50)]
+    array = io.StringIO(json.dumps(rows))
+    lines = io.StringIO("\n".join(json.dumps(row) for row in rows))
+    assert list(iter_json(array, chunk_size=7)) == rows
+    assert list(iter_json(lines, chunk_size=7)) == rows
+
+
+def errors(rows):
+    return [row.error if isinstance(row, Malformed) else row for row in rows]
+
+
+def test_iter_json_keeps_nested_arrays():
+    text = '[{"name": "a", "tags": [1, [2]]}, [3, 4], 12345]'
+    for chunk_size in (1, 3, 100):
+        assert list(iter_json(io.StringIO(text), chunk_size=chunk_size)) == [
+            {"name": "a", "tags": [1, [2]]},
+            [3, 4],
+            12345,
+        ]
+    assert list(iter_json(io.StringIO("[]"))) == []
+
+
+def test_iter_json_lines_reject_bad_and_long_lines():
+    text = '{"name": "a"}\n{"name": \n\n{"name": "' + "x" * 50 + '"}\n{"name": "b"}'
+    rows = errors(iter_json(io.StringIO(text), chunk_size=4, max_size=20))
+    assert rows == [
+        {"name": "a"},
+        "Строка 2: некорректный JSON (Expecting value)",
+        "Строка 4: длиннее 20 символов",
+        {"name": "b"},
+    ]
+
+
+def test_iter_json_array_stops_at_bad_element_with_bounded_buffer():
+    class Stream(io.StringIO):
+        read_total = 0
+
+        def read(self, size=-1):
+            chunk = super().read(size)
+            self.read_total += len(chunk)
+            return chunk
+
+    stream = Stream('[{"name": "a"}, {"name": oops}, ' + '{"name": "b"}, ' * 1000 + "]")
+    rows = errors(iter_json(stream, chunk_size=8, max_size=64))
+    assert rows == [
+        {"name": "a"},
+        "Позиция 25: некорректный JSON (Expecting value)",
+    ]
+    # после ошибки файл дочитывается не дальше max_size
+    assert stream.read_total < 200
+
+
+@pytest.mark.django_db
+def test_import_rejects_malformed_json_line(team):
+    rows = iter_json(
+        io.StringIO(
+            '{"name": "ok", "description": "d", "team": %d}\n{broken\n' % team.pk
+        )
+    )
+    rejects = io.StringIO()
+    assert TaskImporter(rejects=rejects).run(rows) == (1, 1)
+    assert "Строка 2: некорректный JSON" in rejects.getvalue()
+
+
+@pytest.mark.django_db
+def test_import_csv_with_rejects(tmp_path, user, team):
+    TeamUser.objects.create(team=team, user=user)
+    outsider = User.objects.create_user(username="outsider", password="password")
+    path = tmp_path / "tasks.csv"
+    path.write_text(
+        "name,description,status,deadline,team,performer,author\n"
+        f"first,d,open,2030-01-01 10:00,{team.name},{user.username},{user.username}\n"
+        f"second,d,,,{team.pk},,\n"
+        f"bad status,d,closed,,{team.pk},,\n"
+        f"stranger,d,open,,{team.pk},{outsider.username},\n"
+        "no team,d,open,,missing,,\n",
+        encoding="utf-8",
+    )
+
+    call_command("import_tasks", str(path), "--batch-size", "1", stdout=io.StringIO())
+
+    assert list(Task.objects.order_by("pk").values_list("name", "status")) == [
+        ("first", Task.Status.open),
+        ("second", Task.Status.open),
+    ]
+    assert CalendarEntry.objects.filter(user=user).count() == 1
+    rejects = (tmp_path / "tasks.csv.rejects.csv").read_text(encoding="utf-8")
+    assert rejects.count("\n") == 4
+    assert "не состоит в команде" in rejects
+    assert "команда не найдена" in rejects
+
+
+@pytest.mark.django_db
+def test_importer_reports_progress_per_batch(team):
+    calls = []
+    rows = [
+        {"name": f"task {n}", "description": "d", "team": team.pk} for n in range(5)
+    ]
+    importer = TaskImporter(batch_size=2, progress=lambda *args: calls.append(args))
+    assert importer.run(iter(rows)) == (5, 0)
+    assert calls == [(2, 2, 0), (4, 4, 0), (5, 5, 0)]
+
+
+@pytest.mark.django_db
+def test_admin_import_returns_rejects(client, team):
+    admin = User.objects.create_superuser(username="root", password="password")
+    client.force_login(admin)
+    upload = SimpleUploadedFile(
+        "tasks.jsonl",
+        b'{"name": "ok", "description": "d", "team": %d}\n{"name": "bad"}\n' % team.pk,
+    )
+
+    response = client.post(
+        "/admin/crm/task/import/", {"file": upload, "batch_size": 100}
+    )
+
+    assert response.status_code == 200
+    assert response["Content-Disposition"].startswith("attachment")
+    assert b"bad" in b"".join(response.streaming_content)
+    assert Task.objects.get().author == admin
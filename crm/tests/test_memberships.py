@@ -0,0 +1,180 @@
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from crm import memberships
+from crm.cache import get_role
+from crm.models import Team, TeamUser
+
+
+@pytest.fixture
+def teams(user):
+    return [
+        Team.objects.create(name=f"team {number}", creator=user) for number in range(2)
+    ]
+
+
+@pytest.fixture
+def staff(db):
+    return User.objects.create_user(
+        username="staff", password="password", is_staff=True
+    )
+
+
+def make_users(*names):
+    return [
+        User.objects.create_user(username=name, password="password") for name in names
+    ]
+
+
+def roles():
+    return dict(TeamUser.objects.values_list("user__username", "role"))
+
+
+def teams_of():
+    return dict(TeamUser.objects.values_list("user__username", "team_id"))
+
+
+def test_read_assignments():
+    lines = ["ann,1,manager", "", "bob,,", "cid,2"]
+    assert memberships.read_assignments(lines) == [
+        ("ann", 1, "manager"),
+        ("bob", None, None),
+        ("cid", 2, None),
+    ]
+    with pytest.raises(ValueError, match="Строка 2"):
+        memberships.read_assignments(["ann,1", "bob,x"])
+
+
+@pytest.mark.django_db
+def test_apply_adds_moves_updates_and_removes(teams):
+    first, second = teams
+    _, bob, cid, dan = make_users("ann", "bob", "cid", "dan")
+    TeamUser.objects.create(team=first, user=bob)
+    TeamUser.objects.create(team=first, user=cid)
+    TeamUser.objects.create(team=second, user=dan, role=TeamUser.Role.ADMIN)
+
+    with CaptureQueriesContext(connection) as queries:
+        report = memberships.apply(
+            [
+                ("ann", first.pk, None),
+                ("bob", second.pk, "manager"),
+                ("cid", first.pk, "admin"),
+                ("dan", None, None),
+            ]
+        )
+    assert report["added"] == ["ann"]
+    assert report["moved"] == ["bob"]
+    assert report["updated"] == ["cid"]
+    assert report["removed"] == ["dan"]
+    assert report["errors"] == {}
+    assert teams_of() == {"ann": first.pk, "bob": second.pk, "cid": first.pk}
+    assert roles() == {"ann": "user", "bob": "manager", "cid": "admin"}
+    # изменения применяются одним DELETE, одним UPDATE и одним INSERT
+    sql = [query["sql"] for query in queries.captured_queries]
+    assert sum(query.startswith("DELETE") for query in sql) == 1
+    assert sum(query.startswith("UPDATE") for query in sql) == 1
+    assert sum(query.startswith("INSERT") for query in sql) == 1
+
+
+@pytest.mark.django_db
+def test_swap_between_teams(teams):
+    first, second = teams
+    ann, bob = make_users("ann", "bob")
+    TeamUser.objects.create(team=first, user=ann)
+    TeamUser.objects.create(team=second, user=bob)
+    report = memberships.apply([("ann", second.pk, None), ("bob", first.pk, None)])
+    assert report["moved"] == ["ann", "bob"]
+    assert teams_of() == {"ann": second.pk, "bob": first.pk}
+
+
+@pytest.mark.django_db
+def test_any_error_applies_nothing(user, teams):
+    first, _ = teams
+    make_users("ann", "bob")
+    TeamUser.objects.create(team=first, user=user)
+    report = memberships.apply(
+        [
+            ("ann", first.pk, None),
+            ("bob", 999, None),
+            ("ghost", first.pk, None),
+            ("username", None, None),
+            ("ann", first.pk, "boss"),
+        ]
+    )
+    assert set(report["errors"]) == {"ann", "bob", "ghost", "username"}
+    assert teams_of() == {"username": first.pk}
+
+
+@pytest.mark.django_db
+def test_dry_run_changes_nothing(teams):
+    make_users("ann")
+    report = memberships.apply([("ann", teams[0].pk, None)], dry_run=True)
+    assert report["added"] == ["ann"]
+    assert not TeamUser.objects.exists()
+
+
+@pytest.mark.django_db
+def test_cached_roles_are_reset_after_commit(
+    teams, settings, django_capture_on_commit_callbacks
+):
+    settings.CRM_ROLE_CACHE_ENABLED = True
+    first, second = teams
+    ann, bob = make_users("ann", "bob")
+    TeamUser.objects.create(team=first, user=ann)
+    TeamUser.objects.create(team=first, user=bob)
+    assert get_role(ann.pk, first.pk) == "user"
+    assert get_role(bob.pk, first.pk) == "user"
+    with django_capture_on_commit_callbacks(execute=True):
+        memberships.apply([("ann", second.pk, "admin"), ("bob", None, None)])
+        assert get_role(ann.pk, first.pk) == "user"
+    assert get_role(ann.pk, first.pk) is None
+    assert get_role(ann.pk, second.pk) == "admin"
+    assert get_role(bob.pk, first.pk) is None
+
+
+@pytest.mark.django_db
+def test_state_is_read_under_lock(teams):
+    make_users("ann")
+    with CaptureQueriesContext(connection) as queries:
+        memberships.apply([("ann", teams[0].pk, None)])
+    sql = [query["sql"] for query in queries.captured_queries]
+    lock = next(n for n, query in enumerate(sql) if 'FROM "crm_teamuser"' in query)
+    # блокировка и проверка идут в той же транзакции, что и запись
+    assert sql.index(next(q for q in sql if q.startswith("INSERT"))) > lock
+    assert any(query.startswith(("BEGIN", "SAVEPOINT")) for query in sql[:lock])
+
+
+@pytest.mark.django_db
+def test_view_requires_staff_and_applies(client, user, staff, teams):
+    make_users("ann")
+    client.force_login(user)
+    response = client.post("/teams/memberships/", {"assignments": "ann,1"})
+    assert response.status_code == 403
+    assert not TeamUser.objects.exists()
+
+    client.force_login(staff)
+    response = client.post(
+        "/teams/memberships/",
+        {"assignments": f"ann,{teams[0].pk},manager"},
+        headers={"accept": "application/json"},
+    )
+    assert response.status_code == 200
+    assert response.json()["added"] == ["ann"]
+    assert roles() == {"ann": "manager"}
+
+
+@pytest.mark.django_db
+def test_command(tmp_path, teams):
+    make_users("ann")
+    path = tmp_path / "reorg.csv"
+    path.write_text(f"ann,{teams[1].pk}\nghost,{teams[1].pk}\n", encoding="utf-8")
+    with pytest.raises(CommandError):
+        call_command("apply_memberships", str(path))
+    assert not TeamUser.objects.exists()
+
+    path.write_text(f"ann,{teams[1].pk}\n", encoding="utf-8")
+    call_command("apply_memberships", str(path))
+    assert teams_of() == {"ann": teams[1].pk}
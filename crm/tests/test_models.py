@@ -2,9 +2,21 @@ from datetime import timedelta
 
 import pytest
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import connection
 from django.utils import timezone
 
-from crm.models import Team, TeamUser, Task, Comment, Meeting, MeetingUser, Evaluation
+from crm.calendar_engine import day_bounds
+from crm.models import (
+    Team,
+    TeamUser,
+    Task,
+    Comment,
+    Meeting,
+    MeetingUser,
+    Evaluation,
+    CalendarEntry,
+)
 
 
 @pytest.mark.django_db
@@ -74,3 +86,133 @@ def test_create_evaluation(task):
     )
     assert evaluation.task == task
     assert evaluation.evaluation == Evaluation.EvaluationChoices.A
+
+
+@pytest.mark.django_db
+def test_calendar_entries_follow_meeting_and_task(user, team, meeting):
+    participant = MeetingUser.objects.create(user=user, meeting=meeting)
+    entry = CalendarEntry.objects.get(kind=CalendarEntry.Kind.MEETING, user=user)
+    assert entry.start == meeting.start_datetime
+
+    meeting.start_datetime += timedelta(minutes=30)
+    meeting.save()
+    entry.refresh_from_db()
+    assert entry.start == meeting.start_datetime
+
+    participant.delete()
+    assert not CalendarEntry.objects.filter(kind=CalendarEntry.Kind.MEETING).exists()
+
+    task = Task.objects.create(
+        author=user,
+        performer=user,
+        team=team,
+        name="task",
+        description="description",
+        deadline=timezone.now(),
+    )
+    assert CalendarEntry.objects.filter(object_id=task.pk, user=user).exists()
+    task.delete()
+    assert not CalendarEntry.objects.exists()
+
+
+@pytest.mark.django_db
+def test_calendar_lookups_use_indexes(user):
+    if connection.vendor != "sqlite":
+        pytest.skip("План запроса проверяется только для SQLite")
+    start, end = day_bounds(timezone.localdate())
+
+    task_plan = Task.objects.filter(
+        performer=user, deadline__gte=start, deadline__lt=end
+    ).explain()
+    meeting_plan = Meeting.objects.filter(
+        start_datetime__gte=start, start_datetime__lt=end
+    ).explain()
+    entry_plan = CalendarEntry.objects.filter(
+        user=user, start__gte=start, start__lt=end
+    ).explain()
+
+    assert "task_performer_deadline" in task_plan
+    assert "meeting_start_datetime" in meeting_plan
+    assert "calendar_entry_user_start" in entry_plan
+
+
+@pytest.mark.django_db
+def test_meeting_user_conflict_probe(user, meeting):
+    def create(start, hours, **kwargs):
+        return Meeting.objects.create(
+            creator=user,
+            name="m",
+            description="d",
+            start_datetime=start,
+            end_datetime=start + timedelta(hours=hours),
+            **kwargs,
+        )
+
+    base = meeting.start_datetime + timedelta(days=14)
+    target = create(base, 1)
+    long_one = create(base - timedelta(hours=3), 1)
+    MeetingUser.objects.create(user=user, meeting=long_one)
+    weekly = create(base - timedelta(days=7, hours=5), 1, recurrence="weekly")
+    MeetingUser.objects.create(user=user, meeting=weekly)
+
+    participation = MeetingUser.objects.get(meeting=long_one)
+    assert participation.start_datetime == long_one.start_datetime
+    long_one.end_datetime = base + timedelta(minutes=30)
+    long_one.save()
+    participation.refresh_from_db()
+    assert participation.end_datetime == long_one.end_datetime
+
+    # раньше начавшаяся одиночная встреча, которая еще идет
+    assert MeetingUser.objects.conflicts(target, [user.pk])[user.pk] == long_one
+    # серия, начавшаяся две недели назад
+    probe = create(base + timedelta(days=7, hours=-5), 1)
+    assert MeetingUser.objects.conflicts(probe, [user.pk])[user.pk] == weekly
+    probe.start_datetime += timedelta(hours=1)
+    probe.end_datetime += timedelta(hours=1)
+    probe.save()
+    assert MeetingUser.objects.conflicts(probe, [user.pk]) == {}
+
+
+@pytest.mark.django_db
+def test_meeting_edit_cannot_overlap_participant_meetings(user, meeting):
+    first = Meeting.objects.create(
+        creator=user,
+        name="a",
+        description="d",
+        start_datetime=meeting.start_datetime + timedelta(days=1),
+        end_datetime=meeting.start_datetime + timedelta(days=1, hours=1),
+    )
+    second = Meeting.objects.create(
+        creator=user,
+        name="b",
+        description="d",
+        start_datetime=first.start_datetime + timedelta(hours=2),
+        end_datetime=first.start_datetime + timedelta(hours=3),
+    )
+    MeetingUser.objects.create(user=user, meeting=first)
+    MeetingUser.objects.create(user=user, meeting=second)
+
+    first.end_datetime = second.start_datetime + timedelta(minutes=30)
+    with pytest.raises(ValidationError):
+        first.save()
+    first.refresh_from_db()
+    assert MeetingUser.objects.get(meeting=first).end_datetime == first.end_datetime
+
+    # после отказа пробы по-прежнему находят пересечение с ранней встречей
+    probe = Meeting(
+        creator=user,
+        start_datetime=first.start_datetime + timedelta(minutes=30),
+        end_datetime=first.start_datetime + timedelta(minutes=45),
+    )
+    assert MeetingUser.objects.conflicts(probe, [user.pk])[user.pk] == first
+
+
+@pytest.mark.django_db
+def test_meeting_user_probe_uses_interval_index(user, meeting):
+    if connection.vendor != "sqlite":
+        pytest.skip("План запроса проверяется только для SQLite")
+    plan = MeetingUser.objects.busy_candidates(
+        [user.pk], meeting.start_datetime, meeting.end_datetime
+    ).explain()
+    assert "meeting_user_interval" in plan
+    assert "meeting_user_recurring" in plan
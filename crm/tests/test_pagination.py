@@ -0,0 +1,89 @@
+from datetime import timedelta
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from crm.models import Task, TeamUser
+from crm.pagination import KeysetPaginator
+
+
+def walk(paginator):
+    """Проходит все страницы вперед, затем назад, возвращает id в обоих порядках"""
+    forward, pages = [], []
+    page = paginator.get_page()
+    while True:
+        pages.append(page)
+        forward += [obj.pk for obj in page]
+        if not page.has_next:
+            break
+        page = paginator.get_page(page.next_cursor)
+    backward = []
+    while page.has_previous:
+        page = paginator.get_page(page.previous_cursor)
+        backward = [obj.pk for obj in page] + backward
+    return forward, backward, pages
+
+
+@pytest.fixture
+def tasks(user, team):
+    now = timezone.now()
+    return [
+        Task.objects.create(
+            author=user,
+            team=team,
+            name=f"task {number}",
+            description="description",
+            # у пар задач одинаковый created_at, порядок решает id
+            created_at=now - timedelta(minutes=number // 2),
+            deadline=now + timedelta(days=number % 3) if number % 4 else None,
+        )
+        for number in range(23)
+    ]
+
+
+@pytest.mark.django_db
+def test_keyset_pages_match_offset_order(tasks):
+    queryset = Task.objects.all()
+    expected = list(
+        queryset.order_by("-created_at", "-id").values_list("pk", flat=True)
+    )
+    forward, backward, pages = walk(
+        KeysetPaginator(queryset, ["-created_at", "-id"], 5)
+    )
+    assert forward == expected
+    assert backward == expected[:20]
+    assert not pages[0].has_previous
+
+
+@pytest.mark.django_db
+def test_keyset_nullable_field_sorts_nulls_last(tasks):
+    queryset = Task.objects.all()
+    forward, backward, _ = walk(KeysetPaginator(queryset, ["deadline", "id"], 4))
+    deadlines = {task.pk: task.deadline for task in tasks}
+    with_deadline = [pk for pk in forward if deadlines[pk] is not None]
+    assert forward == with_deadline + [pk for pk in forward if deadlines[pk] is None]
+    assert with_deadline == sorted(with_deadline, key=lambda pk: (deadlines[pk], pk))
+    assert sorted(forward) == sorted(task.pk for task in tasks)
+    assert backward == forward[:20]
+
+
+@pytest.mark.django_db
+def test_task_list_deep_page_costs_as_first(client, user, team, tasks):
+    TeamUser.objects.create(team=team, user=user, role=TeamUser.Role.ADMIN)
+    client.force_login(user)
+    client.get(f"/teams/{team.pk}/tasks/")  # роль попадает в кэш ролей
+    with CaptureQueriesContext(connection) as first_queries:
+        first = client.get(f"/teams/{team.pk}/tasks/")
+    cursor = first.context["page_obj"].next_cursor
+    with CaptureQueriesContext(connection) as second_queries:
+        second = client.get(f"/teams/{team.pk}/tasks/", {"cursor": cursor})
+
+    expected = [task.pk for task in sorted(tasks, key=lambda t: (t.created_at, t.pk))][
+        ::-1
+    ]
+    assert [task.pk for task in second.context["page_obj"]] == expected[10:20]
+    assert second.context["total"] == len(tasks)
+    assert len(second_queries) == len(first_queries)
+    assert not any("OFFSET" in query["sql"] for query in second_queries)
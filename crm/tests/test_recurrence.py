@@ -0,0 +1,124 @@
+from datetime import timedelta
+
+import pytest
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from crm.models import Meeting, MeetingUser
+
+
+def create_meeting(user, start, **kwargs):
+    return Meeting.objects.create(
+        creator=user,
+        name="meeting",
+        description="description",
+        start_datetime=start,
+        end_datetime=start + timedelta(hours=1),
+        **kwargs,
+    )
+
+
+@pytest.fixture
+def start():
+    # фиксированный час: часовое повторение не переходит через полночь
+    return (timezone.now() + timedelta(days=1)).replace(
+        hour=10, minute=0, second=0, microsecond=0
+    )
+
+
+@pytest.mark.django_db
+def test_weekly_occurrences_are_expanded_for_window_only(user, start):
+    meeting = create_meeting(
+        user,
+        start,
+        recurrence=Meeting.Recurrence.WEEKLY,
+        recurrence_exceptions=[
+            timezone.localdate(start + timedelta(weeks=2)).isoformat()
+        ],
+    )
+    window_start = start + timedelta(weeks=1)
+
+    occurrences = list(
+        meeting.occurrences(window_start, window_start + timedelta(weeks=3))
+    )
+
+    assert [occurrence_start for occurrence_start, _ in occurrences] == [
+        start + timedelta(weeks=1),
+        start + timedelta(weeks=3),
+    ]
+    assert meeting.series_end is None
+
+
+@pytest.mark.django_db
+def test_count_limits_series(user, start):
+    meeting = create_meeting(
+        user, start, recurrence=Meeting.Recurrence.DAILY, recurrence_count=3
+    )
+
+    assert len(list(meeting.occurrences())) == 3
+    assert meeting.series_end == start + timedelta(days=2, hours=1)
+
+
+@pytest.mark.django_db
+def test_conflict_with_future_occurrence_of_series(user, start):
+    series = create_meeting(user, start, recurrence=Meeting.Recurrence.WEEKLY)
+    MeetingUser.objects.create(user=user, meeting=series)
+    clash = create_meeting(user, start + timedelta(weeks=5, minutes=30))
+    free = create_meeting(user, start + timedelta(weeks=5, hours=2))
+
+    with pytest.raises(ValidationError):
+        MeetingUser.objects.create(user=user, meeting=clash)
+    MeetingUser.objects.create(user=user, meeting=free)
+
+
+@pytest.mark.django_db
+def test_calendar_shows_occurrences_of_series(client, user, start):
+    series = create_meeting(user, start, recurrence=Meeting.Recurrence.DAILY)
+    MeetingUser.objects.create(user=user, meeting=series)
+    client.force_login(user)
+    day = timezone.localdate(start + timedelta(days=40))
+
+    response = client.get(
+        f"/calendar/?mode=day&year={day.year}&month={day.month}&day={day.day}"
+    )
+
+    assert [entry.object_id for entry in response.context["meetings"]] == [series.pk]
+    assert timezone.localdate(response.context["meetings"][0].start) == day
+
+
+@pytest.mark.django_db
+def test_meeting_list_and_feed_include_series(client, user, start):
+    series = create_meeting(
+        user, start, recurrence=Meeting.Recurrence.WEEKLY, recurrence_count=10
+    )
+    MeetingUser.objects.create(user=user, meeting=series)
+    client.force_login(user)
+
+    response = client.get("/meetings/")
+    feed = b"".join(client.get(f"/calendar/{user.pk}/feed.ics").streaming_content)
+
+    assert len(response.context["occurrences"]) == 5
+    assert b"RRULE:FREQ=WEEKLY;COUNT=10" in feed
+
+
+@pytest.mark.django_db
+def test_meeting_list_rejects_invalid_window(client, user, start):
+    series = create_meeting(user, start, recurrence=Meeting.Recurrence.DAILY)
+    MeetingUser.objects.create(user=user, meeting=series)
+    client.force_login(user)
+
+    for params in (
+        {"date_to": "2999-01-01"},
+        {"date_from": "2030-02-01", "date_to": "2030-01-01"},
+        {"date_from": "2030-01-01", "date_to": "2030-01-01"},
+        {"date_from": "not a date"},
+    ):
+        response = client.get("/meetings/", params)
+        assert response.status_code == 400
+        assert response.context["occurrences"] == []
+        assert response.context["form"].errors
+
+    response = client.get(
+        "/meetings/", {"date_from": "2030-01-01", "date_to": "2030-04-03"}
+    )
+    assert response.status_code == 200
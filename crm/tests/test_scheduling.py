@@ -0,0 +1,156 @@
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from crm.models import CalendarEntry, Meeting, MeetingUser, TeamUser
+from crm.scheduling import free_slots, invite_users, merge_intervals
+
+BASE = datetime(2030, 1, 7, 9, 0, tzinfo=UTC)
+
+
+def at(hours):
+    return BASE + timedelta(hours=hours)
+
+
+def test_merge_intervals_joins_overlapping_and_adjacent():
+    merged = merge_intervals(
+        [(at(2), at(3)), (at(0), at(1)), (at(1), at(1.5)), (at(2.5), at(4))]
+    )
+    assert merged == [(at(0), at(1.5)), (at(2), at(4))]
+
+
+def test_free_slots_skip_busy_intervals():
+    busy = [(at(0), at(1)), (at(1.5), at(3))]
+    slots = free_slots(busy, timedelta(hours=1), at(0), at(8), limit=3)
+    assert slots == [(at(3), at(4)), (at(3.5), at(4.5)), (at(4), at(5))]
+
+
+def test_free_slots_respect_window_end():
+    slots = free_slots(
+        [], timedelta(hours=2), at(0), at(3), limit=10, step=timedelta(hours=1)
+    )
+    assert slots == [(at(0), at(2)), (at(1), at(3))]
+
+
+@pytest.mark.django_db
+def test_free_slots_endpoint_merges_busy_time_of_all_users(client, user, meeting):
+    other = User.objects.create_user(username="other", password="password")
+    MeetingUser.objects.create(user=user, meeting=meeting)
+    MeetingUser.objects.create(user=other, meeting=meeting)
+    client.force_login(user)
+    start = meeting.start_datetime
+
+    response = client.get(
+        "/meetings/slots/",
+        {
+            "users": str(other.pk),
+            "meeting": meeting.pk,
+            "duration": 60,
+            "start": start.isoformat(),
+            "end": (start + timedelta(hours=3)).isoformat(),
+            "limit": 1,
+        },
+    )
+
+    assert response.status_code == 200
+    slot_start = datetime.fromisoformat(response.json()["slots"][0]["start"])
+    assert slot_start >= meeting.end_datetime
+
+
+@pytest.mark.django_db
+def test_free_slots_only_for_teammates_and_meeting_participants(
+    client, user, team, meeting
+):
+    teammate, stranger = (
+        User.objects.create_user(username=name, password="password")
+        for name in ("teammate", "stranger")
+    )
+    TeamUser.objects.create(team=team, user=user)
+    TeamUser.objects.create(team=team, user=teammate)
+    MeetingUser.objects.create(user=stranger, meeting=meeting)
+    client.force_login(user)
+
+    response = client.get("/meetings/slots/", {"users": str(teammate.pk)})
+    assert response.status_code == 200
+    for params in (
+        {"users": str(stranger.pk)},
+        {"users": f"{teammate.pk},{stranger.pk}"},
+        # в саму встречу user не входит, ее участники ему не видны
+        {"users": str(stranger.pk), "meeting": meeting.pk},
+    ):
+        response = client.get("/meetings/slots/", params)
+        assert response.status_code == 400
+        assert "users" in response.json()["errors"]
+
+    MeetingUser.objects.create(user=user, meeting=meeting)
+    response = client.get(
+        "/meetings/slots/", {"users": str(stranger.pk), "meeting": meeting.pk}
+    )
+    assert response.status_code == 200
+
+
+@pytest.mark.django_db
+def test_meeting_create_form_errors_keep_slots(client, user):
+    client.force_login(user)
+    response = client.post(
+        "/meetings/create/",
+        {
+            "name": "",
+            "start_datetime": "2030-01-07T09:00",
+            "end_datetime": "2030-01-07T10:00",
+        },
+    )
+    assert response.status_code == 200
+    assert response.context["slots"]
+    assert "slots_form" in response.context
+
+
+@pytest.mark.django_db
+def test_bulk_invite_team_reports_conflicts(
+    client, user, team, meeting, django_assert_max_num_queries
+):
+    free = User.objects.create_user(username="free", password="password")
+    busy = User.objects.create_user(username="busy", password="password")
+    for member in (user, free, busy):
+        TeamUser.objects.create(team=team, user=member)
+    MeetingUser.objects.create(user=user, meeting=meeting)
+    other = Meeting.objects.create(
+        creator=busy,
+        name="other",
+        description="other",
+        start_datetime=meeting.start_datetime + timedelta(minutes=30),
+        end_datetime=meeting.end_datetime + timedelta(minutes=30),
+    )
+    MeetingUser.objects.create(user=busy, meeting=other)
+    client.force_login(user)
+
+    with django_assert_max_num_queries(20):
+        response = client.post(
+            f"/meetings/{meeting.pk}/add-users/", {"team_pk": team.pk}
+        )
+
+    assert response.status_code == 302
+    assert set(
+        MeetingUser.objects.filter(meeting=meeting).values_list("user_id", flat=True)
+    ) == {user.pk, free.pk}
+    assert CalendarEntry.objects.filter(user=free, object_id=meeting.pk).exists()
+    report = [str(message) for message in response.wsgi_request._messages]
+    assert any("busy" in message and "other" in message for message in report)
+
+
+@pytest.mark.django_db
+def test_invite_checks_conflicts_under_lock(user, meeting):
+    with CaptureQueriesContext(connection) as queries:
+        report = invite_users(meeting, [user.pk])
+    assert report["added"] == [user.pk]
+    sql = [query["sql"] for query in queries.captured_queries]
+    begin = next(
+        n for n, query in enumerate(sql) if query.startswith(("BEGIN", "SAVEPOINT"))
+    )
+    # проверка пересечений идет в транзакции со вставкой, а не до нее
+    check = next(n for n, query in enumerate(sql) if "UNION" in query)
+    insert = next(n for n, query in enumerate(sql) if query.startswith("INSERT"))
+    assert begin < check < insert
@@ -0,0 +1,90 @@
+from io import StringIO
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+
+from crm.models import Comment, Task, Team, TeamUser
+from crm.search import match_expression, search
+
+pytestmark = pytest.mark.skipif(
+    connection.vendor != "sqlite", reason="Индекс FTS5 есть только на SQLite"
+)
+
+
+def test_match_expression_quotes_user_input():
+    assert match_expression('bug" OR ab*', [1, 2]) == (
+        'scope : (team1 OR team2) AND {title body} : ("bug" "OR" "ab"*)'
+    )
+    assert match_expression("bug x") == '{title body} : ("bug" "x")'
+
+
+@pytest.mark.django_db
+def test_search_does_not_match_scope_tokens(user, team, task):
+    TeamUser.objects.create(team=team, user=user, role=TeamUser.Role.MANAGER)
+    assert search(f"team{team.pk}", team_ids=[team.pk]) == []
+    assert search("team", team_ids=[team.pk]) == []
+
+
+@pytest.mark.django_db
+def test_search_ranks_scopes_and_highlights(user, team, task):
+    other_team = Team.objects.create(name="other", creator=user)
+    Task.objects.create(
+        author=user, team=other_team, name="Платежи", description="платежный шлюз"
+    )
+    Comment.objects.create(user=user, task=task, text="Шлюз <b>упал</b> ночью")
+    task.name = "Платежный шлюз"
+    task.save()
+
+    results = search("шлюз", [team.pk])
+
+    assert [(result["kind"], result["task"]) for result in results] == [
+        ("task", task),
+        ("comment", task),
+    ]
+    assert (
+        str(results[1]["snippet"]) == "<mark>Шлюз</mark> &lt;b&gt;упал&lt;/b&gt; ночью"
+    )
+
+    Comment.objects.all().delete()
+    assert [result["kind"] for result in search("упал", [team.pk])] == []
+
+
+@pytest.mark.django_db
+def test_search_view_and_rebuild(client, user, team, task):
+    TeamUser.objects.create(team=team, user=user, role=TeamUser.Role.MANAGER)
+    stranger = User.objects.create_user(username="stranger", password="password")
+    Comment.objects.create(user=user, task=task, text="дедлайн перенесли")
+    with connection.cursor() as cursor:
+        cursor.execute("DELETE FROM crm_search")
+    call_command("rebuild_search_index", stdout=StringIO())
+
+    client.force_login(user)
+    response = client.get("/search/", {"q": "перенес"})
+    assert [result["task"] for result in response.context["results"]] == [task]
+
+    client.force_login(stranger)
+    response = client.get("/search/", {"q": "перенес"})
+    assert response.context["results"] == []
+
+
+@pytest.mark.django_db
+def test_plain_member_finds_only_own_tasks(client, user, team, task, monkeypatch):
+    member = User.objects.create_user(username="member", password="password")
+    TeamUser.objects.create(team=team, user=member)
+    own = Task.objects.create(
+        author=user, team=team, performer=member, name="Отчет", description="квартал"
+    )
+    Comment.objects.create(user=user, task=task, text="квартальный план")
+    Comment.objects.create(user=user, task=own, text="квартальный итог")
+
+    client.force_login(member)
+    response = client.get("/search/", {"q": "квартал"})
+    assert {result["task"] for result in response.context["results"]} == {own}
+    assert len(response.context["results"]) == 2
+
+    # тот же фильтр на базах без FTS5
+    monkeypatch.setattr("crm.search.fts_available", lambda: False)
+    response = client.get("/search/", {"q": "квартал"})
+    assert {result["task"] for result in response.context["results"]} == {own}
@@ -0,0 +1,119 @@
+from io import StringIO
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from crm import bulk, stats
+from crm.models import Task, Team, TeamTaskStats, TeamUser
+
+
+def counts(team):
+    row = stats.for_team(team.pk)
+    return row.open, row.processing, row.done
+
+
+@pytest.mark.django_db
+def test_counters_follow_task_changes(user, team):
+    other = Team.objects.create(name="other", creator=user)
+    task = Task.objects.create(author=user, team=team, name="a", description="d")
+    Task.objects.create(author=user, team=team, name="b", description="d")
+    assert counts(team) == (2, 0, 0)
+
+    task.status = Task.Status.done
+    task.save()
+    task.save()
+    assert counts(team) == (1, 0, 1)
+
+    task = Task.objects.get(pk=task.pk)
+    task.team = other
+    task.status = Task.Status.processing
+    task.save()
+    assert counts(team) == (1, 0, 0)
+    assert counts(other) == (0, 1, 0)
+
+    task.delete()
+    assert counts(other) == (0, 0, 0)
+    assert stats.reconcile() == {}
+
+
+@pytest.mark.django_db
+def test_counters_follow_tasks_loaded_without_team_or_status(user, team):
+    other = Team.objects.create(name="other", creator=user)
+    pk = Task.objects.create(author=user, team=team, name="a", description="d").pk
+
+    task = Task.objects.only("pk", "name").get(pk=pk)
+    task.status = Task.Status.done
+    task.save()
+    assert counts(team) == (0, 0, 1)
+
+    task = Task.objects.defer("team", "status").get(pk=pk)
+    task.team = other
+    task.save(update_fields=["team"])
+    assert counts(team) == (0, 0, 0)
+    assert counts(other) == (0, 0, 1)
+
+    Task.objects.only("pk").get(pk=pk).delete()
+    assert counts(other) == (0, 0, 0)
+    assert stats.reconcile() == {}
+
+
+@pytest.mark.django_db
+def test_bulk_actions_update_counters(user, team):
+    TeamUser.objects.create(team=team, user=user, role=TeamUser.Role.ADMIN)
+    ids = [
+        Task.objects.create(author=user, team=team, name=f"t{n}", description="d").pk
+        for n in range(5)
+    ]
+    bulk.task_action(
+        user, TeamUser.Role.ADMIN, team.pk, ids[:3], bulk.STATUS, status="done"
+    )
+    assert counts(team) == (2, 0, 3)
+    bulk.task_action(
+        user, TeamUser.Role.ADMIN, team.pk, ids, bulk.REASSIGN, performer=user
+    )
+    assert counts(team) == (0, 5, 0)
+    bulk.task_action(user, TeamUser.Role.ADMIN, team.pk, ids[:4], bulk.DELETE)
+    assert counts(team) == (0, 1, 0)
+    assert stats.reconcile() == {}
+
+
+@pytest.mark.django_db
+def test_bulk_action_reads_tasks_in_writing_transaction(user, team):
+    ids = [
+        Task.objects.create(author=user, team=team, name=f"t{n}", description="d").pk
+        for n in range(2)
+    ]
+    with CaptureQueriesContext(connection) as queries:
+        bulk.task_action(
+            user, TeamUser.Role.ADMIN, team.pk, ids, bulk.STATUS, status="done"
+        )
+    sql = [query["sql"] for query in queries.captured_queries]
+    read = next(n for n, query in enumerate(sql) if query.startswith("SELECT"))
+    # старые значения читаются уже в транзакции записи
+    assert any(query.startswith(("BEGIN", "SAVEPOINT")) for query in sql[:read])
+    update = next(q for q in sql if q.startswith('UPDATE "crm_task"'))
+    assert '"team_id" =' in update
+    assert counts(team) == (0, 0, 2)
+
+
+@pytest.mark.django_db
+def test_reconcile_reports_and_fixes_drift(user, team):
+    Task.objects.create(author=user, team=team, name="a", description="d")
+    TeamTaskStats.objects.filter(team=team).update(open=7, done=2)
+    empty = Team.objects.create(name="empty", creator=User.objects.create_user("x"))
+    TeamTaskStats.objects.filter(team=empty).delete()
+
+    out = StringIO()
+    call_command("reconcile_team_stats", "--dry-run", stdout=out)
+    assert f"Команда {team.pk}: open: 7 -> 1, done: 2 -> 0" in out.getvalue()
+    assert counts(team) == (7, 0, 2)
+
+    call_command("reconcile_team_stats", stdout=StringIO())
+    assert counts(team) == (1, 0, 0)
+    assert TeamTaskStats.objects.filter(team=empty).exists()
+    out = StringIO()
+    call_command("reconcile_team_stats", stdout=out)
+    assert "Расхождений нет" in out.getvalue()
@@ -0,0 +1,130 @@
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from crm.models import SweepState, Task, TaskReminder
+from crm.sweeper import late, pending, sweep_overdue
+
+
+def make_tasks(user, team, deadlines, **kwargs):
+    return Task.objects.bulk_create(
+        [
+            Task(
+                author=user,
+                performer=user,
+                team=team,
+                name=f"task {number}",
+                description="d",
+                deadline=deadline,
+                **kwargs,
+            )
+            for number, deadline in enumerate(deadlines)
+        ]
+    )
+
+
+@pytest.mark.django_db
+def test_sweep_marks_each_overdue_task_once(user, team):
+    now = timezone.now()
+    same = now - timedelta(hours=1)
+    overdue = make_tasks(user, team, [same] * 3 + [now - timedelta(days=2)] * 2)
+    make_tasks(user, team, [now - timedelta(hours=3)], status=Task.Status.done)
+    make_tasks(user, team, [now + timedelta(hours=1), None])
+
+    assert sweep_overdue(now, batch_size=2) == 5
+    assert sweep_overdue(now, batch_size=2) == 0
+    assert set(Task.objects.exclude(overdue_at=None).values_list("pk", flat=True)) == {
+        task.pk for task in overdue
+    }
+    assert TaskReminder.objects.filter(user=user, sent_at=None).count() == 5
+    state = SweepState.objects.get(name="overdue")
+    assert (state.position, state.position_id) == (same, overdue[2].pk)
+
+    later = now + timedelta(hours=2)
+    assert sweep_overdue(later) == 1
+    assert TaskReminder.objects.count() == 6
+
+
+@pytest.mark.django_db
+def test_sweep_batch_cost_does_not_depend_on_size(user, team):
+    make_tasks(user, team, [timezone.now() - timedelta(minutes=10)])
+    sweep_overdue()
+    make_tasks(user, team, [timezone.now() - timedelta(minutes=5)] * 2)
+    with CaptureQueriesContext(connection) as small:
+        sweep_overdue(batch_size=1000)
+    make_tasks(user, team, [timezone.now() - timedelta(minutes=1)] * 100)
+    with CaptureQueriesContext(connection) as large:
+        sweep_overdue(batch_size=1000)
+    assert len(large) == len(small)
+
+
+@pytest.mark.django_db
+def test_sweep_command(user, team):
+    make_tasks(user, team, [timezone.now() - timedelta(minutes=1)])
+    out = StringIO()
+    call_command("sweep_overdue", stdout=out)
+    assert "Отмечено просроченных задач: 1" in out.getvalue()
+
+
+@pytest.mark.django_db
+def test_overdue_sweep_uses_index():
+    if connection.vendor != "sqlite":
+        pytest.skip("План запроса проверяется только для SQLite")
+    plan = Task.objects.overdue().order_by("deadline", "id").explain()
+    assert "task_status_deadline" in plan
+
+
+@pytest.mark.django_db
+def test_sweep_batch_reads_index_from_mark(user, team):
+    if connection.vendor != "sqlite":
+        pytest.skip("План запроса проверяется только для SQLite")
+    now = timezone.now()
+    plan = pending(Task.Status.open, now, now - timedelta(days=1), 10)[:100].explain()
+    # чтение начинается с отметки и идет в порядке индекса, без сортировки
+    assert "task_status_deadline (status=? AND deadline>? AND deadline<?)" in plan
+    assert "TEMP B-TREE" not in plan
+
+    # строки до отметки повторно не читаются
+    make_tasks(user, team, [now - timedelta(days=2)] * 50)
+    sweep_overdue(now)
+    make_tasks(user, team, [now - timedelta(minutes=1)] * 3)
+    state = SweepState.objects.get(name="overdue")
+    assert len(pending(Task.Status.open, now, state.position, state.position_id)) == 3
+
+
+@pytest.mark.django_db
+def test_sweep_picks_up_deadlines_set_behind_mark(user, team):
+    now = timezone.now()
+    make_tasks(user, team, [now - timedelta(hours=1)])
+    assert sweep_overdue(now) == 1
+
+    # импорт задачи с прошедшим сроком и перенос срока в прошлое после прохода
+    imported = make_tasks(user, team, [now - timedelta(days=3)] * 3)
+    edited = make_tasks(user, team, [now + timedelta(days=1)])[0]
+    edited.deadline = now - timedelta(days=1)
+    edited.save()
+
+    later = now + timedelta(minutes=1)
+    assert sweep_overdue(later, batch_size=2) == 4
+    assert sweep_overdue(later) == 0
+    marked = {*(task.pk for task in imported), edited.pk}
+    assert (
+        set(Task.objects.filter(overdue_at=later).values_list("pk", flat=True))
+        == marked
+    )
+    assert TaskReminder.objects.filter(task_id__in=marked).count() == 4
+
+
+@pytest.mark.django_db
+def test_late_probe_reads_only_unmarked_rows():
+    if connection.vendor != "sqlite":
+        pytest.skip("План запроса проверяется только для SQLite")
+    now = timezone.now()
+    plan = late(Task.Status.open, now, 10)[:100].explain()
+    assert "task_unmarked_deadline" in plan
+    assert "TEMP B-TREE" not in plan
@@ -0,0 +1,177 @@
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.utils import timezone
+
+from crm.cache import hit_stats
+from crm.ics import feed_token
+from crm.models import CalendarEntry, Meeting, MeetingUser, Task
+
+
+@pytest.mark.django_db
+def test_calendar_month_grid(client, user, team, meeting):
+    MeetingUser.objects.create(user=user, meeting=meeting)
+    deadline = timezone.now() + timedelta(days=1)
+    Task.objects.create(
+        author=user,
+        performer=user,
+        team=team,
+        name="calendar task",
+        description="description",
+        deadline=deadline,
+    )
+    client.force_login(user)
+    day = timezone.localdate(meeting.start_datetime)
+
+    response = client.get(f"/calendar/?year={day.year}&month={day.month}")
+
+    assert response.status_code == 200
+    cells = [cell for week in response.context["weeks"] for cell in week if cell]
+    cell = next(cell for cell in cells if cell["date"] == day)
+    assert [entry.object_id for entry in cell["meetings"]] == [meeting.pk]
+    assert cell["meetings"][0].participants_count == 1
+    assert [entry.title for entry in cell["tasks"]] == ["calendar task"]
+
+
+@pytest.mark.django_db
+def test_calendar_month_queries_do_not_grow(
+    client, user, meeting, django_assert_max_num_queries
+):
+    MeetingUser.objects.create(user=user, meeting=meeting)
+    for number in range(5):
+        start = meeting.start_datetime + timedelta(hours=2 * (number + 1))
+        other = Meeting.objects.create(
+            creator=user,
+            name=f"meeting {number}",
+            description="description",
+            start_datetime=start,
+            end_datetime=start + timedelta(hours=1),
+        )
+        MeetingUser.objects.create(user=user, meeting=other)
+        guest = User.objects.create_user(username=f"guest{number}", password="password")
+        MeetingUser.objects.create(user=guest, meeting=other)
+    client.force_login(user)
+    day = timezone.localdate(meeting.start_datetime)
+
+    with django_assert_max_num_queries(6):
+        response = client.get(f"/calendar/{day.year}/{day.month}/")
+
+    assert response.status_code == 200
+
+
+@pytest.mark.django_db
+def test_calendar_feed_streams_and_supports_conditional_get(client, user, meeting):
+    MeetingUser.objects.create(user=user, meeting=meeting)
+    url = f"/calendar/{user.pk}/feed.ics?token={feed_token(user.pk)}"
+
+    response = client.get(url)
+
+    assert response.status_code == 200
+    assert response.streaming
+    body = b"".join(response.streaming_content).decode()
+    assert body.startswith("BEGIN:VCALENDAR\r\n")
+    assert f"UID:meeting-{meeting.pk}@crm" in body
+    assert body.endswith("END:VCALENDAR\r\n")
+
+    cached = client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+    assert cached.status_code == 304
+
+
+@pytest.mark.django_db
+def test_calendar_feed_requires_owner_or_token(client, user):
+    response = client.get(f"/calendar/{user.pk}/feed.ics?token=wrong")
+    assert response.status_code == 403
+
+
+@pytest.mark.django_db
+def test_calendar_feed_token_can_be_reset(client, user):
+    token = feed_token(user.pk)
+    assert feed_token(user.pk) == token
+    url = f"/calendar/{user.pk}/feed.ics"
+    assert client.get(url, {"token": token}).status_code == 200
+
+    client.force_login(user)
+    response = client.get("/calendar/feed/")
+    assert response.context["feed_url"].endswith(f"{url}?token={token}")
+    response = client.post("/calendar/feed/")
+    assert response.status_code == 302
+    client.logout()
+
+    assert client.get(url, {"token": token}).status_code == 403
+    assert feed_token(user.pk) != token
+    assert client.get(url, {"token": feed_token(user.pk)}).status_code == 200
+
+
+@pytest.mark.django_db
+def test_calendar_month_is_cached_until_user_events_change(
+    client,
+    user,
+    team,
+    meeting,
+    django_assert_num_queries,
+    django_capture_on_commit_callbacks,
+):
+    MeetingUser.objects.create(user=user, meeting=meeting)
+    client.force_login(user)
+    day = timezone.localdate(meeting.start_datetime)
+    url = f"/calendar/{day.year}/{day.month}/"
+
+    client.get(url)
+    with django_assert_num_queries(3):
+        # сессия, пользователь и задачи без дедлайна - события берутся из кэша
+        response = client.get(url)
+    assert [entry.title for entry in _entries(response, "tasks")] == []
+
+    # версия кэша меняется только после коммита
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        Task.objects.create(
+            author=user,
+            performer=user,
+            team=team,
+            name="new task",
+            description="description",
+            deadline=meeting.start_datetime,
+        )
+        assert _entries(client.get(url), "tasks") == []
+    assert callbacks
+    response = client.get(url)
+    assert [entry.title for entry in _entries(response, "tasks")] == ["new task"]
+    assert hit_stats(["calendar"])["calendar"] == {
+        "hits": 2,
+        "misses": 2,
+        "hit_rate": 0.5,
+    }
+
+
+def _entries(response, kind):
+    return [
+        entry
+        for week in response.context["weeks"]
+        for cell in week
+        if cell
+        for entry in cell[kind]
+    ]
+
+
+@pytest.mark.django_db
+def test_rebuild_resets_cached_calendars(
+    client, user, meeting, django_capture_on_commit_callbacks
+):
+    MeetingUser.objects.create(user=user, meeting=meeting)
+    CalendarEntry.objects.filter(user=user).update(title="stale")
+    client.force_login(user)
+    day = timezone.localdate(meeting.start_datetime)
+    url = f"/calendar/{day.year}/{day.month}/"
+    assert [entry.title for entry in _entries(client.get(url), "meetings")] == [
+        "stale"
+    ]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        call_command("rebuild_calendar_entries", stdout=StringIO())
+
+    assert [entry.title for entry in _entries(client.get(url), "meetings")] == [
+        meeting.name
+    ]
@@ -1,6 +1,16 @@
+import csv
+import io
+import json
+from datetime import timedelta
+
 import pytest
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
-from crm.models import Task
+from crm import exports
+from crm.models import CalendarEntry, Comment, Evaluation, Task, TaskEvent, TeamUser
 
 
 @pytest.mark.django_db
@@ -17,3 +27,232 @@ def test_create_task(superuser, client, team):
     assert response.status_code == 302
     assert Task.objects.count() == 1
 
+
+@pytest.mark.django_db
+def test_task_list_shows_only_visible_tasks(client, user, team, superuser):
+    TeamUser.objects.create(team=team, user=user, role=TeamUser.Role.USER)
+    for number in range(15):
+        Task.objects.create(
+            author=superuser,
+            performer=user if number % 5 == 0 else superuser,
+            team=team,
+            name=f"task {number}",
+            description="description",
+        )
+    client.force_login(user)
+
+    response = client.get(f"/teams/{team.pk}/tasks/")
+
+    page = response.context["page_obj"]
+    assert [task.performer for task in page] == [user] * 3
+    assert response.context["total"] == 3
+    assert not page.has_next
+    manager = User.objects.create_user(username="manager", password="password")
+    TeamUser.objects.create(team=team, user=manager, role=TeamUser.Role.MANAGER)
+    assert Task.objects.visible_to(manager, team).count() == 15
+
+
+@pytest.mark.django_db
+def test_task_list_json_filters_and_sorts(client, user, team):
+    TeamUser.objects.create(team=team, user=user, role=TeamUser.Role.MANAGER)
+    now = timezone.now()
+    overdue = [
+        Task.objects.create(
+            author=user,
+            team=team,
+            name=f"overdue {number}",
+            description="description",
+            deadline=now - timedelta(days=number + 1),
+        )
+        for number in range(3)
+    ]
+    Task.objects.create(
+        author=user,
+        team=team,
+        name="done",
+        description="description",
+        status=Task.Status.done,
+        deadline=now - timedelta(days=1),
+    )
+    Task.objects.create(
+        author=user,
+        team=team,
+        name="future",
+        description="description",
+        deadline=now + timedelta(days=1),
+    )
+    client.force_login(user)
+
+    response = client.get(
+        f"/teams/{team.pk}/tasks/json/", {"overdue": "on", "sort": "deadline"}
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert [task["id"] for task in data["results"]] == [
+        task.pk for task in reversed(overdue)
+    ]
+    assert data["total"] == 3
+    assert client.get(f"/teams/{team.pk}/tasks/json/", {"sort": "x"}).status_code == 400
+
+
+@pytest.mark.django_db
+def test_task_filters_use_indexes(team):
+    if connection.vendor != "sqlite":
+        pytest.skip("План запроса проверяется только для SQLite")
+    plan = Task.objects.filter(team=team, status=Task.Status.open).order_by("deadline")
+    assert "task_team_status_deadline" in plan.explain()
+    plan = Task.objects.filter(team=team).overdue()
+    assert "task_team_status_deadline" in plan.explain()
+
+
+@pytest.mark.django_db
+def test_task_bulk_actions_report_failures(
+    client, user, team, superuser, django_assert_max_num_queries
+):
+    TeamUser.objects.create(team=team, user=user, role=TeamUser.Role.MANAGER)
+    performer = User.objects.create_user(username="performer", password="password")
+    TeamUser.objects.create(team=team, user=performer)
+    now = timezone.now()
+    tasks = [
+        Task.objects.create(
+            author=user if number % 2 else superuser,
+            team=team,
+            name=f"task {number}",
+            description="description",
+            deadline=now + timedelta(days=1),
+        )
+        for number in range(6)
+    ]
+    ids = [task.pk for task in tasks]
+    client.force_login(user)
+
+    with django_assert_max_num_queries(15):
+        response = client.post(
+            f"/teams/{team.pk}/tasks/bulk/",
+            {
+                "task_pks": ids + [ids[-1] + 100],
+                "action": "reassign",
+                "performer": performer.pk,
+            },
+            HTTP_ACCEPT="application/json",
+        )
+    assert response.json() == {
+        "done": ids,
+        "failed": {str(ids[-1] + 100): "Задача не найдена в команде"},
+    }
+    assert set(Task.objects.values_list("performer", "status")) == {
+        (performer.pk, Task.Status.processing)
+    }
+    assert CalendarEntry.objects.filter(user=performer).count() == 6
+    assert (
+        TaskEvent.objects.filter(changes__performer_id=[None, performer.pk]).count()
+        == 6
+    )
+
+    response = client.post(
+        f"/teams/{team.pk}/tasks/bulk/",
+        {"task_pks": ",".join(map(str, ids)), "action": "delete"},
+        HTTP_ACCEPT="application/json",
+    )
+    assert len(response.json()["failed"]) == 3
+    assert Task.objects.count() == 3
+    assert CalendarEntry.objects.filter(user=performer).count() == 3
+
+    response = client.post(
+        f"/teams/{team.pk}/tasks/bulk/",
+        {"task_pks": ids, "action": "status"},
+        HTTP_ACCEPT="application/json",
+    )
+    assert response.status_code == 400
+
+
+@pytest.mark.django_db
+def test_task_export_streams_csv_and_ndjson(client, user, team, superuser):
+    TeamUser.objects.create(team=team, user=user)
+    mine = Task.objects.create(
+        author=superuser, performer=user, team=team, name="mine", description="d"
+    )
+    Task.objects.create(author=superuser, team=team, name="other", description="d")
+    Comment.objects.bulk_create(
+        [Comment(user=user, task=mine, text=f"c{number}") for number in range(3)]
+    )
+    Evaluation.objects.create(task=mine, evaluation=Evaluation.EvaluationChoices.B)
+    client.force_login(user)
+
+    response = client.get(f"/teams/{team.pk}/tasks/export.ndjson")
+    assert response.streaming
+    rows = [
+        json.loads(line) for line in b"".join(response.streaming_content).splitlines()
+    ]
+    assert [
+        (row["name"], row["performer"], row["evaluation"], row["comments"])
+        for row in rows
+    ] == [("mine", "username", 4, 3)]
+
+    client.force_login(superuser)
+    response = client.get(f"/teams/{team.pk}/tasks/export.csv?sort=created_at")
+    reader = csv.DictReader(io.StringIO(b"".join(response.streaming_content).decode()))
+    assert [(row["name"], row["comments"]) for row in reader] == [
+        ("mine", "3"),
+        ("other", "0"),
+    ]
+    assert client.get(f"/teams/{team.pk}/tasks/export.xml").status_code == 404
+
+
+@pytest.mark.django_db
+def test_task_export_query_count_does_not_grow(team, user):
+    Task.objects.bulk_create(
+        [
+            Task(author=user, performer=user, team=team, name=f"t{n}", description="d")
+            for n in range(20)
+        ]
+    )
+    with CaptureQueriesContext(connection) as queries:
+        rows = list(exports.iter_rows(Task.objects.filter(team=team), chunk_size=5))
+    assert len(rows) == 20
+    assert len(queries) == 1
+
+
+@pytest.mark.django_db
+def test_task_comments_are_paginated_and_polled(client, user, task):
+    now = timezone.now()
+    comments = Comment.objects.bulk_create(
+        [
+            Comment(
+                user=user,
+                task=task,
+                text=f"comment {number}",
+                created_at=now + timedelta(minutes=number),
+            )
+            for number in range(45)
+        ]
+    )
+    client.force_login(user)
+
+    response = client.get(f"/tasks/{task.pk}")
+    shown = [comment.text for comment in response.context["comments"]]
+    assert shown == [f"comment {number}" for number in range(25, 45)]
+
+    texts = []
+    cursor = response.context["older_comments_cursor"]
+    while cursor:
+        data = client.get(f"/tasks/{task.pk}/comments/", {"cursor": cursor}).json()
+        texts += [comment["text"] for comment in data["results"]]
+        cursor = data["next_cursor"]
+    assert texts == [f"comment {number}" for number in range(24, -1, -1)]
+
+    new = Comment.objects.create(user=user, task=task, text="new")
+    data = client.get(f"/tasks/{task.pk}/comments/", {"after": comments[-1].pk}).json()
+    assert [comment["id"] for comment in data["results"]] == [new.pk]
+    assert data["has_more"] is False
+    data = client.get(f"/tasks/{task.pk}/comments/", {"after": new.pk}).json()
+    assert data["results"] == []
+
+
+@pytest.mark.django_db
+def test_comment_thread_uses_index(task):
+    if connection.vendor != "sqlite":
+        pytest.skip("План запроса проверяется только для SQLite")
+    plan = Comment.objects.filter(task=task).order_by("-created_at", "-id")[:20]
+    assert "comment_task_created" in plan.explain()
@@ -1,7 +1,7 @@
 import pytest
 from pytest_django.asserts import assertContains
 
-from crm.models import Team, TeamUser
+from crm.models import Task, Team, TeamUser
 
 
 @pytest.fixture
@@ -30,3 +30,46 @@ def test_team_task_add_user(superuser, client, team, user):
     response = client.post(f"/teams/{team.pk}/user/add", {"user_pk": user.pk})
     assert response.status_code == 302
     assert TeamUser.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_team_list_is_one_query_per_page(client, user, django_assert_num_queries):
+    from crm.views.team import TEAMS_PER_PAGE
+
+    for number in range(TEAMS_PER_PAGE + 5):
+        team = Team.objects.create(name=f"team {number}", creator=user)
+    TeamUser.objects.create(team=team, user=user)
+    client.force_login(user)
+    client.get("/teams/")
+    # сессия, пользователь и сами команды
+    with django_assert_num_queries(3):
+        response = client.get("/teams/")
+    page = response.context["page_obj"]
+    assert len(page) == TEAMS_PER_PAGE
+    assert page.has_next
+
+    response = client.get("/teams/", {"cursor": page.next_cursor})
+    last = response.context["page_obj"].object_list[-1]
+    assert last == team
+    assert last.members_count == 1
+    assert last.open_tasks == 0
+
+
+@pytest.mark.django_db
+def test_team_list_counts_unfinished_tasks(client, user, team):
+    for status in (Task.Status.open, Task.Status.processing, Task.Status.done):
+        Task.objects.create(
+            author=user, team=team, name=status, description="d", status=status
+        )
+    client.force_login(user)
+    response = client.get("/teams/")
+    assert response.context["page_obj"].object_list[0].open_tasks == 2
+
+
+@pytest.mark.django_db
+def test_team_list_mine(client, user, team):
+    Team.objects.create(name="other team", creator=user)
+    TeamUser.objects.create(team=team, user=user)
+    client.force_login(user)
+    response = client.get("/teams/", {"mine": "1"})
+    assert [found.pk for found in response.context["page_obj"]] == [team.pk]
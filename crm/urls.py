@@ -1,22 +1,30 @@
 from django.urls import path
 
-from crm.views.calendar import CalendarView
+from crm.views.calendar import CalendarView, CalendarFeedView, CalendarFeedLinkView
 from crm.views.home import Home
+from crm.views.monitoring import CacheStatsView
+from crm.views.search import SearchView
 from crm.views.meeting import (
     MeetingListView,
     MeetingCreateView,
     MeetingRetrieveView,
     MeetingAddUserView,
+    MeetingBulkAddUsersView,
     MeetingCancelView,
+    MeetingFreeSlotsView,
 )
 from crm.views.tasks import (
     TaskListView,
+    TaskListJsonView,
+    TaskBulkView,
+    TaskExportView,
     TaskCreateView,
     TaskRetrieveView,
     TaskUpdateView,
     TaskDeleteView,
     TaskEvaluationView,
     CommentCreateView,
+    TaskCommentsView,
     TaskDoneView,
 )
 from crm.views.team import (
@@ -26,6 +34,8 @@ from crm.views.team import (
     TeamDeleteUser,
     TeamUpdateUserRole,
     TeamListView,
+    TeamActivityView,
+    TeamMembershipsView,
 )
 from crm.views.user import (
     UserRegisterView,
@@ -34,6 +44,7 @@ from crm.views.user import (
     UserProfileView,
     UserUpdateView,
     UserDeleteView,
+    UserAutocompleteView,
 )
 
 
@@ -46,8 +57,18 @@ urlpatterns = [
     path("user/<int:user_pk>/profile/", UserProfileView.as_view(), name="user_profile"),
     path("user/<int:user_pk>/update/", UserUpdateView.as_view(), name="user_update"),
     path("user/<int:user_pk>/delete/", UserDeleteView.as_view(), name="user_delete"),
+    path(
+        "users/autocomplete/",
+        UserAutocompleteView.as_view(),
+        name="user_autocomplete",
+    ),
     # Ссылки для работы с командами
     path("teams/create", TeamCreateView.as_view(), name="team_create"),
+    path(
+        "teams/memberships/",
+        TeamMembershipsView.as_view(),
+        name="team_memberships",
+    ),
     path("teams/<int:team_pk>/user/add", TeamAddUser.as_view(), name="team_add_user"),
     path("teams/<int:team_pk>", TeamRetrieveView.as_view(), name="team_retrieve"),
     path(
@@ -60,7 +81,27 @@ urlpatterns = [
         TeamUpdateUserRole.as_view(),
         name="team_update_user",
     ),
+    path(
+        "teams/<int:team_pk>/activity/",
+        TeamActivityView.as_view(),
+        name="team_activity",
+    ),
     path("teams/<int:team_pk>/tasks/", TaskListView.as_view(), name="task_list"),
+    path(
+        "teams/<int:team_pk>/tasks/json/",
+        TaskListJsonView.as_view(),
+        name="task_list_json",
+    ),
+    path(
+        "teams/<int:team_pk>/tasks/bulk/",
+        TaskBulkView.as_view(),
+        name="task_bulk",
+    ),
+    path(
+        "teams/<int:team_pk>/tasks/export.<str:fmt>",
+        TaskExportView.as_view(),
+        name="task_export",
+    ),
     path("teams/", TeamListView.as_view(), name="team_list"),
     # Ссылки для работы с задачами
     path("tasks/create/<int:team_pk>/", TaskCreateView.as_view(), name="task_create"),
@@ -77,10 +118,16 @@ urlpatterns = [
         CommentCreateView.as_view(),
         name="comment_create",
     ),
+    path(
+        "tasks/<int:task_pk>/comments/",
+        TaskCommentsView.as_view(),
+        name="task_comments",
+    ),
     path("tasks/<int:task_pk>/task_done", TaskDoneView.as_view(), name="task_done"),
     # Ссылки для работы со встречами
     path("meetings/", MeetingListView.as_view(), name="meeting_list"),
     path("meetings/create/", MeetingCreateView.as_view(), name="meeting_create"),
+    path("meetings/slots/", MeetingFreeSlotsView.as_view(), name="meeting_slots"),
     path(
         "meetings/<int:meeting_pk>/",
         MeetingRetrieveView.as_view(),
@@ -91,6 +138,11 @@ urlpatterns = [
         MeetingAddUserView.as_view(),
         name="meeting_add_user",
     ),
+    path(
+        "meetings/<int:meeting_pk>/add-users/",
+        MeetingBulkAddUsersView.as_view(),
+        name="meeting_add_users",
+    ),
     path(
         "meetings/<int:meeting_pk>/cancel/",
         MeetingCancelView.as_view(),
@@ -106,5 +158,19 @@ urlpatterns = [
         "calendar/<int:year>/<int:month>/<int:day>/",
         CalendarView.as_view(),
         name="calendar_day",
+    ),  # 3
+    path(
+        "calendar/<int:user_pk>/feed.ics",
+        CalendarFeedView.as_view(),
+        name="calendar_feed",
+    ),
+    path(
+        "calendar/feed/",
+        CalendarFeedLinkView.as_view(),
+        name="calendar_feed_link",
     ),
-]  # 3
+    # Поиск
+    path("search/", SearchView.as_view(), name="search"),
+    # Мониторинг
+    path("monitoring/cache/", CacheStatsView.as_view(), name="cache_stats"),
+]
@@ -1,10 +1,25 @@
+from datetime import date
+
+from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.shortcuts import render
+from django.contrib.auth.models import User
+from django.core.exceptions import PermissionDenied
+from django.http import StreamingHttpResponse
+from django.shortcuts import render, get_object_or_404, redirect
+from django.urls import reverse
 from django.utils import timezone
-from datetime import datetime
-from calendar import monthrange
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from django.views import View
-from crm.models import Meeting, Task
+
+from crm.calendar_engine import get_day, get_month, user_tasks
+from crm.ics import (
+    check_feed_token,
+    feed_token,
+    feed_version,
+    iter_calendar,
+    reset_feed_token,
+)
 
 
 class CalendarView(LoginRequiredMixin, View):
@@ -14,112 +29,108 @@ class CalendarView(LoginRequiredMixin, View):
     Отдельно считает календарь для дня или для месяца
     mode - вид календаря
     Отдельным столбцом выводим задачи у которых нет дедлайна
+    Сетку месяца с событиями по дням собирает crm.calendar_engine,
+    шаблон только проходит по готовой структуре
     """
 
-    def get(self, request):
-        today = timezone.now()
+    def get(self, request, year=None, month=None, day=None):
+        today = timezone.localdate()
 
         try:
-            year = int(request.GET.get("year", today.year))
-            month = int(request.GET.get("month", today.month))
-            day = int(request.GET.get("day", today.day))
+            year = int(year or request.GET.get("year", today.year))
+            month = int(month or request.GET.get("month", today.month))
+            day = int(day or request.GET.get("day", today.day))
+            date(year, month, 1)
         except (ValueError, TypeError):
             year = today.year
             month = today.month
             day = today.day
 
-        mode = request.GET.get("mode", "month")
+        mode = "day" if "day" in self.kwargs else request.GET.get("mode", "month")
 
-        tasks_without_deadline = Task.objects.filter(
-            performer=request.user, deadline__isnull=True
-        )
+        tasks_without_deadline = user_tasks(request.user).filter(deadline__isnull=True)
 
         if mode == "day":
-            date = datetime(year, month, day)
-            tasks = Task.objects.filter(performer=request.user, deadline__date=date)
-            meetings = Meeting.objects.filter(
-                participants__user=request.user, start_datetime__date=date
-            )
-            return render(
-                request,
-                "crm/calendar_day.html",
-                {
-                    "date": date,
-                    "tasks": tasks,
-                    "meetings": meetings,
-                    "tasks_without_deadline": tasks_without_deadline,
-                },
-            )
-        else:
-            first_day = datetime(year, month, 1)
-            last_day = datetime(year, month, monthrange(year, month)[1])
+            try:
+                current = date(year, month, day)
+            except ValueError:
+                current = today
+            context = dict(get_day(request.user, current))
+            context["tasks_without_deadline"] = tasks_without_deadline
+            return render(request, "crm/calendar_day.html", context)
 
-            tasks = Task.objects.filter(
-                performer=request.user, deadline__date__range=[first_day, last_day]
-            )
-            meetings = Meeting.objects.filter(
-                participants__user=request.user,
-                start_datetime__date__range=[first_day, last_day],
-            )
+        context = dict(get_month(request.user, year, month))
+        context["today"] = today
+        context["tasks_without_deadline"] = tasks_without_deadline
+        return render(request, "crm/calendar_month.html", context)
+
+
+class CalendarFeedView(View):
+    """
+    Лента календаря пользователя в формате iCalendar для подписки из внешних клиентов
 
-            month_names = {
-                1: "Январь",
-                2: "Февраль",
-                3: "Март",
-                4: "Апрель",
-                5: "Май",
-                6: "Июнь",
-                7: "Июль",
-                8: "Август",
-                9: "Сентябрь",
-                10: "Октябрь",
-                11: "Ноябрь",
-                12: "Декабрь",
-            }
-
-            if month == 1:
-                prev_month = 12
-                prev_year = year - 1
-            else:
-                prev_month = month - 1
-                prev_year = year
-
-            if month == 12:
-                next_month = 1
-                next_year = year + 1
-            else:
-                next_month = month + 1
-                next_year = year
-
-            month_days = []
-            week = [None] * first_day.weekday()
-
-            for d in range(1, last_day.day + 1):
-                week.append(d)
-                if len(week) == 7:
-                    month_days.append(week)
-                    week = []
-
-            if week:
-                month_days.append(week + [None] * (7 - len(week)))
-
-            return render(
-                request,
-                "crm/calendar_month.html",
-                {
-                    "year": year,
-                    "month": month,
-                    "month_name": month_names[month],
-                    "prev_year": prev_year,
-                    "prev_month": prev_month,
-                    "prev_month_name": month_names[prev_month],
-                    "next_year": next_year,
-                    "next_month": next_month,
-                    "next_month_name": month_names[next_month],
-                    "today": today,
-                    "month_days": month_days,
-                    "tasks": tasks,
-                    "tasks_without_deadline": tasks_without_deadline,
-                    "meetings": meetings,
-                },
+    Доступна владельцу по сессии или по подписанному токену из ссылки подписки
+    (ссылку выдает и отзывает CalendarFeedLinkView).
+    ETag и Last-Modified считаются агрегатами до чтения событий,
+    поэтому повторные опросы без изменений получают 304 без сериализации.
+    """
+
+    def get(self, request, user_pk):
+        """
+        Проверяем доступ, отвечаем 304 если лента не менялась,
+        иначе отдаем события потоком
+        :param request:
+        :param user_pk:
+        :return:
+        """
+        if request.user.pk != user_pk and not check_feed_token(
+            user_pk, request.GET.get("token")
+        ):
+            raise PermissionDenied("Нет доступа к календарю пользователя")
+
+        user = get_object_or_404(User, pk=user_pk)
+        etag, last_modified = feed_version(user.pk)
+        last_modified = last_modified.timestamp() if last_modified else None
+
+        response = get_conditional_response(
+            request, etag=quote_etag(etag), last_modified=last_modified
+        )
+        if response is None:
+            response = StreamingHttpResponse(
+                iter_calendar(user), content_type="text/calendar; charset=utf-8"
             )
+            response["Content-Disposition"] = 'inline; filename="calendar.ics"'
+        response["ETag"] = quote_etag(etag)
+        if last_modified:
+            response["Last-Modified"] = http_date(last_modified)
+        return response
+
+
+class CalendarFeedLinkView(LoginRequiredMixin, View):
+    """
+    View ссылки на подписку календаря
+
+    Ссылка вынесена со страницы месяца, чтобы та не читала секрет подписки
+    """
+
+    def get(self, request):
+        """
+        Показываем ссылку на ленту текущего пользователя
+        :param request:
+        :return:
+        """
+        feed_url = request.build_absolute_uri(
+            reverse("calendar_feed", kwargs={"user_pk": request.user.pk})
+            + f"?token={feed_token(request.user.pk)}"
+        )
+        return render(request, "crm/calendar_feed.html", {"feed_url": feed_url})
+
+    def post(self, request):
+        """
+        Отзываем ссылку: меняем секрет пользователя, старые ссылки перестают работать
+        :param request:
+        :return:
+        """
+        reset_feed_token(request.user.pk)
+        messages.success(request, "Ссылка на подписку обновлена")
+        return redirect("calendar_feed_link")
@@ -2,12 +2,41 @@ from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.models import User
 from django.db import transaction, IntegrityError
+from django.db.models import Count
+from django.http import JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
+from django.utils import timezone
 from django.views import View
 
-from crm.forms import MeetingCreateForm
-from crm.models import MeetingUser, Meeting
+from crm.autocomplete import search_users, user_page
+from crm.calendar_engine import day_start
+from crm.forms import MeetingCreateForm, FreeSlotsForm, MeetingWindowForm
+from crm.models import MeetingUser, Meeting, Team, TeamUser
 from crm.permissions import MeetingCreatorMixin
+from crm.scheduling import find_free_slots, invite_users
+
+
+def slots_for_request(request):
+    """
+    Свободные слоты для текущего пользователя и пользователей из GET-параметра users
+
+    Указывать можно только пользователей своей команды и участников своей встречи
+    (GET-параметр meeting), см. FreeSlotsForm
+    :param request:
+    :return: (форма параметров, список слотов)
+    """
+    form = FreeSlotsForm(request.GET, user=request.user)
+    if not form.is_valid():
+        return form, []
+    user_ids = form.cleaned_data["users"] | {request.user.pk}
+    slots = find_free_slots(
+        user_ids,
+        form.cleaned_data["duration"],
+        form.cleaned_data["start"],
+        form.cleaned_data["end"],
+        limit=form.cleaned_data["limit"],
+    )
+    return form, slots
 
 
 class MeetingCreateView(LoginRequiredMixin, View):
@@ -21,8 +50,18 @@ class MeetingCreateView(LoginRequiredMixin, View):
         :param request:
         :return:
         """
-        form = MeetingCreateForm()
-        return render(request, "crm/meeting_create.html", {"form": form})
+        form = MeetingCreateForm(
+            initial={
+                "start_datetime": request.GET.get("start_datetime"),
+                "end_datetime": request.GET.get("end_datetime"),
+            }
+        )
+        slots_form, slots = slots_for_request(request)
+        return render(
+            request,
+            "crm/meeting_create.html",
+            {"form": form, "slots": slots, "slots_form": slots_form},
+        )
 
     def post(self, request):
         """
@@ -43,7 +82,40 @@ class MeetingCreateView(LoginRequiredMixin, View):
                 return redirect("meeting_retrieve", meeting_pk=meeting.pk)
             except IntegrityError as e:
                 messages.error(request, f'Ошибка при сохранении: {e}')
-        return render(request, "crm/meeting_create.html", {"form": form})
+        slots_form, slots = slots_for_request(request)
+        return render(
+            request,
+            "crm/meeting_create.html",
+            {"form": form, "slots": slots, "slots_form": slots_form},
+        )
+
+
+class MeetingFreeSlotsView(LoginRequiredMixin, View):
+    """
+    View для поиска ближайших свободных слотов у группы пользователей
+    """
+
+    def get(self, request):
+        """
+        Возвращаем слоты в JSON
+        Занятость всех пользователей читается одним запросом
+        :param request:
+        :return:
+        """
+        form, slots = slots_for_request(request)
+        if form.errors:
+            return JsonResponse({"errors": form.errors}, status=400)
+        return JsonResponse(
+            {
+                "slots": [
+                    {
+                        "start": timezone.localtime(start).isoformat(),
+                        "end": timezone.localtime(end).isoformat(),
+                    }
+                    for start, end in slots
+                ]
+            }
+        )
 
 
 class MeetingAddUserView(LoginRequiredMixin, MeetingCreatorMixin, View):
@@ -72,6 +144,68 @@ class MeetingAddUserView(LoginRequiredMixin, MeetingCreatorMixin, View):
         return redirect("meeting_retrieve", meeting_pk=self.meeting.pk)
 
 
+class MeetingBulkAddUsersView(LoginRequiredMixin, MeetingCreatorMixin, View):
+    """
+    View для массового добавления пользователей к встрече, в том числе всей команды
+    """
+
+    def post(self, request, meeting_pk):
+        """
+        Обрабатываем приглашение списка пользователей (user_pks) и/или всей команды (team_pk)
+        Пересечения проверяются одним запросом для всех кандидатов,
+        пользователи без конфликтов добавляются одной вставкой
+        По каждому пользователю, которого не удалось добавить, возвращаем причину
+        :param request:
+        :param meeting_pk:
+        :return:
+        """
+        user_ids = {int(pk) for pk in request.POST.getlist("user_pks") if pk.isdigit()}
+        team_pk = request.POST.get("team_pk")
+        if team_pk:
+            team = get_object_or_404(Team, pk=team_pk, members__user=request.user)
+            user_ids.update(
+                TeamUser.objects.filter(team=team).values_list("user_id", flat=True)
+            )
+        if not user_ids:
+            messages.warning(request, "Не выбраны пользователи")
+            return redirect("meeting_retrieve", meeting_pk=self.meeting.pk)
+
+        try:
+            report = invite_users(self.meeting, user_ids)
+        except IntegrityError as e:
+            messages.error(request, f"Ошибка: {e}")
+            return redirect("meeting_retrieve", meeting_pk=self.meeting.pk)
+
+        names = dict(
+            User.objects.filter(
+                pk__in=[*report["added"], *report["already"], *report["conflicts"]]
+            ).values_list("pk", "username")
+        )
+        if report["added"]:
+            messages.success(
+                request,
+                "Добавлены: " + ", ".join(names[pk] for pk in report["added"]),
+            )
+        if report["already"]:
+            messages.warning(
+                request,
+                "Уже во встрече: " + ", ".join(names[pk] for pk in report["already"]),
+            )
+        for pk, other in report["conflicts"].items():
+            messages.warning(
+                request,
+                f"{names[pk]}: пересечение со встречей «{other.name}» "
+                f"{timezone.localtime(other.start_datetime):%d.%m.%Y %H:%M}",
+            )
+        if report["unknown"]:
+            messages.warning(
+                request,
+                "Пользователи не найдены: "
+                + ", ".join(str(pk) for pk in report["unknown"]),
+            )
+        return redirect("meeting_retrieve", meeting_pk=self.meeting.pk)
+
+
 class MeetingRetrieveView(LoginRequiredMixin, View):
     """
     View одной встречи
@@ -80,7 +214,8 @@ class MeetingRetrieveView(LoginRequiredMixin, View):
     def get(self, request, meeting_pk):
         """
         Получаем одну встречу и передаем обьект в шаблон
-        Также подгружаем связанные сущности
+        Также подгружаем связанные сущности и страницу пользователей для приглашения
+        (не участников встречи, с поиском по user_q и курсором users_cursor)
         :param request:
         :param meeting_pk:
         :return:
@@ -89,14 +224,22 @@ class MeetingRetrieveView(LoginRequiredMixin, View):
             Meeting.objects.prefetch_related("participants__user"), pk=meeting_pk
         )
 
-        existing_user_ids = meeting.participants.values_list("user_id", flat=True)
-
-        available_users = User.objects.exclude(id__in=existing_user_ids)
+        user_q = request.GET.get("user_q", "")[:150]
+        available_users = user_page(
+            search_users(user_q, not_in_meeting=meeting.pk),
+            request.GET.get("users_cursor"),
+        )
+        teams = Team.objects.filter(members__user=request.user)
 
         return render(
             request,
             "crm/meeting_retrieve.html",
-            {"meeting": meeting, "available_users": available_users},
+            {
+                "meeting": meeting,
+                "available_users": available_users,
+                "user_q": user_q,
+                "teams": teams,
+            },
         )
 
 
@@ -127,10 +270,50 @@ class MeetingListView(LoginRequiredMixin, View):
     """
 
     def get(self, request):
-        """Просто возвращаем список всех встреч"""
-        meetings = Meeting.objects.filter(participants__user=request.user)
+        """
+        Возвращаем встречи пользователя за окно [date_from, date_to), по умолчанию ближайшие 30 дней
+        Серии разворачиваются в повторения только внутри окна, поэтому окно ограничено
+        (см. MeetingWindowForm); некорректное окно - 400 с ошибками формы
+        :param request:
+        :return:
+        """
+        form = MeetingWindowForm(request.GET)
+        if not form.is_valid():
+            return render(
+                request,
+                "crm/meeting_list.html",
+                context={"occurrences": [], "form": form},
+                status=400,
+            )
+        date_from = form.cleaned_data["date_from"]
+        date_to = form.cleaned_data["date_to"]
+        window_start, window_end = day_start(date_from), day_start(date_to)
+
+        meetings = (
+            Meeting.objects.filter(
+                pk__in=MeetingUser.objects.filter(user=request.user).values(
+                    "meeting_id"
+                )
+            )
+            .overlapping(window_start, window_end)
+            .select_related("creator")
+            .annotate(participants_count=Count("participants"))
+        )
+        occurrences = sorted(
+            (
+                {"meeting": meeting, "start": start, "end": end}
+                for meeting in meetings
+                for start, end in meeting.occurrences(window_start, window_end)
+            ),
+            key=lambda occurrence: occurrence["start"],
+        )
         return render(
             request,
             "crm/meeting_list.html",
-            context={"meetings": meetings},
+            context={
+                "occurrences": occurrences,
+                "form": form,
+                "date_from": date_from,
+                "date_to": date_to,
+            },
         )
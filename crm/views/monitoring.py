@@ -0,0 +1,16 @@
+from django.http import JsonResponse
+from django.views import View
+
+from crm.cache import hit_stats
+from crm.permissions import StaffRequiredMixin
+
+MONITORED_CACHES = ["calendar", "role"]
+
+
+class CacheStatsView(StaffRequiredMixin, View):
+    """
+    Счетчики попаданий и промахов кэшей приложения для мониторинга
+    """
+
+    def get(self, request):
+        return JsonResponse(hit_stats(MONITORED_CACHES))
@@ -0,0 +1,23 @@
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.shortcuts import render
+from django.views import View
+
+from crm.search import search, visible_scope
+
+
+class SearchView(LoginRequiredMixin, View):
+    """
+    View поиска по задачам и комментариям команд пользователя
+    """
+
+    def get(self, request):
+        """
+        Ищем по строке из GET-параметра q
+        Поиск ограничен теми задачами команд пользователя, которые он видит в списке задач:
+        обычный участник - только своими (суперпользователь ищет везде)
+        :param request:
+        :return:
+        """
+        query = request.GET.get("q", "")
+        results = search(query, **visible_scope(request.user)) if query.strip() else []
+        return render(request, "crm/search.html", {"query": query, "results": results})
@@ -1,12 +1,16 @@
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.core.paginator import Paginator
 from django.db import transaction, IntegrityError
+from django.http import JsonResponse, StreamingHttpResponse, Http404
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views import View
 
-from crm.forms import TaskCreateForm, TaskUpdateForm, EvaluationForm, CommentCreateForm
-from crm.models import Task, Evaluation, Team, TeamUser
+from crm import activity, bulk, exports, stats
+from crm.forms import TaskCreateForm, TaskUpdateForm, EvaluationForm, CommentCreateForm, TaskFilterForm, \
+    TaskBulkForm
+from crm.context import crm_context
+from crm.models import Task, Evaluation, Team, Comment, TaskEvent
+from crm.pagination import KeysetPaginator, capped_count
 from crm.permissions import ManagerRequiredMixin, AdminRequiredMixin, TaskOwnerMixin, TaskPerformerMixin, \
     MemberRequiredMixin, TaskTeamInjectorMixin
 
@@ -43,12 +47,37 @@ class TaskCreateView(LoginRequiredMixin, ManagerRequiredMixin, View):
                     task.author = request.user
                     task.team = team
                     task.save()
+                    activity.record([activity.event(task, request.user, TaskEvent.Kind.CREATED)])
                 return redirect("task_retrieve", task_pk=task.pk)
             except IntegrityError as e:
                 messages.error(request, f"Ошибка в форме: {e}")
         return render(request, "crm/task_create.html", {"form": form})
 
 
+TASKS_PER_PAGE = 10
+TASKS_COUNT_CAP = 1000
+
+
+def task_page(request, team_pk):
+    """
+    Страница задач команды с фильтрами и сортировкой из GET-параметров
+
+    Права на просмотр проверяются в запросе (Task.objects.visible_to), фильтры
+    и сортировка применяются в базе, страница выбирается по курсору без OFFSET
+    :param request:
+    :param team_pk:
+    :return: (форма фильтров, страница или None при ошибках формы, количество, количество ограничено)
+    """
+    form = TaskFilterForm(request.GET, team_pk=team_pk)
+    if not form.is_valid():
+        return form, None, 0, False
+    tasks = form.filter(Task.objects.visible_to(request.user, team_pk))
+    paginator = KeysetPaginator(tasks, form.ordering(), TASKS_PER_PAGE)
+    page = paginator.get_page(request.GET.get("cursor"))
+    total, total_capped = capped_count(tasks, TASKS_COUNT_CAP)
+    return form, page, total, total_capped
+
+
 class TaskListView(LoginRequiredMixin, View):
     """
     View для получения списка задач
@@ -58,56 +87,269 @@ class TaskListView(LoginRequiredMixin, View):
     def get(self, request, team_pk):
         """
         Получаем список задач для конкретной команды
-        Также реализована пагинация по 10 элементов на странице
+        Фильтры (статус, исполнитель, автор, дедлайн, просроченные) и сортировка
+        передаются GET-параметрами, см. TaskFilterForm
+        Пагинация по курсору по 10 элементов на странице:
+        страница выбирается по индексу без OFFSET,
+        поэтому глубокие страницы стоят столько же, сколько первая
         :param request:
         :param team_pk:
         :return:
         """
-        tasks = (
-            Task.objects.filter(team__pk=team_pk)
-            .prefetch_related("evaluation")
-            .order_by("-created_at")
-        )
+        form, page_obj, total, total_capped = task_page(request, team_pk)
 
-        team_user = TeamUser.objects.filter(team_id=team_pk, user=request.user).first()
-        user_role = team_user.role if team_user else None
+        user_role = crm_context(request).role(team_pk)
 
-        paginator = Paginator(tasks, 10)
-        page_number = request.GET.get("page")
-        page_obj = paginator.get_page(page_number)
+        filters = request.GET.copy()
+        filters.pop("cursor", None)
 
         return render(
             request,
             "crm/task_list.html",
             {
+                "form": form,
                 "page_obj": page_obj,
+                "filters": filters.urlencode(),
                 "team_pk": team_pk,
                 "user_role": user_role,
+                "total": total,
+                "total_capped": total_capped,
+                "bulk_form": TaskBulkForm(team_pk=team_pk),
+                "task_stats": stats.for_team(team_pk),
             },
         )
 
 
+class TaskListJsonView(LoginRequiredMixin, View):
+    """
+    View списка задач команды в JSON с теми же фильтрами, что и HTML-список
+    """
+
+    def get(self, request, team_pk):
+        """
+        Возвращаем страницу задач и курсоры соседних страниц
+        При ошибках в параметрах - 400 с описанием ошибок
+        :param request:
+        :param team_pk:
+        :return:
+        """
+        form, page, total, total_capped = task_page(request, team_pk)
+        if page is None:
+            return JsonResponse({"errors": form.errors}, status=400)
+        return JsonResponse(
+            {
+                "results": [
+                    {
+                        "id": task.pk,
+                        "name": task.name,
+                        "status": task.status,
+                        "performer": (
+                            {"id": task.performer.pk, "username": task.performer.username}
+                            if task.performer
+                            else None
+                        ),
+                        "author_id": task.author_id,
+                        "deadline": task.deadline.isoformat() if task.deadline else None,
+                        "created_at": task.created_at.isoformat(),
+                    }
+                    for task in page
+                ],
+                "next_cursor": page.next_cursor,
+                "previous_cursor": page.previous_cursor,
+                "total": total,
+                "total_capped": total_capped,
+            }
+        )
+
+
+class TaskExportView(LoginRequiredMixin, View):
+    """
+    View потоковой выгрузки задач команды в CSV или NDJSON
+    """
+
+    def get(self, request, team_pk, fmt):
+        """
+        Отдаем все видимые пользователю задачи команды с автором, исполнителем,
+        оценкой и количеством комментариев
+        Фильтры и сортировка - те же GET-параметры, что и у списка задач
+        Ответ потоковый: задачи читаются из базы пачками и сразу отправляются клиенту,
+        поэтому первые байты уходят сразу, а память не растет с размером выгрузки
+        :param request:
+        :param team_pk:
+        :param fmt: csv или ndjson
+        :return:
+        """
+        if fmt not in exports.CONTENT_TYPES:
+            raise Http404("Неизвестный формат выгрузки")
+        form = TaskFilterForm(request.GET, team_pk=team_pk)
+        if not form.is_valid():
+            return JsonResponse({"errors": form.errors}, status=400)
+        tasks = form.filter(Task.objects.visible_to(request.user, team_pk)).order_by(
+            *form.ordering()
+        )
+        response = StreamingHttpResponse(
+            exports.stream(tasks, fmt), content_type=exports.CONTENT_TYPES[fmt]
+        )
+        response["Content-Disposition"] = f'attachment; filename="team-{team_pk}-tasks.{fmt}"'
+        # nginx не должен копить ответ целиком перед отправкой
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+
+class TaskBulkView(LoginRequiredMixin, ManagerRequiredMixin, View):
+    """
+    View для массовых действий над задачами команды: переназначение, смена статуса, удаление
+    """
+
+    def post(self, request, team_pk):
+        """
+        Применяем действие к списку задач одним запросом на изменение
+        По каждой задаче, к которой действие не применилось, возвращаем причину
+        Клиентам, которые просят application/json, отвечаем JSON, иначе - сообщениями и редиректом
+        :param request:
+        :param team_pk:
+        :return:
+        """
+        wants_json = (
+            request.get_preferred_type(["text/html", "application/json"])
+            == "application/json"
+        )
+        form = TaskBulkForm(request.POST, team_pk=team_pk)
+        if not form.is_valid():
+            if wants_json:
+                return JsonResponse({"errors": form.errors}, status=400)
+            messages.error(request, f"Ошибка: {form.errors.as_text()}")
+            return redirect("task_list", team_pk=team_pk)
+
+        try:
+            report = bulk.task_action(
+                request.user,
+                getattr(self, "user_role", None),
+                team_pk,
+                form.cleaned_data["task_pks"],
+                form.cleaned_data["action"],
+                status=form.cleaned_data["status"],
+                performer=form.cleaned_data["performer"],
+            )
+        except IntegrityError as e:
+            if wants_json:
+                return JsonResponse({"errors": {"__all__": [str(e)]}}, status=409)
+            messages.error(request, f"Ошибка: {e}")
+            return redirect("task_list", team_pk=team_pk)
+
+        if wants_json:
+            return JsonResponse(report)
+        if report["done"]:
+            messages.success(request, f"Обработано задач: {len(report['done'])}")
+        for pk, reason in sorted(report["failed"].items()):
+            messages.warning(request, f"Задача {pk}: {reason}")
+        return redirect("task_list", team_pk=team_pk)
+
+
+COMMENTS_PER_PAGE = 20
+COMMENTS_POLL_LIMIT = 100
+
+
+def comment_page(task_pk, cursor=None):
+    """
+    Страница комментариев задачи от новых к старым
+
+    Выбирается по индексу (task, created_at, id) без OFFSET,
+    next_cursor страницы ведет к более ранним комментариям
+    :param task_pk:
+    :param cursor: курсор из предыдущей страницы, None - самые новые
+    :return: CursorPage
+    """
+    comments = Comment.objects.filter(task_id=task_pk).select_related("user")
+    paginator = KeysetPaginator(comments, ["-created_at", "-id"], COMMENTS_PER_PAGE)
+    return paginator.get_page(cursor)
+
+
+def comment_json(comment):
+    return {
+        "id": comment.pk,
+        "user": {"id": comment.user_id, "username": comment.user.username},
+        "text": comment.text,
+        "created_at": comment.created_at.isoformat(),
+    }
+
+
 class TaskRetrieveView(LoginRequiredMixin, View):
     """
     View для получения задачи
     """
 
     def get(self, request, task_pk):
-        task = get_object_or_404(
-            Task.objects.select_related("author", "team").prefetch_related(
-                "comments", "comments__user"
-            ),
-            pk=task_pk,
-        )
+        """
+        Получаем задачу и последние COMMENTS_PER_PAGE комментариев
+        Более ранние комментарии открываются по курсору (GET-параметр comments)
+        или подгружаются через TaskCommentsView
+        :param request:
+        :param task_pk:
+        :return:
+        """
+        task = crm_context(request).task(task_pk)
 
         evaluation = getattr(task, "evaluation", None)
-
-        context = {"task": task, "evaluation": evaluation}
+        comments = comment_page(task_pk, request.GET.get("comments"))
+
+        context = {
+            "task": task,
+            "evaluation": evaluation,
+            # на странице комментарии идут от старых к новым
+            "comments": comments.object_list[::-1],
+            "older_comments_cursor": comments.next_cursor,
+            "newer_comments_cursor": comments.previous_cursor,
+        }
         if request.user.is_superuser:
             context["evaluation_form"] = EvaluationForm(instance=evaluation)
         return render(request, "crm/task_retrieve.html", context)
 
 
+class TaskCommentsView(LoginRequiredMixin, View):
+    """
+    View комментариев задачи в JSON для подгрузки и обновления открытой страницы
+    """
+
+    def get(self, request, task_pk):
+        """
+        Без параметров или с cursor - страница более ранних комментариев (от новых к старым)
+        и курсор следующей страницы
+        С after=<id> - комментарии, добавленные после комментария id (от старых к новым),
+        не больше COMMENTS_POLL_LIMIT; по пустому ответу страница понимает, что новых нет
+        :param request:
+        :param task_pk:
+        :return:
+        """
+        get_object_or_404(Task.objects.only("pk"), pk=task_pk)
+        after = request.GET.get("after")
+        if after is not None:
+            try:
+                after = int(after)
+            except ValueError:
+                return JsonResponse({"errors": {"after": ["Ожидается id комментария"]}}, status=400)
+            # id растут с каждым комментарием, поэтому "новее id" - это pk > after
+            comments = list(
+                Comment.objects.filter(task_id=task_pk, pk__gt=after)
+                .select_related("user")
+                .order_by("pk")[: COMMENTS_POLL_LIMIT + 1]
+            )
+            return JsonResponse(
+                {
+                    "results": [comment_json(comment) for comment in comments[:COMMENTS_POLL_LIMIT]],
+                    "has_more": len(comments) > COMMENTS_POLL_LIMIT,
+                }
+            )
+
+        page = comment_page(task_pk, request.GET.get("cursor"))
+        return JsonResponse(
+            {
+                "results": [comment_json(comment) for comment in page],
+                "next_cursor": page.next_cursor,
+            }
+        )
+
+
 class TaskUpdateView(LoginRequiredMixin, TaskOwnerMixin, View):
     """
     View для изменения задачи
@@ -128,10 +370,13 @@ class TaskUpdateView(LoginRequiredMixin, TaskOwnerMixin, View):
         Обрабатываем форму обновленной задачи,
         Если прошло валидацию - сохраняем
         Если назначен исполнитель - меняем статус задачи на processing
+        Изменившиеся поля записываются в журнал задачи
         :param request:
         :param task_pk:
         :return:
         """
+        # снимок до формы: валидация ModelForm меняет сам обьект
+        before = activity.snapshot(self.task)
         form = TaskUpdateForm(request.POST, instance=self.task)
         if form.is_valid():
             try:
@@ -139,7 +384,12 @@ class TaskUpdateView(LoginRequiredMixin, TaskOwnerMixin, View):
                     task = form.save(commit=False)
                     if task.performer:
                         task.status = Task.Status.processing
+                    if "deadline" in form.changed_data:
+                        # новый срок проверит sweep_overdue, когда он истечет
+                        task.overdue_at = None
                     task.save()
+                    changes = activity.diff(before, activity.snapshot(task))
+                    activity.record([activity.event(task, request.user, TaskEvent.Kind.UPDATED, changes)])
                     return redirect("task_retrieve", task_pk=task.pk)
             except IntegrityError as e:
                 messages.error(request, f"Ошибка в форме: {e}")
@@ -156,8 +406,11 @@ class TaskDoneView(LoginRequiredMixin, TaskPerformerMixin, View):
             messages.warning(request, "Задача уже выполнена")
             return redirect("task_retrieve", task_pk=self.task.pk)
         try:
-            self.task.status = Task.Status.done
-            self.task.save()
+            with transaction.atomic():
+                changes = {"status": [self.task.status, Task.Status.done]}
+                self.task.status = Task.Status.done
+                self.task.save()
+                activity.record([activity.event(self.task, request.user, TaskEvent.Kind.DONE, changes)])
             messages.success(request, "Задача отмечена как выполненная")
         except IntegrityError as e:
             messages.error(request, f"Ошибка: {e}")
@@ -171,7 +424,10 @@ class TaskDeleteView(LoginRequiredMixin, TaskOwnerMixin, View):
 
     def post(self, request, task_pk):
         try:
-            self.task.delete()
+            with transaction.atomic():
+                changes = {"name": [self.task.name, None]}
+                activity.record([activity.event(self.task, request.user, TaskEvent.Kind.DELETED, changes)])
+                self.task.delete()
         except IntegrityError as e:
             messages.error(request, f"Ошибка: {e}")
         return redirect("team_retrieve", team_pk=self.task.team.pk)
@@ -182,11 +438,39 @@ class TaskEvaluationView(LoginRequiredMixin, TaskTeamInjectorMixin, AdminRequire
     View для оценки задачи
     """
 
-    def post(self, request, task_pk):
-        task = get_object_or_404(Task, pk=task_pk)
-        evaluation, created = Evaluation.objects.update_or_create(
-            task=task, defaults={"evaluation": request.POST.get("evaluation")}
-        )
+    def post(self, request, task_pk, **kwargs):
+        """
+        Валидируем оценку формой и сохраняем ее
+        Прежняя оценка читается под блокировкой строки в той же транзакции,
+        поэтому параллельные оценки пишут в историю согласованные [было, стало]
+        Повторная отправка той же оценки в историю не попадает
+        :param request:
+        :param task_pk:
+        :return:
+        """
+        task = self.task
+        form = EvaluationForm(request.POST)
+        if not form.is_valid():
+            messages.error(request, f"Ошибка: {form.errors.as_text()}")
+            return redirect("task_retrieve", task_pk=task.pk)
+        score = form.cleaned_data["evaluation"]
+        try:
+            with transaction.atomic():
+                previous = (
+                    Evaluation.objects.select_for_update()
+                    .filter(task=task)
+                    .values_list("evaluation", flat=True)
+                    .first()
+                )
+                evaluation, _ = Evaluation.objects.update_or_create(
+                    task=task, defaults={"evaluation": score}
+                )
+                if score != previous:
+                    changes = {"evaluation": [previous, score]}
+                    activity.record([activity.event(task, request.user, TaskEvent.Kind.EVALUATED, changes)])
+        except IntegrityError as e:
+            messages.error(request, f"Ошибка: {e}")
+            return redirect("task_retrieve", task_pk=task.pk)
         messages.success(
             request,
             f"Оценка {evaluation.get_evaluation_display()} сохранена для задачи",
@@ -199,7 +483,7 @@ class CommentCreateView(LoginRequiredMixin, TaskTeamInjectorMixin, MemberRequire
     View для комментирования задачи
     """
 
-    def post(self, request, task_pk):
+    def post(self, request, task_pk, **kwargs):
         form = CommentCreateForm(request.POST)
         if form.is_valid():
             try:
@@ -2,12 +2,18 @@ from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.models import User
 from django.db import transaction, IntegrityError
+from django.db.models import Count, Exists, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.http import JsonResponse
 from django.shortcuts import redirect, render, get_object_or_404
 from django.views import View
 
-from crm.forms import TeamForm, UpdateUserTeamRoleForm
-from crm.models import Team, TeamUser
-from crm.permissions import AdminRequiredMixin, StaffRequiredMixin
+from crm import activity, memberships, stats
+from crm.autocomplete import search_users, user_page
+from crm.forms import TeamForm, TeamMembershipsForm, UpdateUserTeamRoleForm
+from crm.models import Team, TeamUser, TaskEvent
+from crm.pagination import KeysetPaginator
+from crm.permissions import AdminRequiredMixin, StaffRequiredMixin, ManagerRequiredMixin
 
 
 class TeamCreateView(StaffRequiredMixin, View):
@@ -44,14 +50,50 @@ class TeamCreateView(StaffRequiredMixin, View):
         return render(request, "crm/team_create.html", {"form": form})
 
 
+TEAMS_PER_PAGE = 50
+
+
 class TeamListView(LoginRequiredMixin, View):
     """
     View для списка команд
     """
 
     def get(self, request):
-        teams = Team.objects.all()
-        return render(request, "crm/team_list.html", {"teams": teams})
+        """
+        Страница команд одним запросом: создатель через JOIN, количество участников
+        подзапросом по индексу crm_teamuser.team_id, незавершенные задачи
+        (open + processing) - из TeamTaskStats
+        С mine=1 - только команда текущего пользователя
+        Пагинация по курсору по первичному ключу
+        :param request:
+        :return:
+        """
+        members = (
+            TeamUser.objects.filter(team=OuterRef("pk"))
+            .order_by()
+            .values("team")
+            .annotate(total=Count("pk"))
+            .values("total")
+        )
+        teams = Team.objects.select_related("creator").annotate(
+            members_count=Coalesce(Subquery(members, output_field=IntegerField()), 0),
+            # незавершенные: и открытые, и в работе
+            open_tasks=Coalesce(
+                F("task_stats__open") + F("task_stats__processing"), 0
+            ),
+        )
+        mine = request.GET.get("mine") == "1"
+        if mine:
+            teams = teams.filter(
+                Exists(TeamUser.objects.filter(team=OuterRef("pk"), user=request.user))
+            )
+        paginator = KeysetPaginator(teams, ["id"], TEAMS_PER_PAGE)
+        page_obj = paginator.get_page(request.GET.get("cursor"))
+        return render(
+            request,
+            "crm/team_list.html",
+            {"teams": page_obj, "page_obj": page_obj, "mine": mine},
+        )
 
 
 class TeamRetrieveView(LoginRequiredMixin, View):
@@ -61,17 +103,27 @@ class TeamRetrieveView(LoginRequiredMixin, View):
 
     def get(self, request, team_pk):
         """
-        Помимо обьекта команды возвращаем доступных пользователей для приглашения
+        Помимо обьекта команды возвращаем страницу доступных для приглашения пользователей
+        (без команды, с поиском по user_q и курсором users_cursor)
+        и счетчики задач по статусам (одна строка TeamTaskStats)
         :param request:
         :param team_pk:
         :return:
         """
         team = get_object_or_404(Team.objects.prefetch_related("members"), pk=team_pk)
-        available_users = User.objects.exclude(memberships__isnull=False)
+        user_q = request.GET.get("user_q", "")[:150]
+        available_users = user_page(
+            search_users(user_q, without_team=True), request.GET.get("users_cursor")
+        )
         return render(
             request,
             "crm/team_retrieve.html",
-            {"team": team, "available_users": available_users},
+            {
+                "team": team,
+                "available_users": available_users,
+                "user_q": user_q,
+                "task_stats": stats.for_team(team_pk),
+            },
         )
 
 
@@ -170,3 +222,81 @@ class TeamUpdateUserRole(AdminRequiredMixin, BaseTeamView):
         return render(
             request, "crm/team_role_update.html", {"form": form, "team_user": team_user}
         )
+
+
+class TeamMembershipsView(StaffRequiredMixin, View):
+    """
+    View массового изменения составов команд: добавление, перевод, смена роли, удаление
+    """
+
+    def get(self, request):
+        """
+        Получаем пустую форму назначений
+        :param request:
+        :return:
+        """
+        form = TeamMembershipsForm()
+        return render(request, "crm/team_memberships.html", {"form": form})
+
+    def post(self, request):
+        """
+        Применяем все назначения одной транзакцией или не применяем ни одного,
+        если хоть одно некорректно (причины возвращаем по каждому пользователю)
+        Клиентам, которые просят application/json, отвечаем JSON, иначе - сообщениями
+        :param request:
+        :return:
+        """
+        wants_json = (
+            request.get_preferred_type(["text/html", "application/json"])
+            == "application/json"
+        )
+        form = TeamMembershipsForm(request.POST)
+        if not form.is_valid():
+            if wants_json:
+                return JsonResponse({"errors": form.errors}, status=400)
+            return render(request, "crm/team_memberships.html", {"form": form})
+
+        try:
+            report = memberships.apply(
+                form.cleaned_data["assignments"], dry_run=form.cleaned_data["dry_run"]
+            )
+        except IntegrityError as e:
+            if wants_json:
+                return JsonResponse({"errors": {"__all__": [str(e)]}}, status=409)
+            messages.error(request, f"Ошибка: {e}")
+            return render(request, "crm/team_memberships.html", {"form": form})
+
+        if wants_json:
+            return JsonResponse(report, status=400 if report["errors"] else 200)
+        for username, reason in report["errors"].items():
+            messages.error(request, f"{username}: {reason}")
+        if report["errors"] or form.cleaned_data["dry_run"]:
+            return render(
+                request, "crm/team_memberships.html", {"form": form, "report": report}
+            )
+        messages.success(request, "Составы команд обновлены")
+        return redirect("team_list")
+
+
+EVENTS_PER_PAGE = 50
+
+
+class TeamActivityView(LoginRequiredMixin, ManagerRequiredMixin, View):
+    """
+    View ленты изменений задач команды
+    """
+
+    def get(self, request, team_pk):
+        """
+        Получаем события журнала задач команды от новых к старым
+        Пагинация по курсору по индексу (team, created_at, id)
+        :param request:
+        :param team_pk:
+        :return:
+        """
+        team = get_object_or_404(Team, pk=team_pk)
+        events = TaskEvent.objects.filter(team_id=team_pk).select_related("user", "task")
+        paginator = KeysetPaginator(events, ["-created_at", "-id"], EVENTS_PER_PAGE)
+        page_obj = paginator.get_page(request.GET.get("cursor"))
+        activity.describe(page_obj.object_list)
+        return render(request, "crm/team_activity.html", {"team": team, "page_obj": page_obj})
@@ -4,10 +4,12 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.models import User
 from django.core.exceptions import PermissionDenied
 from django.db import IntegrityError
+from django.http import JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views import View
 
-from crm.forms import LoginForm, RegisterForm, UserChangeForm
+from crm.autocomplete import PER_PAGE, search_users, user_json, user_page
+from crm.forms import LoginForm, RegisterForm, UserAutocompleteForm, UserChangeForm
 from crm.models import Evaluation
 from crm.permissions import UserDataOwnerMixin
 
@@ -142,3 +144,34 @@ class UserDeleteView(LoginRequiredMixin, UserDataOwnerMixin, View):
         except IntegrityError as e:
             messages.error(request,f"Ошибка в форме: {e}")
         return redirect("home")
+
+
+class UserAutocompleteView(LoginRequiredMixin, View):
+    """
+    View автодополнения пользователей в JSON для полей выбора пользователя
+    """
+
+    def get(self, request):
+        """
+        Пользователи, у которых username или email начинается с q, по алфавиту
+        Страница не больше limit, следующая - по next_cursor
+        :param request:
+        :return:
+        """
+        form = UserAutocompleteForm(request.GET)
+        if not form.is_valid():
+            return JsonResponse({"errors": form.errors}, status=400)
+        data = form.cleaned_data
+        users = search_users(
+            data["q"],
+            not_in_team=data["not_in_team"],
+            not_in_meeting=data["not_in_meeting"],
+            without_team=data["without_team"],
+        )
+        page = user_page(users, request.GET.get("cursor"), data["limit"] or PER_PAGE)
+        return JsonResponse(
+            {
+                "results": [user_json(user) for user in page],
+                "next_cursor": page.next_cursor,
+            }
+        )